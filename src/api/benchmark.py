@@ -0,0 +1,61 @@
+from http.client import HTTPConnection
+import json
+import threading
+import time
+from typing import List, Optional
+from urllib.parse import urlencode
+
+import numpy as np
+
+from api.server import ApiServer, SnapshotStore
+from enums.ticker_types import TickerType
+
+PERCENTILES = [50, 95, 99]
+
+def _request(connection:HTTPConnection, method:str, path:str, body:Optional[bytes] = None, headers:Optional[dict] = None) -> tuple[int, dict, bytes]:
+    connection.request(method, path, body=body, headers=headers or {})
+    response = connection.getresponse()
+    return response.status, dict(response.getheaders()), response.read()
+
+def benchmark_endpoints(host:str, port:int, symbols:List[str], requests:int = 200) -> dict[str, dict[str, float]]:
+    # Latency percentiles in milliseconds per endpoint over one keep-alive connection, as a local consumer would see them
+    batch = symbols[:100]
+    post_body = json.dumps({"symbols": batch}).encode("utf-8")
+    connection = HTTPConnection(host, port)
+    _, full_headers, _ = _request(connection, "GET", "/tickers")
+    endpoints = {
+        "health": ("GET", "/health", None, None),
+        "single symbol": ("GET", f"/tickers/{symbols[0]}" if symbols else "/tickers/_", None, None),
+        f"lookup {len(batch)} symbols": ("GET", f"/tickers?{urlencode({'symbols': ','.join(batch)})}", None, None),
+        f"post lookup {len(batch)} symbols": ("POST", "/tickers/lookup", post_body, {"Content-Type": "application/json"}),
+        "filter": ("GET", f"/tickers?{urlencode({'ticker_type': TickerType.MUTUAL_FUND.name, 'min_rating': 4, 'min_return_1y': 0})}", None, None),
+        "full universe": ("GET", "/tickers", None, None),
+        "full universe not modified": ("GET", "/tickers", None, {"If-None-Match": full_headers.get("ETag", "")}),
+    }
+    timings:dict[str, dict[str, float]] = {}
+    try:
+        for name, (method, path, body, headers) in endpoints.items():
+            latencies = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                _request(connection, method, path, body, headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+            timings[name] = {f"p{percentile}": float(np.percentile(latencies, percentile)) for percentile in PERCENTILES}
+    finally:
+        connection.close()
+    return timings
+
+def benchmark_database(db_path:str, requests:int = 200) -> tuple[dict[str, float], dict[str, dict[str, float]]]:
+    # Serves the database on a free local port and returns the snapshot build timings and the endpoint latencies
+    start = time.perf_counter()
+    store = SnapshotStore(db_path)
+    build_timings = {"snapshot": (time.perf_counter() - start) * 1000, "symbols": len(store.snapshot)}
+    with ApiServer(store, "127.0.0.1", 0) as server:
+        thread = threading.Thread(target=server.serve_forever, name="api-benchmark", daemon=True)
+        thread.start()
+        try:
+            host, port = server.server_address[:2]
+            return build_timings, benchmark_endpoints(host, port, store.snapshot.results.symbols.tolist(), requests)
+        finally:
+            server.shutdown()
+            thread.join()
@@ -0,0 +1,234 @@
+from hashlib import sha1
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import threading
+from typing import Iterable, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from api.snapshot import RANGE_FIELDS, Snapshot
+from constants import API_HOST, API_MAX_LOOKUP_SYMBOLS, API_POLL_INTERVAL, API_PORT, API_STREAM_CHUNK_ROWS, DATABASE_FILE_PATH
+from database.query_processor import Processor
+from database.run_results import RunResults
+from enums.run_phase import RunPhase
+
+logger = logging.getLogger(__name__)
+
+FILTER_PARAMETERS = {"ticker_type", "failed", *(f"{bound}_{field}" for field in RANGE_FIELDS for bound in ("min", "max"))}
+
+class BadRequestError(ValueError):
+    pass
+
+class SnapshotStore:
+    # Serves the snapshot of the latest finalized run and swaps in a new one when a later run finishes.
+    # Handlers read self.snapshot once per request so they never see a half built snapshot.
+    snapshot:Snapshot
+
+    def __init__(self, db_path:str = DATABASE_FILE_PATH, poll_interval:float = API_POLL_INTERVAL, chunk_rows:int = API_STREAM_CHUNK_ROWS):
+        # reuse_db so opening the api never clears the results of a run
+        self.processor = Processor(reuse_db=True, db_path=db_path)
+        self.poll_interval = poll_interval
+        self.chunk_rows = chunk_rows
+        self._run_id:Optional[int] = None
+        self._stop = threading.Event()
+        self._poller:Optional[threading.Thread] = None
+        self.refresh(force=True)
+
+    def refresh(self, force:bool = False) -> bool:
+        # A session per check so the api holds no read transaction that would block the scraper between polls
+        with self.processor as processor:
+            latest_run = processor.get_latest_run(RunPhase.FINALIZE.value)
+            run_id = latest_run.id if latest_run is not None else None
+            if not force and run_id == self._run_id:
+                return False
+            # The ticker table only matches the finalized run until the next run starts writing to it
+            if processor.is_run_in_progress():
+                if hasattr(self, "snapshot"):
+                    logger.info("A run is in progress, still serving snapshot %s", self.snapshot.version)
+                    return False
+                logger.warning("A run is in progress and no finalized snapshot is available, serving an empty snapshot")
+                self.snapshot = Snapshot(RunResults.from_rows([], 0), version="0", chunk_rows=self.chunk_rows)
+                return True
+            results = processor.get_run_results()
+        snapshot = Snapshot(results, version=str(run_id or 0), chunk_rows=self.chunk_rows)
+        self.snapshot, self._run_id = snapshot, run_id
+        logger.info("Serving snapshot %s with %s symbols", snapshot.version, len(snapshot))
+        return True
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh the api snapshot")
+
+    def start(self):
+        if self._poller is None:
+            self._poller = threading.Thread(target=self._poll, name="api-snapshot", daemon=True)
+            self._poller.start()
+
+    def close(self):
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+            self._poller = None
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, store:SnapshotStore, host:str = API_HOST, port:int = API_PORT):
+        super().__init__((host, port), ApiRequestHandler)
+        self.store = store
+
+def _parse_bool(value:str) -> bool:
+    if value.lower() in ("true", "1", "yes"):
+        return True
+    if value.lower() in ("false", "0", "no"):
+        return False
+    raise BadRequestError(f"Expected true or false, got {value}")
+
+def _parse_float(name:str, value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError) as e:
+        raise BadRequestError(f"{name} must be a number, got {value}") from e
+
+def select_rows(snapshot:Snapshot, symbols:Optional[List[str]], filters:dict) -> tuple[List[int], Optional[List[str]]]:
+    # Rows for an optional symbol lookup narrowed by the filters, plus the missing symbols of the lookup
+    unknown = set(filters) - FILTER_PARAMETERS
+    if unknown:
+        raise BadRequestError(f"Unknown parameters {sorted(unknown)}, expected symbols or {sorted(FILTER_PARAMETERS)}")
+    rows, missing = None, None
+    if symbols is not None:
+        if len(symbols) > API_MAX_LOOKUP_SYMBOLS:
+            raise BadRequestError(f"At most {API_MAX_LOOKUP_SYMBOLS} symbols can be looked up at once, got {len(symbols)}")
+        rows, missing = snapshot.lookup(symbols)
+    if not filters:
+        return rows if rows is not None else list(range(len(snapshot))), missing
+    ranges = {
+        field: (
+            _parse_float(f"min_{field}", filters[f"min_{field}"]) if f"min_{field}" in filters else None,
+            _parse_float(f"max_{field}", filters[f"max_{field}"]) if f"max_{field}" in filters else None,
+        )
+        for field in RANGE_FIELDS if f"min_{field}" in filters or f"max_{field}" in filters
+    }
+    ticker_type = str(filters["ticker_type"]) if "ticker_type" in filters else None
+    failed = filters.get("failed")
+    if isinstance(failed, str):
+        failed = _parse_bool(failed)
+    try:
+        return snapshot.filter(rows, ticker_type=ticker_type, failed=failed, ranges=ranges), missing
+    except ValueError as e:
+        raise BadRequestError(str(e)) from e
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, with Nagle every small keep-alive response waits on a delayed ack
+    disable_nagle_algorithm = True
+    server:ApiServer
+
+    def log_message(self, format, *args): # pylint: disable=W0622
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def do_GET(self): # pylint: disable=C0103
+        snapshot = self.server.store.snapshot
+        url = urlsplit(self.path)
+        try:
+            if url.path == "/health":
+                body = {"version": snapshot.version, "count": len(snapshot), "built_at": snapshot.built_at.isoformat(timespec="seconds")}
+                self._send_json(HTTPStatus.OK, body)
+            elif url.path == "/tickers":
+                # The snapshot never changes under a version so the url and version fully identify the response
+                etag = f'"{snapshot.version}-{sha1(self.path.encode("utf-8")).hexdigest()[:12]}"'
+                if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+                    self._send_not_modified(etag)
+                    return
+                query = {name: ",".join(values) for name, values in parse_qs(url.query).items()}
+                symbols = query.pop("symbols").split(",") if "symbols" in query else None
+                if symbols is None and not query:
+                    self._send_chunks(snapshot.full_chunks, len(snapshot), etag)
+                    return
+                rows, missing = select_rows(snapshot, symbols, query)
+                self._send_rows(snapshot, rows, missing, etag)
+            elif url.path.startswith("/tickers/"):
+                rows, _ = snapshot.lookup([url.path.removeprefix("/tickers/")])
+                if not rows:
+                    self._send_json(HTTPStatus.NOT_FOUND, {"error": f"{url.path.removeprefix('/tickers/')} is not in snapshot {snapshot.version}"})
+                    return
+                self._send_bytes(HTTPStatus.OK, snapshot.records[rows[0]])
+            else:
+                self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"})
+        except BadRequestError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+
+    def do_POST(self): # pylint: disable=C0103
+        # Batched lookup for symbol lists too long for a url, the body is {"symbols": [...], **filters}
+        snapshot = self.server.store.snapshot
+        if urlsplit(self.path).path != "/tickers/lookup":
+            # The unread body would be taken for the next request
+            self.close_connection = True
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except json.JSONDecodeError as e:
+                raise BadRequestError(f"Invalid json body: {e}") from e
+            if not isinstance(request, dict) or not isinstance(request.get("symbols"), list):
+                raise BadRequestError('Expected a json body like {"symbols": ["SYMBOL", ...]}')
+            symbols = [str(symbol) for symbol in request.pop("symbols")]
+            rows, missing = select_rows(snapshot, symbols, request)
+            self._send_rows(snapshot, rows, missing)
+        except BadRequestError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+
+    def _send_rows(self, snapshot:Snapshot, rows:List[int], missing:Optional[List[str]], etag:Optional[str] = None):
+        extra = {"missing": missing} if missing is not None else None
+        self._send_chunks(snapshot.chunks(rows, self.server.store.chunk_rows, extra), len(rows), etag)
+
+    def _send_chunks(self, chunks:Iterable[bytes], row_count:int, etag:Optional[str] = None):
+        # Small responses get a Content-Length, larger ones are streamed so the body is never joined in memory
+        if row_count <= self.server.store.chunk_rows:
+            self._send_bytes(HTTPStatus.OK, b"".join(chunks), etag)
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self._send_cache_headers(etag)
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_cache_headers(self, etag:Optional[str]):
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+
+    def _send_not_modified(self, etag:str):
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self._send_cache_headers(etag)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send_json(self, status:HTTPStatus, body:dict):
+        self._send_bytes(status, json.dumps(body).encode("utf-8"))
+
+    def _send_bytes(self, status:HTTPStatus, data:bytes, etag:Optional[str] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self._send_cache_headers(etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+def serve(db_path:str = DATABASE_FILE_PATH, host:str = API_HOST, port:int = API_PORT, poll_interval:float = API_POLL_INTERVAL):
+    store = SnapshotStore(db_path, poll_interval)
+    store.start()
+    with ApiServer(store, host, port) as server:
+        logger.info("Serving the read api on http://%s:%s", *server.server_address[:2])
+        try:
+            server.serve_forever()
+        finally:
+            store.close()
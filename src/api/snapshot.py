@@ -0,0 +1,95 @@
+from datetime import datetime
+import json
+import math
+from typing import Iterable, List, Mapping, Optional
+
+import numpy as np
+
+from constants import API_STREAM_CHUNK_ROWS
+from database.run_results import RETURN_FIELDS, RunResults
+from enums.ticker_types import TickerType
+
+RANGE_FIELDS = ["rating", *RETURN_FIELDS]
+
+def parse_ticker_type(value:str) -> TickerType:
+    # Accepts the stored value ("Mutual Fund") or the enum name ("MUTUAL_FUND"), case insensitively
+    for ticker_type in TickerType:
+        if value.casefold() in (ticker_type.value.casefold(), ticker_type.name.casefold()):
+            return ticker_type
+    raise ValueError(f"Unknown ticker type {value}, expected one of {[ticker_type.value for ticker_type in TickerType]}")
+
+def _record(results:RunResults, row:int) -> bytes:
+    record = {
+        "symbol": results.symbols[row].item(),
+        "ticker_type": results.ticker_types[row].item() or None,
+        "morningstar_rating": None if results.rating_null_mask[row] else int(results.ratings[row]),
+        "failed": bool(results.failed_mask[row]),
+    }
+    for field in RETURN_FIELDS:
+        value = results.returns[field][row].item()
+        record[field] = None if math.isnan(value) else value
+    return json.dumps(record, separators=(",", ":")).encode("utf-8")
+
+class Snapshot:
+    # Immutable, fully indexed copy of one finalized run. Every record is serialized once when the snapshot is built
+    # so queries only select rows and join bytes. Replacing the whole object is how the server refreshes atomically.
+    version:str
+    results:RunResults
+    records:List[bytes]
+    built_at:datetime
+
+    def __init__(self, results:RunResults, version:str, chunk_rows:int = API_STREAM_CHUNK_ROWS):
+        self.version = version
+        self.results = results
+        self.records = [_record(results, row) for row in range(len(results))]
+        self.built_at = datetime.now()
+        self._type_masks = {ticker_type: results.ticker_types == ticker_type.value for ticker_type in TickerType}
+        self._rating_values = np.where(results.rating_null_mask, np.nan, results.ratings.astype(np.float64))
+        # The full universe is the common request, its chunks are prebuilt
+        self.full_chunks = list(self.chunks(range(len(results)), chunk_rows))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def chunks(self, rows:Iterable[int], chunk_rows:int = API_STREAM_CHUNK_ROWS, extra:Optional[Mapping] = None) -> Iterable[bytes]:
+        # Yields a json object {"version", "count", "tickers", **extra} in pieces of at most chunk_rows records
+        rows = list(rows)
+        yield f'{{"version":{json.dumps(self.version)},"count":{len(rows)},"tickers":['.encode("utf-8")
+        for start in range(0, len(rows), chunk_rows):
+            separator = b"," if start else b""
+            yield separator + b",".join(self.records[row] for row in rows[start:start + chunk_rows])
+        trailer = "".join(f",{json.dumps(key)}:{json.dumps(value)}" for key, value in (extra or {}).items())
+        yield f"]{trailer}}}".encode("utf-8")
+
+    def lookup(self, symbols:Iterable[str]) -> tuple[List[int], List[str]]:
+        # Rows of the found symbols in request order and the symbols missing from the snapshot
+        rows:List[int] = []
+        missing:List[str] = []
+        for symbol in dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()):
+            row = self.results.index_of(symbol)
+            if row is None:
+                missing.append(symbol)
+            else:
+                rows.append(row)
+        return rows, missing
+
+    def filter(self, rows:Optional[List[int]] = None, ticker_type:Optional[str] = None, failed:Optional[bool] = None,
+               ranges:Optional[Mapping[str, tuple[Optional[float], Optional[float]]]] = None) -> List[int]:
+        # Ranges are inclusive and keyed by "rating" or a return field, a null value never matches a range
+        mask = np.ones(len(self), dtype=bool)
+        if ticker_type is not None:
+            mask &= self._type_masks[parse_ticker_type(ticker_type)]
+        if failed is not None:
+            mask &= self.results.failed_mask == failed
+        for field, (low, high) in (ranges or {}).items():
+            if field not in RANGE_FIELDS:
+                raise ValueError(f"Unknown range field {field}, expected one of {RANGE_FIELDS}")
+            values = self._rating_values if field == "rating" else self.results.returns[field]
+            # NaN compares False so nulls drop out of any bounded range
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        if rows is None:
+            return np.flatnonzero(mask).tolist()
+        return [row for row in rows if mask[row]]
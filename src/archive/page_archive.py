@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Optional
+
+from constants import ARCHIVE_EVICT_TO_FRACTION, ARCHIVE_FOLDER, ARCHIVE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+class PageArchive:
+    # Gzipped payloads are stored once per content hash under blobs/ and every run keeps a
+    # ticker -> hash manifest under runs/. Once the archive grows past max_bytes blobs are evicted
+    # least recently used first down to evict_to_fraction of it, manifests go with their last blob.
+    root:Path
+    max_bytes:int
+    evict_to_fraction:float
+
+    def __init__(self, root:str | Path = ARCHIVE_FOLDER, max_bytes:int = ARCHIVE_MAX_BYTES, evict_to_fraction:float = ARCHIVE_EVICT_TO_FRACTION):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.evict_to_fraction = evict_to_fraction
+        self._lock = threading.Lock()
+        self._manifests:dict[str, dict[str, str]] = {}
+        (self.root / "blobs").mkdir(parents=True, exist_ok=True)
+        (self.root / "runs").mkdir(parents=True, exist_ok=True)
+        self._total_bytes = sum(blob.stat().st_size for blob in self._blobs())
+
+    def _blobs(self) -> list[Path]:
+        return list((self.root / "blobs").glob("*/*.gz"))
+
+    def _blob_path(self, digest:str) -> Path:
+        return self.root / "blobs" / digest[:2] / f"{digest}.gz"
+
+    def _manifest_path(self, run_id:str) -> Path:
+        return self.root / "runs" / f"{run_id}.jsonl"
+
+    def _manifest(self, run_id:str) -> dict[str, str]:
+        if run_id not in self._manifests:
+            manifest:dict[str, str] = {}
+            manifest_path = self._manifest_path(run_id)
+            if manifest_path.exists():
+                with open(manifest_path, encoding="utf-8") as manifest_file:
+                    for line in manifest_file:
+                        entry = json.loads(line)
+                        manifest[entry["ticker"]] = entry["digest"]
+            self._manifests[run_id] = manifest
+        return self._manifests[run_id]
+
+    def put(self, run_id:str, ticker:str, payload:dict) -> str:
+        data = json.dumps(payload, sort_keys=True).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+        with self._lock:
+            if blob_path.exists():
+                os.utime(blob_path)
+            else:
+                blob_path.parent.mkdir(exist_ok=True)
+                temporary_path = blob_path.with_suffix(".tmp")
+                with open(temporary_path, "wb") as blob_file:
+                    blob_file.write(gzip.compress(data))
+                os.replace(temporary_path, blob_path)
+                self._total_bytes += blob_path.stat().st_size
+            with open(self._manifest_path(run_id), "a", encoding="utf-8") as manifest_file:
+                manifest_file.write(json.dumps({"ticker": ticker, "digest": digest}) + "\n")
+            self._manifest(run_id)[ticker] = digest
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+        return digest
+
+    def get(self, run_id:str, ticker:str) -> Optional[dict]:
+        with self._lock:
+            digest = self._manifest(run_id).get(ticker)
+            if digest is None:
+                return None
+            blob_path = self._blob_path(digest)
+            try:
+                with open(blob_path, "rb") as blob_file:
+                    data = gzip.decompress(blob_file.read())
+            except FileNotFoundError:
+                logger.warning("Archived page for %s in run %s was evicted", ticker, run_id)
+                return None
+            os.utime(blob_path)
+        return json.loads(data)
+
+    def tickers(self, run_id:str) -> list[str]:
+        with self._lock:
+            return list(self._manifest(run_id))
+
+    def run_ids(self) -> list[str]:
+        return sorted(manifest.stem for manifest in (self.root / "runs").glob("*.jsonl"))
+
+    def _evict(self):
+        target_bytes = self.max_bytes * self.evict_to_fraction
+        blobs = sorted(((blob, blob.stat()) for blob in self._blobs()), key=lambda blob: blob[1].st_mtime)
+        for blob, stat in blobs:
+            if self._total_bytes <= target_bytes:
+                break
+            blob.unlink()
+            self._total_bytes -= stat.st_size
+            logger.info("Evicted archived page %s", blob.name)
+        self._evict_manifests()
+
+    def _evict_manifests(self):
+        # A manifest is only dropped once none of its pages are left, partially evicted runs still replay what remains
+        for run_id in self.run_ids():
+            if any(self._blob_path(digest).exists() for digest in self._manifest(run_id).values()):
+                continue
+            self._manifest_path(run_id).unlink()
+            self._manifests.pop(run_id, None)
+            logger.info("Evicted manifest of run %s", run_id)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
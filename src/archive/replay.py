@@ -0,0 +1,72 @@
+import logging
+import time
+
+from archive.page_archive import PageArchive
+from database.query_processor import Processor
+from enums.ticker_types import TickerType
+from helpers import ms_ticker_to_ticker
+from models import trailing_returns
+from models.scrape_result import ScrapeResult
+from models.trailing_returns import FIELDS
+from profiling import profiled
+from scraper.exceptions import EmptyTrailingReturnsError
+
+logger = logging.getLogger(__name__)
+
+class ArchivedPageNotFoundError(LookupError):
+    pass
+
+class ReplayScraper:
+    # Stand-in for Scraper that serves archived pages instead of the live site
+    archive:PageArchive
+    run_id:str
+
+    def __init__(self, archive:PageArchive, run_id:str):
+        self.archive = archive
+        self.run_id = run_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+    def scrape_ticker(self, ticker:str) -> ScrapeResult:
+        payload = self.archive.get(self.run_id, ticker)
+        if payload is None:
+            raise ArchivedPageNotFoundError(f"No archived page for {ticker} in run {self.run_id}")
+        returns = trailing_returns.etl(payload["title_data"], payload["raw_data"])
+        if trailing_returns.is_all_null(returns):
+            raise EmptyTrailingReturnsError(f"No trailing returns found at url {payload['url']}")
+        return ScrapeResult(
+            ticker_type=TickerType(payload["ticker_type"]),
+            trailing_returns=returns,
+            morningstar_rating=payload["morningstar_rating"],
+        )
+
+@profiled
+def replay_run(archive:PageArchive, run_id:str, processor:Processor) -> int:
+    # Re-runs the etl over every archived page of a run in one batch and stores the results.
+    # Pages are archived under the morningstar ticker, the database keeps the client symbol.
+    tickers, payloads = [], []
+    for ms_ticker in archive.tickers(run_id):
+        payload = archive.get(run_id, ms_ticker)
+        if payload is not None:
+            tickers.append(ms_ticker_to_ticker(ms_ticker))
+            payloads.append(payload)
+    logger.info("Replaying %s archived pages of run %s", len(tickers), run_id)
+    processor.add_list_of_tickers(tickers)
+
+    values, null_masks = trailing_returns.batch_etl([(payload["title_data"], payload["raw_data"]) for payload in payloads])
+    all_null = [all(null_masks[field][row] for field in FIELDS) for row in range(len(tickers))]
+    processing_complete = int(time.time())
+    processor.add_trailing_returns_columns(tickers, (values, null_masks), extra_columns={
+        "morningstar_rating": [payload["morningstar_rating"] for payload in payloads],
+        "ticker_type": [payload["ticker_type"] for payload in payloads],
+        "processing_complete": [processing_complete] * len(tickers),
+        "processing_error": [
+            repr(EmptyTrailingReturnsError(f"No trailing returns found at url {payload['url']}")) if is_all_null else None
+            for payload, is_all_null in zip(payloads, all_null)
+        ],
+    })
+    return len(tickers)
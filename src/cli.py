@@ -0,0 +1,229 @@
+import argparse
+from datetime import datetime
+import logging
+from pathlib import Path
+import sys
+import time
+from typing import List, Optional
+
+from logging_setup import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Heavy dependencies (selenium, undetected_chromedriver, boto3, sqlmodel) are only imported by the commands that use them
+
+def run_command(_:argparse.Namespace) -> int:
+    from main import main
+    main()
+    return 0
+
+def healthcheck_command(_:argparse.Namespace) -> int:
+    from main import run_once
+    run_once(healthcheck=True)
+    return 0
+
+def enqueue_command(args:argparse.Namespace) -> int:
+    from main import enqueue_run
+    from work_queue.factory import open_work_queue
+    enqueue_run(open_work_queue(args.queue_url, args.queue_name), args.run_id, args.database)
+    return 0
+
+def worker_command(args:argparse.Namespace) -> int:
+    from main import run_worker
+    from work_queue.factory import open_work_queue
+    run_worker(open_work_queue(args.queue_url, args.queue_name), args.run_id, args.healthcheck, args.database)
+    return 0
+
+def shard_command(args:argparse.Namespace) -> int:
+    from main import run_shard
+    run_shard(args.shard, args.shards, args.resume)
+    return 0
+
+def merge_command(args:argparse.Namespace) -> int:
+    from main import merge_shards
+    merge_shards(args.shards, args.healthcheck, args.allow_incomplete)
+    return 0
+
+def export_command(args:argparse.Namespace) -> int:
+    from database.query_processor import Processor
+    with Processor(reuse_db=True) as processor:
+        processor.export_to_csv(output_path=args.output)
+    return 0
+
+def controls_command(_:argparse.Namespace) -> int:
+    from controls import check_data_controls
+    from database.query_processor import Processor
+    with Processor(reuse_db=True) as processor:
+        failing_specs = check_data_controls(processor.get_run_results())
+    for failing_spec in failing_specs:
+        print(failing_spec)
+    return 1 if failing_specs else 0
+
+def email_command(args:argparse.Namespace) -> int:
+    from constants import ADMIN_EMAIL, CLIENT_EMAILS
+    from messenger.email import send_email_with_results
+    if args.to:
+        recipients = args.to
+    elif args.clients:
+        recipients = CLIENT_EMAILS
+    else:
+        recipients = [ADMIN_EMAIL]
+    send_email_with_results(args.body, recipients)
+    return 0
+
+def bench_command(args:argparse.Namespace) -> int:
+    from controls import check_data_controls
+    from database.query_processor import Processor
+    with Processor(reuse_db=True) as processor:
+        timings = {}
+        start = time.perf_counter()
+        results = processor.get_run_results()
+        timings["load"] = time.perf_counter() - start
+        start = time.perf_counter()
+        check_data_controls(results)
+        timings["controls"] = time.perf_counter() - start
+        start = time.perf_counter()
+        processor.export_to_csv(results, output_path=args.output)
+        timings["export"] = time.perf_counter() - start
+    print(f"symbols: {len(results)} ({results.nbytes / 1024:.1f} KiB)")
+    for stage, seconds in timings.items():
+        print(f"{stage}: {seconds * 1000:.1f} ms")
+    return 0
+
+def replay_command(args:argparse.Namespace) -> int:
+    from archive.page_archive import PageArchive
+    from archive.replay import replay_run
+    from controls import check_data_controls
+    from database.query_processor import Processor
+    archive = PageArchive(args.archive)
+    run_ids = args.run_id or archive.run_ids()[-1:]
+    if not run_ids:
+        print(f"No archived runs in {args.archive}")
+        return 1
+    with Processor(db_path=args.database) as processor:
+        # Later runs override earlier ones so a pre-warm run can be replayed followed by its refresh
+        for run_id in run_ids:
+            replay_run(archive, run_id, processor)
+        results = processor.get_run_results()
+        failing_specs = check_data_controls(results)
+        processor.export_to_csv(results, output_path=args.output)
+    for failing_spec in failing_specs:
+        print(failing_spec)
+    return 1 if failing_specs else 0
+
+def profile_diff_command(args:argparse.Namespace) -> int:
+    import json
+    from profiling import diff_reports
+    with open(args.old, encoding="utf-8") as old_file, open(args.new, encoding="utf-8") as new_file:
+        changes = diff_reports(json.load(old_file), json.load(new_file))
+    for key, change in sorted(changes.items(), key=lambda item: abs(item[1]), reverse=True)[:args.top]:
+        print(f"{change:+.3f} {key}")
+    return 0
+
+def serve_command(args:argparse.Namespace) -> int:
+    from api.server import serve
+    serve(args.database, args.host, args.port, args.poll_interval)
+    return 0
+
+def serve_bench_command(args:argparse.Namespace) -> int:
+    from api.benchmark import benchmark_database
+    build_timings, timings = benchmark_database(args.database, args.requests)
+    print(f"symbols: {build_timings['symbols']} (snapshot built in {build_timings['snapshot']:.1f} ms)")
+    for endpoint, percentiles in timings.items():
+        print(f"{endpoint}: {' '.join(f'{name} {milliseconds:.2f} ms' for name, milliseconds in percentiles.items())}")
+    return 0
+
+def add_queue_arguments(parser:argparse.ArgumentParser):
+    from constants import DATABASE_FILE_PATH, DEFAULT_QUEUE_NAME
+    parser.add_argument("--queue-url", required=True, help="sqlite:///path/to/broker.db or an SQS queue url")
+    parser.add_argument("--queue-name", default=DEFAULT_QUEUE_NAME, help="Queue name within a sqlite broker")
+    parser.add_argument("--run-id", default=datetime.now().strftime('%Y-%m-%d'), help="Identifies the run for completion checks")
+    parser.add_argument("--database", default=DATABASE_FILE_PATH, help="Shared results database")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="fundfetcher", description="Fund Fetcher")
+    parser.add_argument("--json-logs", action="store_true", help="Also write newline delimited json logs")
+    parser.add_argument("--profile", action="store_true", help="Write a cpu, memory and webdriver command report for each run")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("run", help="Run the scheduled scraping loop").set_defaults(func=run_command)
+    subparsers.add_parser("healthcheck", help="Scrape once and only report to the admin").set_defaults(func=healthcheck_command)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Enqueue the fund universe for distributed workers")
+    add_queue_arguments(enqueue_parser)
+    enqueue_parser.set_defaults(func=enqueue_command)
+
+    worker_parser = subparsers.add_parser("worker", help="Drain a shared queue and finalize the run when it is complete")
+    add_queue_arguments(worker_parser)
+    worker_parser.add_argument("--healthcheck", action="store_true", help="Only report to the admin when the run completes")
+    worker_parser.set_defaults(func=worker_command)
+
+    shard_parser = subparsers.add_parser("shard", help="Scrape one shard of the fund universe into its own database")
+    shard_parser.add_argument("--shard", type=int, required=True, help="Shard index starting at 0")
+    shard_parser.add_argument("--shards", type=int, required=True, help="Total number of shards")
+    shard_parser.add_argument("--resume", action="store_true", help="Keep processed tickers and retry failed ones")
+    shard_parser.set_defaults(func=shard_command)
+
+    merge_parser = subparsers.add_parser("merge", help="Merge shard databases then run controls, export and email")
+    merge_parser.add_argument("--shards", type=int, required=True, help="Total number of shards")
+    merge_parser.add_argument("--healthcheck", action="store_true", help="Only report to the admin")
+    merge_parser.add_argument("--allow-incomplete", action="store_true", help="Finalize even if some shards are missing or incomplete")
+    merge_parser.set_defaults(func=merge_command)
+
+    export_parser = subparsers.add_parser("export", help="Export the current database to csv")
+    export_parser.add_argument("--output", type=Path, default=None, help="Output csv path")
+    export_parser.set_defaults(func=export_command)
+
+    subparsers.add_parser("controls", help="Check data controls against the current database").set_defaults(func=controls_command)
+
+    email_parser = subparsers.add_parser("email", help="Email the last exported csv")
+    email_parser.add_argument("--body", default="FundFetcher Results", help="Email body")
+    email_parser.add_argument("--clients", action="store_true", help="Send to the client list instead of the admin")
+    email_parser.add_argument("--to", nargs="+", default=None, help="Explicit recipients")
+    email_parser.set_defaults(func=email_command)
+
+    bench_parser = subparsers.add_parser("bench", help="Time the post-scrape stages against the current database")
+    bench_parser.add_argument("--output", type=Path, default=None, help="Output csv path")
+    bench_parser.set_defaults(func=bench_command)
+
+    from constants import ARCHIVE_FOLDER, REPLAY_DATABASE_FILE_PATH
+    replay_parser = subparsers.add_parser("replay", help="Re-run etl, controls and export over archived pages without scraping")
+    replay_parser.add_argument("--run-id", nargs="+", default=None, help="Archived runs to replay in order, defaults to the latest")
+    replay_parser.add_argument("--archive", type=Path, default=Path(ARCHIVE_FOLDER), help="Page archive folder")
+    replay_parser.add_argument("--database", default=REPLAY_DATABASE_FILE_PATH, help="Database the replayed results are written to")
+    replay_parser.add_argument("--output", type=Path, default=None, help="Output csv path")
+    replay_parser.set_defaults(func=replay_command)
+
+    from constants import API_HOST, API_POLL_INTERVAL, API_PORT, DATABASE_FILE_PATH
+    serve_parser = subparsers.add_parser("serve", help="Serve the latest finalized run over a local read-only http api")
+    serve_parser.add_argument("--host", default=API_HOST, help="Address to listen on")
+    serve_parser.add_argument("--port", type=int, default=API_PORT, help="Port to listen on")
+    serve_parser.add_argument("--database", default=DATABASE_FILE_PATH, help="Results database to serve")
+    serve_parser.add_argument("--poll-interval", type=float, default=API_POLL_INTERVAL, help="Seconds between checks for a newer run")
+    serve_parser.set_defaults(func=serve_command)
+
+    serve_bench_parser = subparsers.add_parser("serve-bench", help="Measure the read api latency against a database")
+    serve_bench_parser.add_argument("--database", default=DATABASE_FILE_PATH, help="Results database to serve")
+    serve_bench_parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    serve_bench_parser.set_defaults(func=serve_bench_command)
+
+    profile_diff_parser = subparsers.add_parser("profile-diff", help="Show what changed between two profile reports")
+    profile_diff_parser.add_argument("old", type=Path, help="Earlier profile report")
+    profile_diff_parser.add_argument("new", type=Path, help="Later profile report")
+    profile_diff_parser.add_argument("--top", type=int, default=30, help="Number of largest changes to show")
+    profile_diff_parser.set_defaults(func=profile_diff_command)
+    return parser
+
+def main(argv:Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "shard" and not 0 <= args.shard < args.shards:
+        parser.error(f"--shard must be between 0 and {args.shards - 1}")
+    configure_logging(json_logs=args.json_logs)
+    if args.profile:
+        import profiling
+        profiling.enable()
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
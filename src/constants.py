@@ -1,41 +1,150 @@
+from functools import cache
 from pathlib import Path
 from helpers import get_root_dir
 import json
 
-with open(Path(get_root_dir()) / 'config.json', encoding='utf-8') as f:
-    config:dict = json.load(f)
+CONFIG_FILE_PATH = Path(get_root_dir()) / 'config.json'
+
+@cache
+def get_config() -> dict:
+    with open(CONFIG_FILE_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+# Constants read from config.json are resolved on first access so commands that never need them skip the file
+_CONFIG_CONSTANTS = {
+    "ADMIN_EMAIL": lambda: get_config().get("ADMIN_EMAIL"),
+    "LOGIN_PASSWORD": lambda: get_config().get("ADMIN_PASSWORD"),
+    "EMAIL_SOURCE": lambda: get_config().get('AWS_EMAIL'),
+    "CLIENT_EMAILS": lambda: get_config().get('CLIENT_EMAILS') + [get_config().get("ADMIN_EMAIL")],
+    "UNIVERSES": lambda: get_config().get('UNIVERSES', []),
+    "ABORT_ON_FAILING_CONTROLS": lambda: get_config().get('ABORT_ON_FAILING_CONTROLS', False),
+    "ARCHIVE_PAGES": lambda: get_config().get('ARCHIVE_PAGES', False),
+    "ARCHIVE_HTML": lambda: get_config().get('ARCHIVE_HTML', False),
+    "CAPTURE_FAILURE_DOM": lambda: get_config().get('CAPTURE_FAILURE_DOM', False),
+    "ATTACHMENT_COMPRESSION": lambda: get_config().get('ATTACHMENT_COMPRESSION'),
+    "DELIVERY_BUCKET": lambda: get_config().get('DELIVERY_BUCKET'),
+    "SES_OUTBOX": lambda: get_config().get('SES_OUTBOX'),
+    "SQS_DEAD_LETTER_QUEUE_URL": lambda: get_config().get('SQS_DEAD_LETTER_QUEUE_URL'),
+    "SQS_COMPLETION_QUEUE_URL": lambda: get_config().get('SQS_COMPLETION_QUEUE_URL'),
+}
+
+@cache
+def __getattr__(name:str):
+    if name in _CONFIG_CONSTANTS:
+        return _CONFIG_CONSTANTS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Config
 SELENIUM_TIMEOUT = 5
 SELENIUM_POLLING_RATE = 0.01
 
+# region Watchdog
+WATCHDOG_POLL_INTERVAL = 0.5
+DEFAULT_STEP_DEADLINE_SECONDS = 60
+# Scraper steps missing here use the default. None leaves a step to the deadlines of the steps it calls.
+STEP_DEADLINE_SECONDS = {
+    "login": 120,
+    "go_to_screener": 120,
+    "scrape_ticker": None,
+}
+# Total time one attempt at a ticker may take before the driver is recycled and the ticker requeued
+TICKER_BUDGET_SECONDS = 120
+FAILURE_CAPTURE_DEADLINE_SECONDS = 15
+# endregion
+
 BASE_URL = "https://www.morningstar.com/"
 SEARCH_URL = f"{BASE_URL}search?query="
 
 LOGIN_URL = f"{BASE_URL}login"
-ADMIN_EMAIL = config.get("ADMIN_EMAIL")
-LOGIN_PASSWORD = config.get("ADMIN_PASSWORD")
 
 SCREENSHOTS_FOLDER = 'screenshots'
+# Failure captures: the first failures of a run are all kept, later ones are sampled into a fixed number of ring slots
+FAILURE_CAPTURE_KEEP_FIRST = 20
+FAILURE_CAPTURE_SAMPLE_EVERY = 10
+FAILURE_CAPTURE_RING_SLOTS = 50
+FAILURE_CAPTURE_PER_STEP = 25
+FAILURE_CAPTURE_PER_RUN = 200
+FAILURE_CAPTURE_QUEUE_SIZE = 8
+ARCHIVE_FOLDER = 'archive'
+ARCHIVE_MAX_BYTES = 2_000_000_000
+# Eviction frees space down to this fraction of ARCHIVE_MAX_BYTES so it does not run on every put at capacity
+ARCHIVE_EVICT_TO_FRACTION = 0.9
+REPLAY_DATABASE_FILE_PATH = 'database_replay.db'
 
 # region Logging
 LOG_FILE_NAME = 'logs/log.log'
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-LOG_MAX_BYTES = 100000
+LOG_JSON_FILE_NAME = 'logs/log.jsonl'
+LOG_MAX_BYTES = 10_000_000
 LOG_BACKUP_COUNT = 10
+LOG_STRUCTURED_FIELDS = ("ticker", "step", "duration")
+LOG_PROGRESS_INTERVAL = 10
+# endregion
+
+# region Profiling
+PROFILE_FOLDER = 'profiles'
+PROFILE_TOP_FUNCTIONS = 50
+PROFILE_TOP_ALLOCATORS = 25
+PROFILE_TRACEMALLOC_FRAMES = 1
+# Scraper steps the webdriver commands are attributed to, commands from helpers like relogin or screenshot count towards the step that called them
+PROFILE_SCRAPER_STEPS = (
+    "login", "find_ticker", "get_trailing_returns", "get_morningstar_rating", "scrape_ticker",
+    "go_to_screener", "get_all_tickers_and_ratings", "paginate_next",
+)
 # endregion
 
 LOGIN_BUTTON = "//button[@type='submit']"
 
 CSV_FILE_PATH = '/src/funds/'
 MAX_PROCESSING_ATTEMPTS = 10
-EMAIL_SOURCE = config.get('AWS_EMAIL')
-
-CLIENT_EMAILS:list[str] = config.get('CLIENT_EMAILS')
-CLIENT_EMAILS.append(ADMIN_EMAIL)
+DATABASE_FILE_PATH = 'database.db'
+# Rows fetched from sqlite at a time when loading the results of a run
+RUN_RESULTS_BATCH_ROWS = 1000
+SHARD_DATABASE_FILE_PATH = 'database_shard_{shard}.db'
+SHARD_VIRTUAL_NODES = 64
 
+# region Work Queue
+DEFAULT_QUEUE_URL = 'memory://'
+DEFAULT_QUEUE_NAME = 'fundfetcher'
+QUEUE_VISIBILITY_TIMEOUT = 5*60
+QUEUE_POLL_INTERVAL = 5
+# SQS queue counts are approximate so an empty queue is re-read this many times before a run is finalized
+QUEUE_DRAINED_CHECKS = 3
+QUEUE_DRAINED_CHECK_INTERVAL = 20
+# endregion
+# Allowed difference in percentage points between locally computed and scraped trailing returns
+PRICE_HISTORY_RETURN_TOLERANCE = 0.05
 OUTPUT_CSV_FILE = 'DailyFundReturns.csv'
 OUTPUT_CSV_FILE_PATH = Path(get_root_dir()) / 'output' / OUTPUT_CSV_FILE
+DEFAULT_UNIVERSE_NAME = 'default'
+
+# region Delivery
+# SES rejects raw messages above 10MB including the base64 encoding of attachments
+SES_MAX_MESSAGE_BYTES = 10_000_000
+DELIVERY_SIZE_HEADROOM = 0.9
+DELIVERY_MAX_WORKERS = 4
+DELIVERY_RETRY_BACKOFF = [1, 5, 30]
+DELIVERY_LINK_EXPIRY_SECONDS = 7*24*60*60
+# endregion
+
+# region API
+API_HOST = '127.0.0.1'
+API_PORT = 8080
+# Seconds between checks for a newly finalized run
+API_POLL_INTERVAL = 30
+API_STREAM_CHUNK_ROWS = 500
+API_MAX_LOOKUP_SYMBOLS = 5000
+# endregion
 
 HEALTHCHECK_TIMES_HOUR = [18, 22]
 TARGET_RUN_TIME = 6
+
+# region Pre-warm
+PREWARM_HISTORY_RUNS = 5
+PREWARM_DEFAULT_SECONDS_PER_TICKER = 15.0
+PREWARM_SAFETY_MARGIN = 0.25
+# Pre-warm lead time when it cannot be estimated, e.g. the funds file or database is unreadable
+PREWARM_FALLBACK_SECONDS = 3*60*60
+# Local hour of the market close. The refresh phase re-fetches tickers the pre-warm finished before the last close.
+MARKET_CLOSE_HOUR = 16
+# endregion
@@ -1,13 +1,10 @@
 import logging
-from database.query_processor import Processor
-from database.models import Ticker
+import math
+from database.run_results import RETURN_FIELDS, RunResults
+from models.scrape_result import ScrapeResult
+from models.trailing_returns import TICKER_COLUMNS
 logger = logging.getLogger(__name__)
 
-RETURN_FIELDS = [
-    "return_ytd", "return_1y", "return_3y", "return_5y",
-    "return_10y", "return_15y", "inception"
-]
-
 # SPECS
 RETURN_YTD_SPEC_MAX = 0.5
 RETURN_1Y_SPEC_MAX = 1.0
@@ -17,6 +14,16 @@ RETURN_10Y_SPEC_MAX = 15.0
 RETURN_15Y_SPEC_MAX = 30.0
 RETURN_INCEPTION_SPEC_MAX = 50.0
 
+RETURN_SPEC_MAX = {
+    "return_ytd": RETURN_YTD_SPEC_MAX,
+    "return_1y": RETURN_1Y_SPEC_MAX,
+    "return_3y": RETURN_3Y_SPEC_MAX,
+    "return_5y": RETURN_5Y_SPEC_MAX,
+    "return_10y": RETURN_10Y_SPEC_MAX,
+    "return_15y": RETURN_15Y_SPEC_MAX,
+    "inception": RETURN_INCEPTION_SPEC_MAX,
+}
+
 # Morningstar rating min and max specs
 MORNINGSTAR_RATING_SPECS = {
     "None": {"min": 0.0, "max": 5.0},
@@ -27,75 +34,121 @@ MORNINGSTAR_RATING_SPECS = {
     5: {"min": 10.0, "max": 20.0},
 }
 
-def check_data_controls(processor:Processor) -> list[str]:
-    logger.info("Starting processor and fetching data...")
-    failing_specs = []
-    tickers: list[Ticker] = processor.get_everything()
-    morningstar_ratings = {"None": 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-
-    # Initialize counters for returns
-    return_none_counts = {field: 0 for field in RETURN_FIELDS}
-    return_sums = {field: 0.0 for field in RETURN_FIELDS}
-    return_counts = {field: 0 for field in RETURN_FIELDS}
-
-    for ticker in tickers:
-        rating = ticker.morningstar_rating
-        if rating is None:
-            morningstar_ratings["None"] += 1
-        else:
-            morningstar_ratings[rating] += 1
-
-        # Count None and sum values for returns
+# Streaming controls only fail a spec once its confidence interval lies entirely outside the spec
+CONTROLS_MIN_SAMPLE = 200
+CONTROLS_CONFIDENCE_Z = 3.0
+CONTROLS_EVALUATION_INTERVAL = 50
+
+class ControlsFailedError(Exception):
+    def __init__(self, failing_specs:list[str]):
+        super().__init__(f"Data controls are failing: {failing_specs}")
+        self.failing_specs = failing_specs
+
+def wilson_interval(count:int, total:int, z:float) -> tuple[float, float]:
+    if total == 0:
+        return 0.0, 1.0
+    proportion = count / total
+    denominator = 1 + z**2 / total
+    center = (proportion + z**2 / (2 * total)) / denominator
+    margin = z * math.sqrt(proportion * (1 - proportion) / total + z**2 / (4 * total**2)) / denominator
+    return max(center - margin, 0.0), min(center + margin, 1.0)
+
+class ControlsAccumulator:
+    total:int
+    morningstar_ratings:dict[str | int, int]
+    return_none_counts:dict[str, int]
+    return_sums:dict[str, float]
+
+    def __init__(self):
+        self.total = 0
+        self.morningstar_ratings = {"None": 0, 1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+        self.return_none_counts = {field: 0 for field in RETURN_FIELDS}
+        self.return_sums = {field: 0.0 for field in RETURN_FIELDS}
+
+    def add(self, returns:dict[str, float | None], rating:int | None):
+        self.total += 1
+        rating_key = "None" if rating is None else rating
+        self.morningstar_ratings[rating_key] = self.morningstar_ratings.get(rating_key, 0) + 1
         for field in RETURN_FIELDS:
-            value = getattr(ticker, field, None)
+            value = returns.get(field)
             if value is None:
-                return_none_counts[field] += 1
+                self.return_none_counts[field] += 1
             else:
-                return_sums[field] += value
-                return_counts[field] += 1
-
-    total_symbols = len(tickers)
-
-    # Calculate averages
-    return_averages = {
-        field: (return_sums[field] / return_counts[field]) if return_counts[field] > 0 else None
-        for field in RETURN_FIELDS
-    }
-
-    # Calculate percent of tickers for each star rating
-    morningstar_percentages = {
-        key: (count / total_symbols * 100) if total_symbols > 0 else 0
-        for key, count in morningstar_ratings.items()
-    }
-    # Calculate percent of tickers that have each return field as None
-    return_none_percentages = {
-        field: (return_none_counts[field] / total_symbols * 100) if total_symbols > 0 else 0
-        for field in RETURN_FIELDS
-    }
-
-
-
-    # Check return averages against their spec max values
-    return_spec_max = {
-        "return_ytd": RETURN_YTD_SPEC_MAX,
-        "return_1y": RETURN_1Y_SPEC_MAX,
-        "return_3y": RETURN_3Y_SPEC_MAX,
-        "return_5y": RETURN_5Y_SPEC_MAX,
-        "return_10y": RETURN_10Y_SPEC_MAX,
-        "return_15y": RETURN_15Y_SPEC_MAX,
-        "inception": RETURN_INCEPTION_SPEC_MAX,
-    }
-    for field, none_percent in return_none_percentages.items():
-        if none_percent is not None and none_percent > return_spec_max[field]:
-            failing_specs.append(f"{field} none percentage above spec: {none_percent:.2f} > {return_spec_max[field]}")
-
-    # Check morningstar percentages against their min/max specs
-    for rating, specs in MORNINGSTAR_RATING_SPECS.items():
-        percent = morningstar_percentages.get(rating, 0)
-        if percent < specs["min"] or percent > specs["max"]:
-            failing_specs.append(
-                f"Morningstar rating {rating} percentage out of spec: {percent:.2f}% (spec: {specs['min']}%-{specs['max']}%)"
-            )
+                self.return_sums[field] += value
+
+    def add_scrape_result(self, result:ScrapeResult):
+        returns = {column: getattr(result.trailing_returns, field) for field, column in TICKER_COLUMNS.items()}
+        self.add(returns, result.morningstar_rating)
+
+    def add_failure(self):
+        self.add({}, None)
+
+    def add_run_results(self, results:RunResults):
+        self.total += len(results)
+        for rating, count in results.rating_counts().items():
+            self.morningstar_ratings[rating] = self.morningstar_ratings.get(rating, 0) + count
+        for field in RETURN_FIELDS:
+            null_mask = results.return_null_masks[field]
+            self.return_none_counts[field] += int(null_mask.sum())
+            self.return_sums[field] += float(results.returns[field][~null_mask].sum())
+
+    def return_averages(self) -> dict[str, float | None]:
+        return_counts = {field: self.total - self.return_none_counts[field] for field in RETURN_FIELDS}
+        return {
+            field: (self.return_sums[field] / return_counts[field]) if return_counts[field] > 0 else None
+            for field in RETURN_FIELDS
+        }
+
+    def morningstar_percentages(self) -> dict[str | int, float]:
+        return {
+            key: (count / self.total * 100) if self.total > 0 else 0
+            for key, count in self.morningstar_ratings.items()
+        }
+
+    def return_none_percentages(self) -> dict[str, float]:
+        return {
+            field: (self.return_none_counts[field] / self.total * 100) if self.total > 0 else 0
+            for field in RETURN_FIELDS
+        }
+
+    def failing_specs(self) -> list[str]:
+        failing_specs = []
+        # Check return none percentages against their spec max values
+        for field, none_percent in self.return_none_percentages().items():
+            if none_percent > RETURN_SPEC_MAX[field]:
+                failing_specs.append(f"{field} none percentage above spec: {none_percent:.2f} > {RETURN_SPEC_MAX[field]}")
+
+        # Check morningstar percentages against their min/max specs
+        morningstar_percentages = self.morningstar_percentages()
+        for rating, specs in MORNINGSTAR_RATING_SPECS.items():
+            percent = morningstar_percentages.get(rating, 0)
+            if percent < specs["min"] or percent > specs["max"]:
+                failing_specs.append(
+                    f"Morningstar rating {rating} percentage out of spec: {percent:.2f}% (spec: {specs['min']}%-{specs['max']}%)"
+                )
+        return failing_specs
+
+    def clearly_failing_specs(self, z:float = CONTROLS_CONFIDENCE_Z) -> list[str]:
+        if self.total < CONTROLS_MIN_SAMPLE:
+            return []
+        failing_specs = []
+        for field in RETURN_FIELDS:
+            lower, _ = wilson_interval(self.return_none_counts[field], self.total, z)
+            if lower * 100 > RETURN_SPEC_MAX[field]:
+                failing_specs.append(f"{field} none percentage above spec: at least {lower * 100:.2f} > {RETURN_SPEC_MAX[field]} after {self.total} tickers")
+        for rating, specs in MORNINGSTAR_RATING_SPECS.items():
+            lower, upper = wilson_interval(self.morningstar_ratings.get(rating, 0), self.total, z)
+            if upper * 100 < specs["min"] or lower * 100 > specs["max"]:
+                failing_specs.append(
+                    f"Morningstar rating {rating} percentage out of spec: {lower * 100:.2f}%-{upper * 100:.2f}% (spec: {specs['min']}%-{specs['max']}%) after {self.total} tickers"
+                )
+        return failing_specs
+
+def check_data_controls(results:RunResults) -> list[str]:
+    logger.info("Checking data controls...")
+    controls = ControlsAccumulator()
+    controls.add_run_results(results)
+    failing_specs = controls.failing_specs()
 
     logging.info(
         "Morningstar Ratings: %s\n"
@@ -105,12 +158,12 @@ def check_data_controls(processor:Processor) -> list[str]:
         "Return None Percentages: %s\n"
         "Return Averages: %s\n"
         "Failing Specs: %s\n",
-        morningstar_ratings,
-        morningstar_percentages,
-        total_symbols,
-        return_none_counts,
-        return_none_percentages,
-        return_averages,
+        controls.morningstar_ratings,
+        controls.morningstar_percentages(),
+        controls.total,
+        controls.return_none_counts,
+        controls.return_none_percentages(),
+        controls.return_averages(),
         failing_specs
     )
     return failing_specs
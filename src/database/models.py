@@ -17,6 +17,7 @@ class Ticker(SQLModel, table=True):
     category: str | None # TT
     twelve_b_one_fee: float | None # TT
     morningstar_rating: int | None # TT/FF
+    ticker_type: str | None # FF
 
     # Only on Page
     negative_years: int | None # TT
@@ -25,3 +26,29 @@ class Ticker(SQLModel, table=True):
     processing_complete: int | None # Contains seconds since epoch if processing is complete
     processing_error: str | None # Contains string explaining why processing failed if processing failed
     processing_attempts: int = 0
+    failure_class: str | None # FailureClass of the last failure, attempts restart when it changes
+
+
+class RunStats(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    phase: str
+    started_at: int # Seconds since epoch
+    finished_at: int # Seconds since epoch
+    ticker_count: int
+
+
+class NegativeCache(SQLModel, table=True):
+    # Symbols that failed permanently. Survives clear_database so later runs skip them until they expire.
+    symbol: str = Field(primary_key=True)
+    failure_class: str
+    error: str
+    cached_at: int # Seconds since epoch
+    expires_at: int # Seconds since epoch
+
+
+class TimeoutEvent(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    symbol: str
+    step: str
+    failure_class: str
+    occurred_at: int # Seconds since epoch
@@ -1,29 +1,42 @@
 import logging
 import os
+from pathlib import Path
 import time
 
-from sqlalchemy import Engine
+from sqlalchemy import Engine, delete, func, inspect, text, update
 from sqlmodel import Session, SQLModel, create_engine, select
 
-from constants import MAX_PROCESSING_ATTEMPTS, OUTPUT_CSV_FILE_PATH
-from database.models import Ticker
-from models.trailing_returns import TrailingReturns
+from constants import DATABASE_FILE_PATH, OUTPUT_CSV_FILE_PATH, RUN_RESULTS_BATCH_ROWS
+from database.models import NegativeCache, RunStats, Ticker, TimeoutEvent
+from enums.failure_class import FailureClass
+from enums.run_phase import RunPhase
+from database.run_results import RETURN_FIELDS, RunResults
+from models.retry_policy import RETRY_POLICIES
+from models.scrape_result import ScrapeResult
+from models.trailing_returns import TICKER_COLUMNS, TrailingReturns, TrailingReturnsColumns
 
 # pylint: disable=C0121
 
 logger = logging.getLogger(__name__)
 
+# Ticker column -> csv row name, the camel cased TrailingReturns field
+CSV_ROW_NAMES = {
+    column: field.split("_")[0] + "".join(word.capitalize() for word in field.split("_")[1:])
+    for field, column in TICKER_COLUMNS.items()
+}
+
 class Processor():
     engine:Engine
     session:Session
     reuse_db:bool
-    def __init__(self, in_memory:bool = False, reuse_db:bool = False):
+    def __init__(self, in_memory:bool = False, reuse_db:bool = False, db_path:str = DATABASE_FILE_PATH):
         self.reuse_db = reuse_db
         if in_memory:
             self.engine = create_engine('sqlite+pysqlite:///:memory:')
         else:
-            self.engine = create_engine('sqlite:///database.db')
+            self.engine = create_engine(f'sqlite:///{db_path}')
         SQLModel.metadata.create_all(self.engine)
+        self._add_missing_columns()
 
     def __enter__(self):
         self.session = Session(self.engine)
@@ -34,12 +47,27 @@ class Processor():
     def __exit__(self, *_):
         self.session.close()
 
+    def _add_missing_columns(self):
+        # create_all does not alter existing tables so new nullable columns are added by hand
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            for table in SQLModel.metadata.sorted_tables:
+                existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing_columns or not column.nullable:
+                        continue
+                    logger.info("Adding missing column %s.%s", table.name, column.name)
+                    column_type = column.type.compile(self.engine.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
     def clear_database(self):
         logger.info("Clearing database")
         statement = select(Ticker)
         tickers = self.session.exec(statement).all()
         for ticker in tickers:
             self.session.delete(ticker)
+        self.session.execute(delete(TimeoutEvent))
+        self._mark_run_started()
         self.session.commit()
 
     def has_ticker_been_processed(self, ticker: str) -> bool:
@@ -47,38 +75,143 @@ class Processor():
         return self.session.exec(statement).first() is not None
     
     def add_list_of_tickers(self, tickers: list[str]):
+        existing_tickers = set(self.session.exec(select(Ticker.symbol)).all())
         logger.info("Adding %s tickers to database", len(tickers))
         for ticker_symbol in tickers:
-            self.session.add(Ticker(symbol=ticker_symbol))
+            if ticker_symbol not in existing_tickers:
+                self.session.add(Ticker(symbol=ticker_symbol))
+        self.session.commit()
+
+    def reset_failed_tickers(self):
+        # Negatively cached symbols keep their failure, retrying them in the same run would only fail again
+        cached = select(NegativeCache.symbol).where(NegativeCache.expires_at > int(time.time()))
+        statement = select(Ticker).where(Ticker.processing_error != None).where(Ticker.symbol.not_in(cached))
+        tickers = self.session.exec(statement).all()
+        logger.info("Resetting %s failed tickers", len(tickers))
+        for ticker in tickers:
+            ticker.processing_complete = None
+            ticker.processing_attempts = 0
+        self._mark_run_started()
+        self.session.commit()
+
+    def reset_stale_tickers(self, cutoff: int) -> int:
+        # Tickers completed before the cutoff are fetched again, negatively cached failures stay as they are
+        cached = select(NegativeCache.symbol).where(NegativeCache.expires_at > int(time.time()))
+        statement = select(Ticker).where(Ticker.processing_complete < cutoff).where(Ticker.symbol.not_in(cached))
+        tickers = self.session.exec(statement).all()
+        logger.info("Resetting %s tickers completed before %s", len(tickers), cutoff)
+        for ticker in tickers:
+            ticker.processing_complete = None
+            ticker.processing_attempts = 0
+        self.session.commit()
+        return len(tickers)
+
+    def get_unprocessed_tickers(self) -> list[str]:
+        statement = select(Ticker.symbol).where(Ticker.processing_complete == None)
+        return list(self.session.exec(statement).all())
+
+    def merge_from(self, db_path: str):
+        # Copies every ticker of another database into this one, replacing existing rows
+        # Brings the other database up to the current schema
+        Processor(reuse_db=True, db_path=db_path).engine.dispose()
+        columns = ', '.join(column.name for column in Ticker.__table__.columns)
         self.session.commit()
+        with self.engine.connect() as connection:
+            connection.execute(text("ATTACH DATABASE :db_path AS merge_source"), {"db_path": db_path})
+            connection.execute(text(f"INSERT OR REPLACE INTO {Ticker.__tablename__} ({columns}) SELECT {columns} FROM merge_source.{Ticker.__tablename__}"))
+            connection.execute(text(f"INSERT OR REPLACE INTO {NegativeCache.__tablename__} SELECT * FROM merge_source.{NegativeCache.__tablename__}"))
+            timeout_columns = "symbol, step, failure_class, occurred_at"
+            connection.execute(text(f"INSERT INTO {TimeoutEvent.__tablename__} ({timeout_columns}) SELECT {timeout_columns} FROM merge_source.{TimeoutEvent.__tablename__}"))
+            connection.commit()
+            connection.execute(text("DETACH DATABASE merge_source"))
 
     def add_trailing_returns(self, ticker: str, trailing_returns: TrailingReturns):
         statement = select(Ticker).where(Ticker.symbol == ticker)
         ticker:Ticker = self.session.exec(statement).first()
-        ticker.return_ytd = trailing_returns.ytd
-        ticker.return_1y = trailing_returns.one_year
-        ticker.return_3y = trailing_returns.three_year
-        ticker.return_5y = trailing_returns.five_year
-        ticker.return_10y = trailing_returns.ten_year
-        ticker.return_15y = trailing_returns.fifteen_year
-        ticker.inception = trailing_returns.inception
+        self._set_trailing_returns(ticker, trailing_returns)
         self.session.commit()
 
+    def add_trailing_returns_columns(self, tickers: list[str], columns: TrailingReturnsColumns, extra_columns: dict[str, list] | None = None):
+        # Bulk version of add_trailing_returns for the output of trailing_returns.batch_etl
+        values, null_masks = columns
+        ticker_columns = {
+            column: [None if is_null else value for value, is_null in zip(values[field].tolist(), null_masks[field].tolist())]
+            for field, column in TICKER_COLUMNS.items()
+        }
+        ticker_columns.update(extra_columns or {})
+        parameters = [
+            {"symbol": ticker, **{column: column_values[row] for column, column_values in ticker_columns.items()}}
+            for row, ticker in enumerate(tickers)
+        ]
+        if parameters:
+            self.session.execute(update(Ticker), parameters)
+        self.session.commit()
+
+    def add_scrape_result(self, ticker: str, result: ScrapeResult):
+        statement = select(Ticker).where(Ticker.symbol == ticker)
+        ticker:Ticker = self.session.exec(statement).first()
+        self._set_trailing_returns(ticker, result.trailing_returns)
+        ticker.morningstar_rating = result.morningstar_rating
+        ticker.ticker_type = result.ticker_type.value
+        ticker.processing_complete = int(time.time())
+        ticker.processing_error = None
+        ticker.failure_class = None
+        self.session.commit()
+
+    @staticmethod
+    def _set_trailing_returns(ticker: Ticker, trailing_returns: TrailingReturns):
+        for field, column in TICKER_COLUMNS.items():
+            setattr(ticker, column, getattr(trailing_returns, field))
+
     def add_morningstar_rating(self, ticker: str, rating: int):
         statement = select(Ticker).where(Ticker.symbol == ticker)
         ticker:Ticker = self.session.exec(statement).first()
         ticker.morningstar_rating = rating
         self.session.commit()
 
-    def handle_processing_error(self, ticker: str, error: Exception):
+    def handle_processing_error(self, ticker: str, error: Exception, failure_class: FailureClass = FailureClass.UNKNOWN) -> float | None:
+        # Returns the delay before the ticker should be retried or None once its failure class's retry budget is spent
+        policy = RETRY_POLICIES[failure_class]
         statement = select(Ticker).where(Ticker.symbol == ticker)
         ticker:Ticker = self.session.exec(statement).first()
+        if ticker.failure_class != failure_class.value:
+            ticker.failure_class = failure_class.value
+            ticker.processing_attempts = 0
         ticker.processing_error = repr(error)
-        if ticker.processing_attempts >= MAX_PROCESSING_ATTEMPTS:
-            logger.error("Exceeded maximum processing attempts for %s", ticker)
-            ticker.processing_complete = int(time.time())
         ticker.processing_attempts += 1
+        retry_delay = None
+        if ticker.processing_attempts >= policy.max_attempts:
+            logger.error("Exceeded maximum %s attempts for %s", failure_class.value, ticker.symbol)
+            ticker.processing_complete = int(time.time())
+            if policy.negative_cache_days is not None:
+                self._add_to_negative_cache(ticker.symbol, failure_class, repr(error), policy.negative_cache_days)
+        else:
+            retry_delay = policy.backoff(ticker.processing_attempts)
         self.session.commit()
+        return retry_delay
+
+    def _add_to_negative_cache(self, symbol: str, failure_class: FailureClass, error: str, days: int):
+        now = int(time.time())
+        self.session.merge(NegativeCache(symbol=symbol, failure_class=failure_class.value, error=error, cached_at=now, expires_at=now + days*24*60*60))
+
+    def get_negative_cache(self) -> dict[str, str]:
+        # Unexpired symbol -> error
+        statement = select(NegativeCache.symbol, NegativeCache.error).where(NegativeCache.expires_at > int(time.time()))
+        return dict(self.session.exec(statement).all())
+
+    def remove_from_negative_cache(self, symbol: str):
+        negative_cache = self.session.get(NegativeCache, symbol)
+        if negative_cache is not None:
+            self.session.delete(negative_cache)
+            self.session.commit()
+
+    def purge_expired_negative_cache(self) -> int:
+        statement = select(NegativeCache).where(NegativeCache.expires_at <= int(time.time()))
+        expired = self.session.exec(statement).all()
+        for negative_cache in expired:
+            self.session.delete(negative_cache)
+        self.session.commit()
+        return len(expired)
 
     def mark_ticker_as_processed_unsuccessfully(self, ticker: str, error: Exception):
         statement = select(Ticker).where(Ticker.symbol == ticker)
@@ -94,53 +227,73 @@ class Processor():
         ticker.processing_error = None
         self.session.commit()
 
+    def get_failed_ticker_errors(self) -> dict[str, str]:
+        statement = select(Ticker.symbol, Ticker.processing_error).where(Ticker.processing_error != None)
+        return dict(self.session.exec(statement).all())
+
     def get_failed_tickers(self) -> list[str]:
-        statement = select(Ticker).where(Ticker.processing_error != None)
-        tickers = self.session.exec(statement).all()
-        return [ticker.symbol for ticker in tickers]
+        statement = select(Ticker.symbol).where(Ticker.processing_error != None)
+        return list(self.session.exec(statement).all())
     
     def get_everything(self) -> list[Ticker]:
         statement = select(Ticker)
         return self.session.exec(statement).all()
-    
-    def export_to_csv(self):
-        statement = select(Ticker)
-        tickers = self.session.exec(statement).all()
-        symbols_row_string = 'symbol'
-        ytd_row_string = 'ytd'
-        one_year_row_string = 'oneYear'
-        three_year_row_string = 'threeYear'
-        five_year_row_string = 'fiveYear'
-        ten_year_row_string = 'tenYear'
-        fifteen_year_row_string = 'fifteenYear'
-        inception_row_string = 'inception'
-        star_rating_row_string = 'starRating'
-        for ticker in tickers:
-            symbols_row_string += f',{ticker.symbol}'
-            ytd_row_string += f',{self._csv_cell(ticker.return_ytd)}'
-            one_year_row_string += f',{self._csv_cell(ticker.return_1y)}'
-            three_year_row_string += f',{self._csv_cell(ticker.return_3y)}'
-            five_year_row_string += f',{self._csv_cell(ticker.return_5y)}'
-            ten_year_row_string += f',{self._csv_cell(ticker.return_10y)}'
-            fifteen_year_row_string += f',{self._csv_cell(ticker.return_15y)}'
-            inception_row_string += f',{self._csv_cell(ticker.inception)}'
-            star_rating_row_string += f',{self._csv_cell(ticker.morningstar_rating)}'
-
-        os.makedirs(os.path.dirname(OUTPUT_CSV_FILE_PATH), exist_ok=True)
-        with open(OUTPUT_CSV_FILE_PATH, 'w', encoding="utf-8") as csv:
-            csv.write(f'{symbols_row_string}\n')
-            csv.write(f'{ytd_row_string}\n')
-            csv.write(f'{one_year_row_string}\n')
-            csv.write(f'{three_year_row_string}\n')
-            csv.write(f'{five_year_row_string}\n')
-            csv.write(f'{ten_year_row_string}\n')
-            csv.write(f'{fifteen_year_row_string}\n')
-            csv.write(f'{inception_row_string}\n')
-            csv.write(f'{star_rating_row_string}\n')
 
-    @staticmethod
-    def _csv_cell(value: float | int | None) -> str:
-        if value is None:
-            return ''
-        return str(value)
+    def get_run_results(self) -> RunResults:
+        statement = select(
+            Ticker.symbol,
+            *[getattr(Ticker, field) for field in RETURN_FIELDS],
+            Ticker.morningstar_rating,
+            Ticker.ticker_type,
+            Ticker.processing_error != None,
+        )
+        # Counted first so the rows can be streamed into preallocated columns
+        count = self.session.exec(select(func.count()).select_from(Ticker)).one()
+        return RunResults.from_rows(self.session.exec(statement.execution_options(yield_per=RUN_RESULTS_BATCH_ROWS)), count)
+
+    def record_timeout(self, ticker: str, step: str, failure_class: FailureClass):
+        self.session.add(TimeoutEvent(symbol=ticker, step=step, failure_class=failure_class.value, occurred_at=int(time.time())))
+        self.session.commit()
+
+    def get_timeout_counts(self) -> dict[str, int]:
+        # Timeouts of the current run by step
+        statement = select(TimeoutEvent.step, func.count()).group_by(TimeoutEvent.step)
+        return dict(self.session.exec(statement).all())
+
+    def record_run(self, phase: str, started_at: int, ticker_count: int):
+        self.session.add(RunStats(phase=phase, started_at=started_at, finished_at=int(time.time()), ticker_count=ticker_count))
+        self.session.commit()
+
+    def get_recent_runs(self, phase: str, limit: int) -> list[RunStats]:
+        statement = select(RunStats).where(RunStats.phase == phase).order_by(RunStats.started_at.desc()).limit(limit)
+        return self.session.exec(statement).all()
+
+    def _mark_run_started(self):
+        # Clearing or resetting the ticker table starts a run, the table no longer matches the last finalized run
+        now = int(time.time())
+        self.session.add(RunStats(phase=RunPhase.START.value, started_at=now, finished_at=now, ticker_count=0))
+
+    def is_run_in_progress(self) -> bool:
+        latest_start = self.get_latest_run(RunPhase.START.value)
+        latest_finalize = self.get_latest_run(RunPhase.FINALIZE.value)
+        if latest_start is None:
+            return False
+        return latest_finalize is None or latest_start.id > latest_finalize.id
+
+    def get_latest_run(self, phase: str) -> RunStats | None:
+        # By insertion rather than start time so runs started within the same second stay ordered
+        statement = select(RunStats).where(RunStats.phase == phase).order_by(RunStats.id.desc())
+        return self.session.exec(statement).first()
+
+    def export_to_csv(self, results: RunResults | None = None, output_path: Path | None = None):
+        if results is None:
+            results = self.get_run_results()
+        output_path = output_path or OUTPUT_CSV_FILE_PATH
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'w', encoding="utf-8") as csv:
+            csv.write(f"symbol,{','.join(results.symbols.tolist())}\n")
+            for field in RETURN_FIELDS:
+                csv.write(f"{CSV_ROW_NAMES[field]},{','.join(results.return_cells(field))}\n")
+            csv.write(f"starRating,{','.join(results.rating_cells())}\n")
+
 
@@ -0,0 +1,106 @@
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from models.trailing_returns import TICKER_COLUMNS
+
+RETURN_FIELDS = list(TICKER_COLUMNS.values())
+
+def _read_only(array:np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+class RunResults:
+    # Column oriented, read only view of a run. Null values are NaN/0 in the value columns and True in the masks.
+    symbols:np.ndarray
+    returns:dict[str, np.ndarray]
+    return_null_masks:dict[str, np.ndarray]
+    ratings:np.ndarray
+    rating_null_mask:np.ndarray
+    ticker_types:np.ndarray
+    failed_mask:np.ndarray
+
+    def __init__(self, symbols:np.ndarray, returns:dict[str, np.ndarray], return_null_masks:dict[str, np.ndarray],
+                 ratings:np.ndarray, rating_null_mask:np.ndarray, ticker_types:np.ndarray, failed_mask:np.ndarray):
+        self.symbols = _read_only(symbols)
+        self.returns = {field: _read_only(column) for field, column in returns.items()}
+        self.return_null_masks = {field: _read_only(mask) for field, mask in return_null_masks.items()}
+        self.ratings = _read_only(ratings)
+        self.rating_null_mask = _read_only(rating_null_mask)
+        self.ticker_types = _read_only(ticker_types)
+        self.failed_mask = _read_only(failed_mask)
+        self._index:Optional[dict[str, int]] = None
+
+    @classmethod
+    def from_rows(cls, rows:Iterable[Sequence], count:int) -> 'RunResults':
+        # Rows are (symbol, *RETURN_FIELDS, morningstar_rating, ticker_type, failed). A missing ticker type is ''.
+        # Rows are consumed one at a time into preallocated columns so a streamed result is never held in full.
+        symbols:list[str] = []
+        ticker_types:list[str] = []
+        returns = {field: np.full(count, np.nan, dtype=np.float64) for field in RETURN_FIELDS}
+        ratings = np.zeros(count, dtype=np.int8)
+        rating_null_mask = np.ones(count, dtype=bool)
+        failed_mask = np.zeros(count, dtype=bool)
+        for row, (symbol, *values, rating, ticker_type, failed) in zip(range(count), rows):
+            symbols.append(symbol)
+            ticker_types.append(ticker_type or '')
+            for field, value in zip(RETURN_FIELDS, values):
+                if value is not None:
+                    returns[field][row] = value
+            if rating is not None:
+                ratings[row] = rating
+                rating_null_mask[row] = False
+            failed_mask[row] = bool(failed)
+        filled = len(symbols)
+        return cls(
+            symbols=np.array(symbols, dtype=str),
+            returns={field: column[:filled] for field, column in returns.items()},
+            return_null_masks={field: np.isnan(column[:filled]) for field, column in returns.items()},
+            ratings=ratings[:filled],
+            rating_null_mask=rating_null_mask[:filled],
+            ticker_types=np.array(ticker_types, dtype=str),
+            failed_mask=failed_mask[:filled],
+        )
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    @property
+    def nbytes(self) -> int:
+        columns = [self.symbols, self.ratings, self.rating_null_mask, self.ticker_types, self.failed_mask]
+        columns += list(self.returns.values()) + list(self.return_null_masks.values())
+        return sum(column.nbytes for column in columns)
+
+    def index_of(self, symbol:str) -> Optional[int]:
+        if self._index is None:
+            self._index = {symbol: row for row, symbol in enumerate(self.symbols.tolist())}
+        return self._index.get(symbol)
+
+    def take(self, symbols:Iterable[str]) -> 'RunResults':
+        # Subset of the run in the given symbol order, symbols missing from the run are skipped
+        rows = np.array([row for row in map(self.index_of, symbols) if row is not None], dtype=np.intp)
+        return RunResults(
+            symbols=self.symbols[rows],
+            returns={field: column[rows] for field, column in self.returns.items()},
+            return_null_masks={field: mask[rows] for field, mask in self.return_null_masks.items()},
+            ratings=self.ratings[rows],
+            rating_null_mask=self.rating_null_mask[rows],
+            ticker_types=self.ticker_types[rows],
+            failed_mask=self.failed_mask[rows],
+        )
+
+    def failed_symbols(self) -> list[str]:
+        return self.symbols[self.failed_mask].tolist()
+
+    def rating_counts(self) -> dict[str | int, int]:
+        counts:dict[str | int, int] = {"None": int(self.rating_null_mask.sum())}
+        rated = self.ratings[~self.rating_null_mask]
+        for rating in range(1, 6):
+            counts[rating] = int((rated == rating).sum())
+        return counts
+
+    def return_cells(self, field:str) -> Iterable[str]:
+        return ('' if is_null else str(value) for value, is_null in zip(self.returns[field].tolist(), self.return_null_masks[field].tolist()))
+
+    def rating_cells(self) -> Iterable[str]:
+        return ('' if is_null else str(rating) for rating, is_null in zip(self.ratings.tolist(), self.rating_null_mask.tolist()))
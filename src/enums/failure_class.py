@@ -0,0 +1,11 @@
+from enum import Enum
+
+class FailureClass(Enum):
+    NOT_FOUND = "not_found"
+    EMPTY_TABLE = "empty_table"
+    TIMEOUT = "timeout"
+    HUNG = "hung"
+    DRIVER_CRASH = "driver_crash"
+    AUTH_LOST = "auth_lost"
+    THROTTLED = "throttled"
+    UNKNOWN = "unknown"
@@ -0,0 +1,8 @@
+from enum import Enum
+
+class RunPhase(Enum):
+    START = "start"
+    PREWARM = "prewarm"
+    REFRESH = "refresh"
+    HEALTHCHECK = "healthcheck"
+    FINALIZE = "finalize"
@@ -1,4 +1,13 @@
 import os
 
 def get_root_dir():
-    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
\ No newline at end of file
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def ticker_to_ms_ticker(ticker:str) -> str:
+    ms_ticker = ticker.replace("/", ".")
+    return ms_ticker
+
+def ms_ticker_to_ticker(ms_ticker:str) -> str:
+    # Client lists write share classes as BRK/B, morningstar as BRK.B
+    ticker = ms_ticker.replace(".", "/")
+    return ticker
@@ -0,0 +1,54 @@
+import atexit
+from datetime import datetime, timezone
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import os
+import queue
+
+from constants import LOG_BACKUP_COUNT, LOG_FILE_NAME, LOG_FORMAT, LOG_JSON_FILE_NAME, LOG_MAX_BYTES, LOG_STRUCTURED_FIELDS
+
+_listener:QueueListener | None = None
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record:logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in LOG_STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry, default=str)
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def configure_logging(json_logs:bool = False) -> QueueListener:
+    global _listener
+    stop_logging()
+    # Records are handed to a background listener so file writes and rollovers never block the caller
+    os.makedirs(os.path.dirname(LOG_FILE_NAME), exist_ok=True)
+    text_handler = RotatingFileHandler(LOG_FILE_NAME, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+    text_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers:list[logging.Handler] = [text_handler]
+    if json_logs:
+        json_handler = RotatingFileHandler(LOG_JSON_FILE_NAME, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+        json_handler.setFormatter(JsonLogFormatter())
+        handlers.append(json_handler)
+
+    log_queue:queue.SimpleQueue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler], force=True)
+    return _listener
+
+atexit.register(stop_logging)
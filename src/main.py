@@ -1,50 +1,59 @@
-import csv
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
 import os
-import queue
+from pathlib import Path
 import time
-from typing import List
+from typing import Collection, List
 
 from constants import *
+from constants import ABORT_ON_FAILING_CONTROLS, ADMIN_EMAIL, ARCHIVE_HTML, ARCHIVE_PAGES, CAPTURE_FAILURE_DOM
+from archive.page_archive import PageArchive
 from database.query_processor import Processor
+from enums.failure_class import FailureClass
+from enums.run_phase import RunPhase
 from enums.ticker_types import TickerType
-from controls import check_data_controls
-from messenger.email import send_email_with_results
+from helpers import ticker_to_ms_ticker
+from controls import CONTROLS_EVALUATION_INTERVAL, ControlsAccumulator, ControlsFailedError, check_data_controls
+from messenger.email import send_email_with_results, send_emails
+from models.scrape_result import ScrapeResult
 from models.trailing_returns import TrailingReturns
+from models.outgoing_email import OutgoingEmail
+from models.retry_policy import RETRY_POLICIES
+from models.universe import Universe
+from logging_setup import configure_logging
+from profiling import instrument_scraper, profiled
+from scheduler import Scheduler, SystemClock, last_market_close
+from scraper.exceptions import CachedFailureError, TickerBudgetExceededError
+from scraper.failures import classify_failure
 from scraper.ms_scraper import Scraper
+from sharding import ShardRing, shard_db_path
+from universes import export_universes, load_universe_funds, resolve_work_set
+from work_queue.base import DeadLetteredError, WorkItem, WorkQueue
+from work_queue.completion import check_job_completion
+from work_queue.in_process import InProcessWorkQueue
 import logging
-from datetime import timedelta
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.INFO,
-    handlers = [RotatingFileHandler(LOG_FILE_NAME, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)],
-    format=LOG_FORMAT
-)
-
-is_first_run = True
 
 def read_funds_csv() -> set[str]:
-    funds:set[str] = set()
-    file_path = None
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    for root, dirs, files in os.walk(project_root + CSV_FILE_PATH):
-        for file in files:
-            if file.endswith(".csv"):
-                file_path = os.path.join(root, file)
-                break
-        break
-    if not file_path:
-        exception = FileNotFoundError("No fund file found")
-        logger.exception("No fund file found: %s", repr(exception))
-        raise exception
-    with open(file_path, mode='r', encoding="utf-8-sig") as file:
-        csv_reader = csv.reader(file)
-        for row in csv_reader:
-            if row:
-                funds.add(row[0])
-    return funds
+    # The deduplicated work set of every configured universe
+    _, universe_funds = load_universe_funds()
+    return resolve_work_set(universe_funds)
+
+def add_work_set(processor:Processor, tickers:Collection[str]) -> list[str]:
+    # Adds the run's tickers and returns the ones to scrape. Symbols that failed permanently on an earlier run are
+    # not scraped again until their cache entry expires, they are recorded as failed with the cached error instead.
+    processor.purge_expired_negative_cache()
+    negative_cache = processor.get_negative_cache()
+    processor.add_list_of_tickers(tickers)
+    cached = sorted(ticker for ticker in tickers if ticker in negative_cache)
+    for ticker in cached:
+        processor.mark_ticker_as_processed_unsuccessfully(ticker, CachedFailureError(negative_cache[ticker]))
+    if cached:
+        logger.info("Skipping %s symbols that failed permanently on an earlier run: %s", len(cached), cached)
+    return [ticker for ticker in tickers if ticker not in negative_cache]
+
+def is_cached_failure(processing_error:str) -> bool:
+    return processing_error.startswith(f"{CachedFailureError.__name__}(")
 
 def main_tickertracker():
     with Processor(reuse_db=True) as processor:
@@ -71,136 +80,287 @@ def is_non_ticker(ticker:str) -> bool:
         return True
     return False
 
-def ticker_to_ms_ticker(ticker:str) -> str:
-    ms_ticker = ticker.replace("/", ".")
-    return ms_ticker
-
-def sleep_until_time(hour:int):
-    now = datetime.now()
-    sleep_target = now.replace(hour=hour, minute=0, second=0, microsecond=0)
-    if now >= sleep_target:
-        sleep_target += timedelta(days=1)
-    seconds_until_six_am = (sleep_target - now).total_seconds() + 1
-    logger.info("Sleeping until %s. Time remaining: %s", hour, time.strftime('%H:%M:%S', time.gmtime(seconds_until_six_am)))
-    time.sleep(seconds_until_six_am)
-
-    seconds_until_six_am = (sleep_target - datetime.now()).total_seconds() + 1
-    while seconds_until_six_am > 0:
-        logger.info("Sleeping until %s. Time remaining: %s", hour, time.strftime('%H:%M:%S', time.gmtime(seconds_until_six_am)))
-        time.sleep(seconds_until_six_am)
-        seconds_until_six_am = (sleep_target - datetime.now()).total_seconds() + 1
-
-
-def get_next_nearest_process_hour():
-    now = datetime.now()
-    run_hours:list[int] = HEALTHCHECK_TIMES_HOUR[:]
-    run_hours.append(TARGET_RUN_TIME)
-    run_hours.sort()
-    for hour in run_hours:
-        if now.hour >= hour:
-            continue
-        return hour
-    return run_hours[0]
-
-def get_previous_nearest_process_hour():
-    now = datetime.now()
-    run_hours:list[int] = HEALTHCHECK_TIMES_HOUR[:]
-    run_hours.append(TARGET_RUN_TIME)
-    run_hours.sort(reverse=True)
-    for hour in run_hours:
-        if now.hour <= hour:
-            continue
-        return hour
-    return run_hours[0]
-
-def sleep_until_next_nearest_process_hour() -> bool:
-    global is_first_run
-    if is_first_run:
-        is_first_run = False
-        process_hour = get_previous_nearest_process_hour()
-        logger.info("First run detected. First Run set to %s", is_first_run)
+def log_progress(progress:float, start_time:float):
+    elapsed_time:int = int(time.time() - start_time)
+    elapsed_time_str = time.strftime('%H:%M:%S', time.gmtime(elapsed_time))
+    if progress == 0:
+        estimated_time_remaining_str = "N/A"
     else:
-        process_hour = get_next_nearest_process_hour()
-        sleep_until_time(process_hour)
-    now = datetime.now()
-    if process_hour == TARGET_RUN_TIME and now.weekday() < 5:
-        logger.info("Client run time reached. Results will be sent to clients.")
+        estimated_time_remaining:int = int((elapsed_time / progress) - elapsed_time)
+        estimated_time_remaining_str = time.strftime('%H:%M:%S', time.gmtime(estimated_time_remaining))
+    logger.info("Progress: %.2f Percent Complete, Elapsed Time %s, Estimated time remaining %s", round(progress*100, 2), elapsed_time_str, estimated_time_remaining_str)
+
+def create_scraper() -> Scraper:
+    archive = PageArchive() if ARCHIVE_PAGES else None
+    scraper = Scraper(headless=True, archive=archive, archive_html=ARCHIVE_HTML, capture_dom=CAPTURE_FAILURE_DOM)
+    instrument_scraper(scraper)
+    return scraper
+
+def check_streaming_controls(controls:ControlsAccumulator) -> bool:
+    # Returns True once the admin has been alerted
+    failing_specs = controls.clearly_failing_specs()
+    if not failing_specs:
         return False
-    logger.info("Healthcheck run time reached. Results will not be sent to clients.")
+    logger.error("Data controls are clearly failing mid-run: %s", failing_specs)
+    if ABORT_ON_FAILING_CONTROLS:
+        raise ControlsFailedError(failing_specs)
+    # A failed alert is not retried, the final controls still report the failure
+    try:
+        send_email_with_results(f"Data controls are failing mid-run and the run is continuing: {failing_specs}", [ADMIN_EMAIL], attach_results=False)
+    except Exception as e:
+        logger.exception("Failed to send the mid-run controls alert: %s", repr(e))
     return True
 
-def main():
+def scrape_from_queue(work_queue:WorkQueue, processor:Processor, scraper:Scraper, controls:ControlsAccumulator | None = None):
+    original_queue_size = max(work_queue.pending_count(), 1)
+    start_time:float = time.time()
+    iterations = 0
+    controls_alerted = False
+    # Set after a throttled scrape, nothing is received until then so no item is held through the pause
+    paused_until = 0.0
+    work_queue.on_dead_letter = lambda ticker, receive_count: handle_dead_letter(processor, ticker, receive_count)
     while True:
+        pause_seconds = paused_until - time.time()
+        if pause_seconds > 0:
+            time.sleep(pause_seconds)
+        item = work_queue.receive()
+        if item is None:
+            if work_queue.is_drained():
+                return
+            time.sleep(QUEUE_POLL_INTERVAL)
+            continue
+        if iterations % LOG_PROGRESS_INTERVAL == 0:
+            log_progress(1 - work_queue.pending_count() / original_queue_size, start_time)
+        iterations += 1
+        ticker = item.body
+        if is_non_ticker(ticker):
+            logger.info("Skipping %s as it is not a valid ticker", ticker)
+            work_queue.ack(item)
+            continue
+        if processor.has_ticker_been_processed(ticker):
+            logger.info("Skipping %s as it has already been processed", ticker)
+            work_queue.ack(item)
+            continue
+        scrape_start = time.perf_counter()
+        result:ScrapeResult | None = None
+        gave_up = False
         try:
-            healthcheck = sleep_until_next_nearest_process_hour()
-            tickers:set[str] = read_funds_csv()
-            ticker_queue = queue.Queue()
-            for ticker in tickers:
-                ticker_queue.put(ticker)
-            progress:float = 0.0
-            original_queue_size = ticker_queue.qsize()
-            start_time:int = int(time.time())
-            with Processor() as processor:
-                processor.add_list_of_tickers(tickers)
-                with Scraper(headless=True) as scraper:
-                    while not ticker_queue.empty():
-                        progress = 1 - ticker_queue.qsize() / original_queue_size
-                        curr_time:int = int(time.time())
-                        elapsed_time:int = curr_time - start_time
-                        elapsed_time_str = time.strftime('%H:%M:%S', time.gmtime(elapsed_time))
-                        if progress == 0:
-                            estimated_time_remaining_str = "N/A"
-                        else:
-                            estimated_time_remaining:int = int((elapsed_time / progress) - elapsed_time)
-                            estimated_time_remaining_str = time.strftime('%H:%M:%S', time.gmtime(estimated_time_remaining))
-                        logger.info("Progress: %.2f Percent Complete, Elapsed Time %s, Estimated time remaining %s", round(progress*100, 2), elapsed_time_str, estimated_time_remaining_str)
-                        ticker = ticker_queue.get()
-                        if is_non_ticker(ticker):
-                            logger.info("Skipping %s as it is not a valid ticker", ticker)
-                            continue
-                        if processor.has_ticker_been_processed(ticker):
-                            logger.info("Skipping %s as it has already been processed", ticker)
-                            continue
-                        try:
-                            logger.info("Processing %s", ticker)
-                            ticker_type:TickerType = scraper.find_ticker(ticker_to_ms_ticker(ticker))
-                            logger.info("Step 1/3 Complete - %s is a %s", ticker, ticker_type.value)
-                            trailing_returns:TrailingReturns = scraper.get_trailing_returns(ticker_type) # THIS HAS TO BE BEFORE RATING ELSE RATING WILL RETURN FALSE POSITIVES
-                            logger.info("Step 2/3 Complete - %s has trailing returns %s", ticker, trailing_returns)
-                            processor.add_trailing_returns(ticker, trailing_returns)
-                            morningstar_rating = scraper.get_morningstar_rating(ticker_type)
-                            logger.info("Step 3/3 Complete - %s has an ms rating of %s", ticker, morningstar_rating)
-                            processor.add_morningstar_rating(ticker, morningstar_rating)
-                            processor.mark_ticker_as_processed_successfully(ticker)
-                            logger.info("%s has been processed successfully", ticker)
-                        except Exception as e:
-                            logger.exception("Error processing %s: %s", ticker, repr(e))
-                            processor.handle_processing_error(ticker, e)
-                            ticker_queue.put(ticker)
-                data_controls_failures = check_data_controls(processor)
-                processor.export_to_csv()
-                failed_tickers = processor.get_failed_tickers()
-                result_str = f"FundFinder Processing Completed at {datetime.now().strftime('%H:%M:%S')}"
-                if len(failed_tickers) > 0 or len(data_controls_failures) > 0:
-                    logger.info("The following tickers failed %s", failed_tickers)
-                    if not healthcheck:
-                        if len(failed_tickers) > 30:
-                            logger.error("More than 30 tickers failed skipping sending to clients.")
-                            send_email_with_results(f"{result_str}\n\nMore than 30 tickers failed skipping sending to clients: {failed_tickers}", [ADMIN_EMAIL])
-                        else:
-                            send_email_with_results(f"{result_str}", CLIENT_EMAILS)
-                            send_email_with_results(f"{result_str}\n\nHealthcheck shows unhealthy for the following tickers: {failed_tickers}\nAnd the following controls failed: {data_controls_failures}", [ADMIN_EMAIL])
-                    else:
-                        send_email_with_results(f"{result_str}\n\nHealthcheck shows unhealthy for the following tickers: {failed_tickers}\nAnd the following controls failed: {data_controls_failures}", [ADMIN_EMAIL])
-                else:
-                    if not healthcheck:
-                        send_email_with_results(result_str, CLIENT_EMAILS)
-                    else:
-                        logger.info("Healthcheck run shows healthy.")
-            logger.info("Processing complete")
+            with scraper.watchdog.deadline("ticker_budget", TICKER_BUDGET_SECONDS, scraper.kill_driver, TickerBudgetExceededError):
+                result = scraper.scrape_ticker(ticker_to_ms_ticker(ticker))
+            processor.add_scrape_result(ticker, result)
+            work_queue.ack(item)
+            logger.info(
+                "%s is a %s with trailing returns %s and an ms rating of %s", ticker, result.ticker_type.value, result.trailing_returns, result.morningstar_rating,
+                extra={"ticker": ticker, "step": "scrape", "duration": round(time.perf_counter() - scrape_start, 3)}
+            )
+        except Exception as e:
+            # Saving may have failed after a successful scrape
+            result = None
+            failure_class = classify_failure(e)
+            logger.exception(
+                "Error processing %s (%s): %s", ticker, failure_class.value, repr(e),
+                extra={"ticker": ticker, "step": failure_class.value, "duration": round(time.perf_counter() - scrape_start, 3)}
+            )
+            retry_delay = handle_scrape_failure(work_queue, processor, scraper, item, e, failure_class)
+            gave_up = retry_delay is None
+            if not gave_up and RETRY_POLICIES[failure_class].pause_scraping:
+                logger.warning("Pausing scraping for %s seconds after %s", retry_delay, failure_class.value)
+                paused_until = time.time() + retry_delay
+        # Outside the ticker's error handling so an alert or abort is never mistaken for a scrape failure.
+        # Tickers that failed for good count as empty rows, as they will in the final controls.
+        if controls is not None and (result is not None or gave_up):
+            if result is not None:
+                controls.add_scrape_result(result)
+            else:
+                controls.add_failure()
+            if not controls_alerted and controls.total % CONTROLS_EVALUATION_INTERVAL == 0:
+                controls_alerted = check_streaming_controls(controls)
+
+def handle_dead_letter(processor:Processor, ticker:str, receive_count:int):
+    # A ticker whose worker kept dying never recorded its own failure, it would otherwise stay unprocessed forever
+    if not processor.has_ticker_been_processed(ticker):
+        processor.mark_ticker_as_processed_unsuccessfully(ticker, DeadLetteredError(f"Dead lettered after {receive_count} receives"))
+
+def handle_scrape_failure(work_queue:WorkQueue, processor:Processor, scraper:Scraper, item:WorkItem, error:Exception, failure_class:FailureClass) -> float | None:
+    # Returns the delay the ticker was put back with or None once it has failed for good
+    policy = RETRY_POLICIES[failure_class]
+    if failure_class in (FailureClass.TIMEOUT, FailureClass.HUNG):
+        processor.record_timeout(item.body, getattr(error, "step", "wait"), failure_class)
+    retry_delay = processor.handle_processing_error(item.body, error, failure_class)
+    if retry_delay is None:
+        work_queue.ack(item)
+        return None
+    if policy.relogin:
+        try:
+            scraper.relogin()
         except Exception as e:
-            logger.exception("Error in main loop: %s", repr(e))
-            send_email_with_results(f"SERVICE IS UNHEALTHY. Error: {repr(e)}", [ADMIN_EMAIL])
+            logger.exception("Failed to log in again after %s: %s", failure_class.value, repr(e))
+    # Released before any pause, a held item would outlive its visibility timeout
+    work_queue.retry(item, retry_delay)
+    return retry_delay
+
+def client_emails(body:str, universes:list[Universe], output_paths:dict[str, Path]) -> list[OutgoingEmail]:
+    return [OutgoingEmail(body=body, recipients=universe.recipients, attachment_path=output_paths[universe.name]) for universe in universes]
+
+def finalize_run(processor:Processor, healthcheck:bool, universes:list[Universe], universe_funds:dict[str, list[str]]):
+    started_at = int(time.time())
+    results = processor.get_run_results()
+    # Symbols skipped after failing on an earlier run are exported as failed rows and listed for the admin,
+    # but only this run's failures count towards the client email threshold and the controls
+    cached_failures = {symbol: error for symbol, error in processor.get_failed_ticker_errors().items() if is_cached_failure(error)}
+    failed_tickers = [symbol for symbol in results.failed_symbols() if symbol not in cached_failures]
+    data_controls_failures = check_data_controls(results.take(symbol for symbol in results.symbols.tolist() if symbol not in cached_failures))
+    processor.export_to_csv(results)
+    output_paths = export_universes(processor, results, universes, universe_funds)
+    timeout_counts = processor.get_timeout_counts()
+    logger.info("Run summary: %s symbols, %s failed, %s skipped as cached failures, timeouts by step %s", len(results), len(failed_tickers), len(cached_failures), timeout_counts)
+    # Marks the snapshot as complete for the read api
+    processor.record_run(RunPhase.FINALIZE.value, started_at, len(results))
+    result_str = f"FundFinder Processing Completed at {datetime.now().strftime('%H:%M:%S')}"
+    unhealthy_str = f"{result_str}\n\nHealthcheck shows unhealthy for the following tickers: {failed_tickers}\nAnd the following controls failed: {data_controls_failures}\nTimeouts by step: {timeout_counts}\nSkipped after failing on an earlier run: {cached_failures}"
+    emails:list[OutgoingEmail] = []
+    if len(failed_tickers) > 0 or len(data_controls_failures) > 0:
+        logger.info("The following tickers failed %s", failed_tickers)
+        if not healthcheck:
+            if len(failed_tickers) > 30:
+                logger.error("More than 30 tickers failed skipping sending to clients.")
+                emails.append(OutgoingEmail(body=f"{result_str}\n\nMore than 30 tickers failed skipping sending to clients: {failed_tickers}", recipients=[ADMIN_EMAIL], attachment_path=OUTPUT_CSV_FILE_PATH))
+            else:
+                emails += client_emails(result_str, universes, output_paths)
+                emails.append(OutgoingEmail(body=unhealthy_str, recipients=[ADMIN_EMAIL], attachment_path=OUTPUT_CSV_FILE_PATH))
+        else:
+            emails.append(OutgoingEmail(body=unhealthy_str, recipients=[ADMIN_EMAIL], attachment_path=OUTPUT_CSV_FILE_PATH))
+    else:
+        if not healthcheck:
+            emails += client_emails(result_str, universes, output_paths)
+        else:
+            logger.info("Healthcheck run shows healthy.")
+    # Client and admin variants share the attachments built once and are sent concurrently
+    send_emails(emails)
+    logger.info("Processing complete")
+
+@profiled
+def run_once(healthcheck:bool):
+    universes, universe_funds = load_universe_funds()
+    work_queue = InProcessWorkQueue()
+    with Processor() as processor:
+        tickers = add_work_set(processor, resolve_work_set(universe_funds))
+        work_queue.put(tickers)
+        with create_scraper() as scraper:
+            scrape_from_queue(work_queue, processor, scraper, ControlsAccumulator())
+        finalize_run(processor, healthcheck, universes, universe_funds)
+
+@profiled
+def prewarm_run():
+    started_at = int(time.time())
+    work_queue = InProcessWorkQueue()
+    with Processor() as processor:
+        tickers = add_work_set(processor, read_funds_csv())
+        work_queue.put(tickers)
+        with create_scraper() as scraper:
+            scrape_from_queue(work_queue, processor, scraper, ControlsAccumulator())
+        processor.record_run(RunPhase.PREWARM.value, started_at, len(tickers))
+
+@profiled
+def refresh_run(healthcheck:bool):
+    # Re-fetches the tickers the pre-warm phase could not complete or finished before the last market close then sends the results
+    universes, universe_funds = load_universe_funds()
+    work_queue = InProcessWorkQueue()
+    with Processor(reuse_db=True) as processor:
+        processor.reset_failed_tickers()
+        processor.reset_stale_tickers(int(last_market_close(datetime.now()).timestamp()))
+        tickers = processor.get_unprocessed_tickers()
+        logger.info("Refreshing %s tickers", len(tickers))
+        if tickers:
+            work_queue.put(tickers)
+            with create_scraper() as scraper:
+                scrape_from_queue(work_queue, processor, scraper)
+        finalize_run(processor, healthcheck, universes, universe_funds)
+
+def estimate_prewarm_seconds() -> float:
+    ticker_count = len(read_funds_csv())
+    try:
+        with Processor(reuse_db=True) as processor:
+            recent_runs = processor.get_recent_runs(RunPhase.PREWARM.value, PREWARM_HISTORY_RUNS)
+    except Exception:
+        logger.exception("Failed to read pre-warm history, assuming %s seconds per ticker", PREWARM_DEFAULT_SECONDS_PER_TICKER)
+        recent_runs = []
+    seconds_per_ticker = [
+        (run.finished_at - run.started_at) / run.ticker_count
+        for run in recent_runs if run.ticker_count > 0
+    ]
+    if seconds_per_ticker:
+        seconds_per_ticker.sort()
+        throughput = seconds_per_ticker[len(seconds_per_ticker) // 2]
+    else:
+        throughput = PREWARM_DEFAULT_SECONDS_PER_TICKER
+    return throughput * ticker_count * (1 + PREWARM_SAFETY_MARGIN)
+
+def notify_admin_of_error(error:Exception):
+    send_email_with_results(f"SERVICE IS UNHEALTHY. Error: {repr(error)}", [ADMIN_EMAIL], attach_results=False)
+
+def enqueue_run(work_queue:WorkQueue, run_id:str, db_path:str = DATABASE_FILE_PATH):
+    with Processor(db_path=db_path) as processor:
+        tickers = add_work_set(processor, read_funds_csv())
+    work_queue.start_run(run_id, tickers)
+    logger.info("Enqueued %s tickers for run %s", len(tickers), run_id)
+
+@profiled
+def run_worker(work_queue:WorkQueue, run_id:str, healthcheck:bool, db_path:str = DATABASE_FILE_PATH):
+    universes, universe_funds = load_universe_funds()
+    with Processor(reuse_db=True, db_path=db_path) as processor:
+        with create_scraper() as scraper:
+            scrape_from_queue(work_queue, processor, scraper, ControlsAccumulator())
+        check_job_completion(work_queue, run_id, lambda: finalize_run(processor, healthcheck, universes, universe_funds))
+
+@profiled
+def run_shard(shard:int, shard_count:int, resume:bool = False):
+    work_queue = InProcessWorkQueue()
+    with Processor(reuse_db=resume, db_path=shard_db_path(shard)) as processor:
+        if resume:
+            processor.reset_failed_tickers()
+        tickers = add_work_set(processor, ShardRing(shard_count).split(read_funds_csv())[shard])
+        work_queue.put(tickers)
+        logger.info("Scraping %s tickers for shard %s of %s", len(tickers), shard, shard_count)
+        with create_scraper() as scraper:
+            scrape_from_queue(work_queue, processor, scraper, ControlsAccumulator())
+
+@profiled
+def merge_shards(shard_count:int, healthcheck:bool, allow_incomplete:bool = False):
+    # Every shard is checked before the main database is cleared so a refused merge leaves the previous results intact
+    universes, universe_funds = load_universe_funds()
+    incomplete_shards:list[int] = []
+    shard_paths:list[str] = []
+    for shard in range(shard_count):
+        db_path = shard_db_path(shard)
+        if not os.path.exists(db_path):
+            incomplete_shards.append(shard)
+            continue
+        with Processor(reuse_db=True, db_path=db_path) as shard_processor:
+            unprocessed_tickers = shard_processor.get_unprocessed_tickers()
+        shard_processor.engine.dispose()
+        if unprocessed_tickers:
+            logger.error("Shard %s has %s unprocessed tickers", shard, len(unprocessed_tickers))
+            incomplete_shards.append(shard)
+        shard_paths.append(db_path)
+    if incomplete_shards and not allow_incomplete:
+        raise ValueError(f"Shards {incomplete_shards} are missing or incomplete and need to be re-run")
+    with Processor() as processor:
+        for db_path in shard_paths:
+            processor.merge_from(db_path)
+        finalize_run(processor, healthcheck, universes, universe_funds)
+
+def main():
+    scheduler = Scheduler(
+        SystemClock(),
+        on_prewarm=prewarm_run,
+        on_refresh=lambda send_to_clients: refresh_run(healthcheck=not send_to_clients),
+        on_healthcheck=lambda: run_once(healthcheck=True),
+        estimate_prewarm_seconds=estimate_prewarm_seconds,
+        on_error=notify_admin_of_error,
+    )
+    scheduler.run_forever()
 
 if __name__ == "__main__":
+    configure_logging()
     main()
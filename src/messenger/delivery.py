@@ -0,0 +1,233 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from functools import cache
+import gzip
+import hashlib
+import io
+import logging
+import math
+from pathlib import Path
+import threading
+import time
+from typing import List, Optional, Protocol
+import zipfile
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import (
+    BotoCoreError,
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+from constants import (
+    DELIVERY_LINK_EXPIRY_SECONDS,
+    DELIVERY_MAX_WORKERS,
+    DELIVERY_RETRY_BACKOFF,
+    DELIVERY_SIZE_HEADROOM,
+    SES_MAX_MESSAGE_BYTES,
+)
+from messenger.local_ses import LocalSesClient
+from models.outgoing_email import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERROR_CODES = {"Throttling", "ThrottlingException", "ServiceUnavailable", "InternalFailure", "RequestTimeout"}
+# Transient network failures, configuration errors like missing credentials or region fail straight away
+RETRYABLE_BOTOCORE_ERRORS = (EndpointConnectionError, ConnectTimeoutError, ConnectionClosedError, ReadTimeoutError)
+COMPRESSIONS = [None, "gzip", "zip"]
+
+class Uploader(Protocol):
+    def upload(self, filename:str, data:bytes) -> str:
+        ...
+
+class S3DownloadUploader:
+    def __init__(self, bucket:str, expires_in:int = DELIVERY_LINK_EXPIRY_SECONDS):
+        self.bucket = bucket
+        self.expires_in = expires_in
+        self.s3 = boto3.client('s3')
+
+    def upload(self, filename:str, data:bytes) -> str:
+        key = f"{datetime.now().strftime('%Y-%m-%d')}/{filename}"
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=data)
+        return self.s3.generate_presigned_url('get_object', Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.expires_in)
+
+class DeliveryError(Exception):
+    def __init__(self, failures:List[tuple[OutgoingEmail, Exception]]):
+        super().__init__(f"Failed to deliver {len(failures)} emails: {[repr(error) for _, error in failures]}")
+        self.failures = failures
+
+class PreparedAttachment:
+    # The MIME parts of one attachment, built once and shared by every email that carries it.
+    # Each part is sent in its own email, or download_url replaces the attachment when it is too large.
+    parts:List[MIMEApplication]
+    download_url:Optional[str]
+
+    def __init__(self, parts:List[MIMEApplication], download_url:Optional[str] = None):
+        self.parts = parts
+        self.download_url = download_url
+
+def compress(filename:str, data:bytes, compression:Optional[str]) -> tuple[str, bytes]:
+    if compression is None:
+        return filename, data
+    if compression == "gzip":
+        return f"{filename}.gz", gzip.compress(data, mtime=0)
+    if compression == "zip":
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr(filename, data)
+        return f"{Path(filename).stem}.zip", buffer.getvalue()
+    raise ValueError(f"Unknown attachment compression {compression}, expected one of {COMPRESSIONS}")
+
+def split_csv_columns(data:bytes, parts:int) -> List[bytes]:
+    # Exports have one column per symbol so every part keeps the row names and a slice of the symbols
+    rows = [line.split(",") for line in data.decode("utf-8").splitlines()]
+    width = max(len(row) for row in rows) - 1
+    chunk = math.ceil(width / parts)
+    return [
+        "".join(",".join([row[0], *row[1 + start:1 + start + chunk]]) + "\n" for row in rows).encode("utf-8")
+        for start in range(0, width, chunk)
+    ]
+
+def _mime_part(filename:str, data:bytes) -> MIMEApplication:
+    part = MIMEApplication(data)
+    part.add_header('Content-Disposition', 'attachment', filename=filename)
+    return part
+
+def _is_retryable(error:Exception) -> bool:
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES
+    return isinstance(error, RETRYABLE_BOTOCORE_ERRORS)
+
+class ResultDelivery:
+    # Sends result emails through one shared SES client. Attachments are read, compressed and encoded once per run
+    # however many emails carry them, and emails are sent concurrently with retries on throttling.
+    def __init__(self, ses_client, source:Optional[str] = None, compression:Optional[str] = None, uploader:Optional[Uploader] = None,
+                 max_workers:int = DELIVERY_MAX_WORKERS, max_message_bytes:int = SES_MAX_MESSAGE_BYTES,
+                 retry_backoff:Optional[List[float]] = None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown attachment compression {compression}, expected one of {COMPRESSIONS}")
+        self.ses_client = ses_client
+        self.source = source
+        self.compression = compression
+        self.uploader = uploader
+        self.max_workers = max_workers
+        self.max_attachment_bytes = int(max_message_bytes * DELIVERY_SIZE_HEADROOM)
+        self.retry_backoff = DELIVERY_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        self._attachments:dict[Path, tuple[str, PreparedAttachment]] = {}
+        self._lock = threading.Lock()
+
+    def _source(self) -> str:
+        if self.source is None:
+            from constants import EMAIL_SOURCE
+            self.source = EMAIL_SOURCE
+        return self.source
+
+    def prepare_attachment(self, path:Path) -> PreparedAttachment:
+        # Keyed on the file's content so a long running scheduler picks up each new export,
+        # even one rewritten within the filesystem's timestamp resolution at the same size
+        with open(path, 'rb') as attachment:
+            data = attachment.read()
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if path not in self._attachments or self._attachments[path][0] != digest:
+                self._attachments[path] = (digest, self._prepare_attachment(path, data))
+            return self._attachments[path][1]
+
+    def _prepare_attachment(self, path:Path, data:bytes) -> PreparedAttachment:
+        filename, compressed = compress(path.name, data, self.compression)
+        part = _mime_part(filename, compressed)
+        if len(part.as_bytes()) <= self.max_attachment_bytes:
+            return PreparedAttachment([part])
+        if self.uploader is not None:
+            logger.info("Attachment %s is too large to email, sending a download link instead", filename)
+            return PreparedAttachment([], self.uploader.upload(filename, compressed))
+        # Base64 grows the attachment so the first guess at the number of parts is usually enough
+        part_count = math.ceil(len(part.as_bytes()) / self.max_attachment_bytes)
+        while True:
+            chunks = split_csv_columns(data, part_count)
+            parts = [
+                _mime_part(*compress(f"{path.stem}_part{index}of{len(chunks)}{path.suffix}", chunk, self.compression))
+                for index, chunk in enumerate(chunks, start=1)
+            ]
+            if all(len(part.as_bytes()) <= self.max_attachment_bytes for part in parts) or len(chunks) < part_count:
+                logger.info("Attachment %s is too large to email, splitting it into %s parts", path.name, len(parts))
+                return PreparedAttachment(parts)
+            part_count += 1
+
+    def _build_messages(self, email:OutgoingEmail) -> List[bytes]:
+        current_date = datetime.now().strftime("%b. %d, %Y")
+        attachment = self.prepare_attachment(email.attachment_path) if email.attachment_path is not None else None
+        bodies_and_parts:List[tuple[str, Optional[MIMEApplication]]]
+        if attachment is None:
+            bodies_and_parts = [(email.body, None)]
+        elif attachment.download_url is not None:
+            bodies_and_parts = [(f"{email.body}\n\nThe results are too large to attach and can be downloaded from {attachment.download_url}", None)]
+        elif len(attachment.parts) == 1:
+            bodies_and_parts = [(email.body, attachment.parts[0])]
+        else:
+            bodies_and_parts = [
+                (f"{email.body}\n\nResults part {index} of {len(attachment.parts)}", part)
+                for index, part in enumerate(attachment.parts, start=1)
+            ]
+        messages = []
+        for body, part in bodies_and_parts:
+            msg = MIMEMultipart()
+            msg['Subject'] = f'FundFetcher Results: {current_date}'
+            msg['From'] = self._source()
+            msg['To'] = ', '.join(email.recipients)
+            msg.attach(MIMEText(body, "plain"))
+            if part is not None:
+                msg.attach(part)
+            messages.append(msg.as_bytes())
+        return messages
+
+    def _send_raw(self, recipients:List[str], data:bytes):
+        for backoff in [*self.retry_backoff, None]:
+            try:
+                return self.ses_client.send_raw_email(Source=self._source(), Destinations=recipients, RawMessage={"Data": data})
+            except (ClientError, BotoCoreError) as e:
+                if backoff is None or not _is_retryable(e):
+                    raise
+                logger.warning("Retrying email to %s in %s seconds after %s", recipients, backoff, repr(e))
+                time.sleep(backoff)
+
+    def send(self, email:OutgoingEmail):
+        for data in self._build_messages(email):
+            self._send_raw(email.recipients, data)
+
+    def send_all(self, emails:List[OutgoingEmail]):
+        # Attachments are prepared up front so concurrent sends share them instead of racing to build them
+        for email in emails:
+            if email.attachment_path is not None:
+                self.prepare_attachment(email.attachment_path)
+        failures:List[tuple[OutgoingEmail, Exception]] = []
+        with ThreadPoolExecutor(max_workers=max(min(self.max_workers, len(emails)), 1)) as executor:
+            futures = [(email, executor.submit(self.send, email)) for email in emails]
+            for email, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.exception("Failed to send email to %s", email.recipients)
+                    failures.append((email, e))
+        if failures:
+            raise DeliveryError(failures)
+
+@cache
+def get_ses_client():
+    from constants import SES_OUTBOX
+    if SES_OUTBOX:
+        return LocalSesClient(SES_OUTBOX)
+    return boto3.client('ses', config=Config(max_pool_connections=DELIVERY_MAX_WORKERS))
+
+@cache
+def get_delivery() -> ResultDelivery:
+    from constants import ATTACHMENT_COMPRESSION, DELIVERY_BUCKET
+    uploader = S3DownloadUploader(DELIVERY_BUCKET) if DELIVERY_BUCKET else None
+    return ResultDelivery(get_ses_client(), compression=ATTACHMENT_COMPRESSION, uploader=uploader)
@@ -1,29 +1,12 @@
-from email.mime.application import MIMEApplication
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-import boto3
+from pathlib import Path
+from typing import List
 
-from constants import EMAIL_SOURCE, OUTPUT_CSV_FILE, OUTPUT_CSV_FILE_PATH
-from datetime import datetime
+from constants import OUTPUT_CSV_FILE_PATH
+from messenger.delivery import get_delivery
+from models.outgoing_email import OutgoingEmail
 
-def send_email_with_results(body: str, recipients: list[str]):
-    msg = MIMEMultipart()
-    current_date = datetime.now().strftime("%b. %d, %Y")
-    msg['Subject'] = f'FundFetcher Results: {current_date}'
-    msg['From'] = EMAIL_SOURCE
-    msg['To'] = str(recipients).replace('[', '').replace(']', '').replace("'", '')
-    body = MIMEText(body, "plain")
-    msg.attach(body)
+def send_email_with_results(body: str, recipients: list[str], attach_results: bool = True, attachment_path: Path = OUTPUT_CSV_FILE_PATH):
+    get_delivery().send(OutgoingEmail(body=body, recipients=recipients, attachment_path=attachment_path if attach_results else None))
 
-    with open(OUTPUT_CSV_FILE_PATH, 'rb') as attachment:
-        output_file = MIMEApplication(attachment.read())
-        output_file.add_header('Content-Disposition', 'attachment', filename=OUTPUT_CSV_FILE)
-        msg.attach(output_file)
-
-
-    ses = boto3.client('ses')
-    response = ses.send_raw_email(
-        Source=EMAIL_SOURCE,
-        Destinations=recipients,
-        RawMessage={"Data": msg.as_bytes()}
-    )
+def send_emails(emails: List[OutgoingEmail]):
+    get_delivery().send_all(emails)
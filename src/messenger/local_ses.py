@@ -0,0 +1,54 @@
+from email import message_from_bytes
+from email.message import Message
+from pathlib import Path
+import threading
+import uuid
+from typing import List, Optional
+
+from botocore.exceptions import ClientError
+
+from constants import SES_MAX_MESSAGE_BYTES
+
+class LocalSesClient:
+    # Stand-in for the boto3 SES client. Sent messages are kept in memory and optionally written to an outbox folder.
+    # Error codes in failures are raised by the next calls, in order, to exercise retries.
+    sent:List[dict]
+
+    def __init__(self, outbox:Optional[str | Path] = None, failures:Optional[List[str]] = None, max_message_bytes:int = SES_MAX_MESSAGE_BYTES):
+        self.outbox = Path(outbox) if outbox is not None else None
+        self.failures = list(failures or [])
+        self.max_message_bytes = max_message_bytes
+        self.sent = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def send_raw_email(self, Source:str, Destinations:List[str], RawMessage:dict) -> dict: # pylint: disable=C0103
+        data:bytes = RawMessage["Data"]
+        with self._lock:
+            self.calls += 1
+            if self.failures:
+                code = self.failures.pop(0)
+                raise ClientError({"Error": {"Code": code, "Message": code}}, "SendRawEmail")
+            if len(data) > self.max_message_bytes:
+                raise ClientError({"Error": {"Code": "MessageRejected", "Message": "Message length exceeds limit"}}, "SendRawEmail")
+            message_id = str(uuid.uuid4())
+            self.sent.append({"MessageId": message_id, "Source": Source, "Destinations": list(Destinations), "Data": data})
+        if self.outbox is not None:
+            self.outbox.mkdir(parents=True, exist_ok=True)
+            (self.outbox / f"{message_id}.eml").write_bytes(data)
+        return {"MessageId": message_id}
+
+    def messages(self) -> List[Message]:
+        with self._lock:
+            return [message_from_bytes(sent["Data"]) for sent in self.sent]
+
+class LocalFileUploader:
+    # Stand-in for S3DownloadUploader that copies attachments into a folder and links to them by file url
+    def __init__(self, folder:str | Path):
+        self.folder = Path(folder)
+
+    def upload(self, filename:str, data:bytes) -> str:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        path = self.folder / filename
+        path.write_bytes(data)
+        return path.resolve().as_uri()
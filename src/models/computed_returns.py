@@ -0,0 +1,76 @@
+import calendar
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from constants import PRICE_HISTORY_RETURN_TOLERANCE
+from models.trailing_returns import TrailingReturns
+
+# Trailing return field -> (months back, days back). Horizons of three years or more are annualized like Morningstar.
+HORIZONS: Dict[str, Tuple[int, int]] = {
+    "one_week": (0, 7),
+    "one_month": (1, 0),
+    "three_month": (3, 0),
+    "one_year": (12, 0),
+    "three_year": (36, 0),
+    "five_year": (60, 0),
+    "ten_year": (120, 0),
+    "fifteen_year": (180, 0),
+}
+ANNUALIZED_MIN_MONTHS = 36
+DAYS_PER_YEAR = 365.25
+
+def _months_before(as_of:date, months:int) -> date:
+    year, month = divmod(as_of.year * 12 + as_of.month - 1 - months, 12)
+    month += 1
+    return date(year, month, min(as_of.day, calendar.monthrange(year, month)[1]))
+
+def _total_return_index(navs:np.ndarray, distributions:np.ndarray) -> np.ndarray:
+    growth = np.ones_like(navs)
+    growth[1:] = (navs[1:] + distributions[1:]) / navs[:-1]
+    return np.cumprod(growth)
+
+def compute_trailing_returns(price_history:List[Tuple[date, float, float]], as_of:Optional[date] = None) -> TrailingReturns:
+    if len(price_history) < 2:
+        return TrailingReturns()
+    dates, navs, distributions = zip(*price_history)
+    dates = np.array(dates, dtype='datetime64[D]')
+    index = _total_return_index(np.array(navs, dtype=np.float64), np.array(distributions, dtype=np.float64))
+
+    as_of = as_of or dates[-1].item()
+    end = np.searchsorted(dates, np.datetime64(as_of, 'D'), side='right') - 1
+    if end < 1:
+        return TrailingReturns()
+
+    fields = list(HORIZONS) + ["ytd"]
+    start_dates = [_months_before(as_of, months) - timedelta(days=days) for months, days in HORIZONS.values()]
+    start_dates.append(date(as_of.year - 1, 12, 31))
+    # The base of every horizon is the last trading day on or before its start date
+    bases = np.searchsorted(dates, np.array(start_dates, dtype='datetime64[D]'), side='right') - 1
+    available = bases >= 0
+    cumulative = index[end] / index[np.where(available, bases, 0)] - 1
+    years = (np.datetime64(as_of, 'D') - np.array(start_dates, dtype='datetime64[D]')).astype(np.float64) / DAYS_PER_YEAR
+    annualize = np.array([months >= ANNUALIZED_MIN_MONTHS for months, _ in HORIZONS.values()] + [False])
+    returns = np.where(annualize, np.power(1 + cumulative, 1 / years) - 1, cumulative) * 100
+
+    values:Dict[str, Optional[float]] = {
+        field: float(value) if is_available else None
+        for field, value, is_available in zip(fields, returns, available)
+    }
+    values["one_day"] = float((index[end] / index[end - 1] - 1) * 100)
+    inception_years = (dates[end] - dates[0]).astype(np.float64) / DAYS_PER_YEAR
+    inception = index[end] / index[0]
+    values["inception"] = float(((inception ** (1 / inception_years) if inception_years > 1 else inception) - 1) * 100)
+    return TrailingReturns(**{TrailingReturns.model_fields[field].alias: value for field, value in values.items()})
+
+def compare_trailing_returns(computed:TrailingReturns, scraped:TrailingReturns, tolerance:float = PRICE_HISTORY_RETURN_TOLERANCE) -> Dict[str, Tuple[float, float]]:
+    mismatches:Dict[str, Tuple[float, float]] = {}
+    scraped_values = scraped.model_dump()
+    for field, computed_value in computed.model_dump().items():
+        scraped_value = scraped_values[field]
+        if computed_value is None or scraped_value is None:
+            continue
+        if abs(computed_value - scraped_value) > tolerance:
+            mismatches[field] = (computed_value, scraped_value)
+    return mismatches
@@ -0,0 +1,8 @@
+from pathlib import Path
+from typing import List, Optional
+from pydantic import BaseModel
+
+class OutgoingEmail(BaseModel):
+    body: str
+    recipients: List[str]
+    attachment_path: Optional[Path] = None
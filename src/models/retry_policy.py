@@ -0,0 +1,31 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+from constants import MAX_PROCESSING_ATTEMPTS
+from enums.failure_class import FailureClass
+
+class RetryPolicy(BaseModel):
+    max_attempts: int
+    # Delay before the nth retry, the last value repeats
+    backoff_seconds: List[float]
+    relogin: bool = False
+    # Throttling affects every ticker so the scrape loop itself waits out the backoff
+    pause_scraping: bool = False
+    # Permanent failures are skipped on later runs until the negative cache entry expires
+    negative_cache_days: Optional[int] = None
+
+    def backoff(self, attempt:int) -> float:
+        return self.backoff_seconds[min(attempt, len(self.backoff_seconds)) - 1]
+
+RETRY_POLICIES = {
+    FailureClass.NOT_FOUND: RetryPolicy(max_attempts=2, backoff_seconds=[60], negative_cache_days=30),
+    FailureClass.EMPTY_TABLE: RetryPolicy(max_attempts=3, backoff_seconds=[60, 5*60], negative_cache_days=7),
+    FailureClass.TIMEOUT: RetryPolicy(max_attempts=5, backoff_seconds=[10, 60, 5*60, 10*60]),
+    # The watchdog killed the driver. Retries go to the back of the queue so one slow symbol does not block the rest.
+    FailureClass.HUNG: RetryPolicy(max_attempts=3, backoff_seconds=[0, 5*60], relogin=True),
+    # The scrape loop logs in again once per crash, outside the ticker's budget
+    FailureClass.DRIVER_CRASH: RetryPolicy(max_attempts=5, backoff_seconds=[0, 10, 60, 5*60], relogin=True),
+    FailureClass.AUTH_LOST: RetryPolicy(max_attempts=3, backoff_seconds=[0, 60, 5*60], relogin=True),
+    FailureClass.THROTTLED: RetryPolicy(max_attempts=6, backoff_seconds=[60, 5*60, 10*60, 30*60, 60*60], pause_scraping=True),
+    FailureClass.UNKNOWN: RetryPolicy(max_attempts=MAX_PROCESSING_ATTEMPTS, backoff_seconds=[0]),
+}
@@ -0,0 +1,10 @@
+from typing import Optional
+from pydantic import BaseModel
+
+from enums.ticker_types import TickerType
+from models.trailing_returns import TrailingReturns
+
+class ScrapeResult(BaseModel):
+    ticker_type: TickerType
+    trailing_returns: TrailingReturns
+    morningstar_rating: Optional[int] = None
@@ -1,4 +1,7 @@
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 from pydantic import BaseModel, Field
 
 class TrailingReturns(BaseModel):
@@ -14,17 +17,83 @@ class TrailingReturns(BaseModel):
     ytd: Optional[float] = Field(None, alias="ytd")
     inception: Optional[float] = Field(None, alias="earliest available")
 
+FIELDS: List[str] = list(TrailingReturns.model_fields)
+# Lowercased table header -> TrailingReturns field
+HEADER_FIELD_MAP: Dict[str, str] = {field.alias: name for name, field in TrailingReturns.model_fields.items()}
+# TrailingReturns field -> Ticker column
+TICKER_COLUMNS: Dict[str, str] = {
+    "ytd": "return_ytd",
+    "one_year": "return_1y",
+    "three_year": "return_3y",
+    "five_year": "return_5y",
+    "ten_year": "return_10y",
+    "fifteen_year": "return_15y",
+    "inception": "inception",
+}
+NULL_CELLS = ["", "—", "–", "-", "--", "n/a", "na", "nan"]
+MINUS_SIGNS = ["−", "–", "‒"]
+
+TrailingReturnsColumns = Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]
+
+@lru_cache(maxsize=64)
+def _header_fields(title_data:Tuple[str, ...]) -> Tuple[Optional[str], ...]:
+    return tuple(HEADER_FIELD_MAP.get(title.lower().strip()) for title in title_data)
+
+def _parse_cells(cells:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Returns float values and a null mask for an array of raw cell strings
+    cleaned = np.char.strip(np.char.lower(cells.astype(str)))
+    for minus_sign in MINUS_SIGNS:
+        cleaned = np.char.replace(cleaned, minus_sign, "-")
+    for separator in [",", "%", " ", "\xa0"]:
+        cleaned = np.char.replace(cleaned, separator, "")
+    null_mask = np.isin(cleaned, NULL_CELLS)
+    values = np.full(cleaned.shape, np.nan)
+    candidates = np.flatnonzero(~null_mask)
+    try:
+        values[candidates] = cleaned[candidates].astype(np.float64)
+    except ValueError:
+        for index in candidates:
+            try:
+                values[index] = float(cleaned[index])
+            except ValueError:
+                null_mask[index] = True
+    return values, null_mask
+
+def parse_number(raw:str) -> Optional[float]:
+    values, null_mask = _parse_cells(np.array([raw]))
+    return None if null_mask[0] else float(values[0])
+
+def batch_etl(tables:Sequence[Tuple[List[str], List[str]]]) -> TrailingReturnsColumns:
+    # Parses many (title_data, raw_data) tables at once into one float column and null mask per TrailingReturns field
+    values = {field: np.full(len(tables), np.nan) for field in FIELDS}
+    null_masks = {field: np.ones(len(tables), dtype=bool) for field in FIELDS}
+    rows, fields, cells = [], [], []
+    for row, (title_data, raw_data) in enumerate(tables):
+        for field, raw in zip(_header_fields(tuple(title_data)), raw_data):
+            if field is not None:
+                rows.append(row)
+                fields.append(field)
+                cells.append(raw)
+    if not cells:
+        return values, null_masks
+    parsed_values, parsed_nulls = _parse_cells(np.array(cells))
+    rows = np.array(rows)
+    fields = np.array(fields)
+    for field in FIELDS:
+        selected = fields == field
+        values[field][rows[selected]] = parsed_values[selected]
+        null_masks[field][rows[selected]] = parsed_nulls[selected]
+    return values, null_masks
+
 def etl(title_data:List[str], raw_data:List[str]) -> TrailingReturns:
-    data_dict:Dict[str, Optional[float]] = {}
-    for i, title in enumerate(title_data):
-        try:
-            data_dict[title.lower().strip()] = float(raw_data[i])
-        except ValueError:
-            data_dict[title.lower()] = None
-    return TrailingReturns(**data_dict)
+    values, null_masks = batch_etl([(title_data, raw_data)])
+    return TrailingReturns.model_construct(**{
+        field: None if null_masks[field][0] else float(values[field][0])
+        for field in FIELDS
+    })
 
 def is_all_null(trailing_returns:TrailingReturns) -> bool:
-    for value in trailing_returns.model_dump().values():
-        if value is not None:
+    for field in FIELDS:
+        if getattr(trailing_returns, field) is not None:
             return False
-    return True
\ No newline at end of file
+    return True
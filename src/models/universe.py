@@ -0,0 +1,18 @@
+from pathlib import Path
+from typing import List, Optional
+from pydantic import BaseModel
+
+from constants import OUTPUT_CSV_FILE, OUTPUT_CSV_FILE_PATH
+
+class Universe(BaseModel):
+    name: str
+    # Relative to the funds folder. None uses the first csv found there.
+    funds_file: Optional[str] = None
+    recipients: List[str] = []
+    output_file: Optional[str] = None
+
+    @property
+    def output_path(self) -> Path:
+        if self.output_file is None:
+            return OUTPUT_CSV_FILE_PATH.with_name(f"{self.name}_{OUTPUT_CSV_FILE}")
+        return OUTPUT_CSV_FILE_PATH.parent / self.output_file
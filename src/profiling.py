@@ -0,0 +1,207 @@
+import cProfile
+from datetime import datetime
+import functools
+import json
+import logging
+from pathlib import Path
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+from constants import PROFILE_FOLDER, PROFILE_SCRAPER_STEPS, PROFILE_TOP_ALLOCATORS, PROFILE_TOP_FUNCTIONS, PROFILE_TRACEMALLOC_FRAMES
+
+logger = logging.getLogger(__name__)
+
+# Substrings of a profiled function's file or builtin name -> layer its own time is attributed to
+LAYER_MARKERS = {
+    "webdriver": ("selenium", "undetected_chromedriver", "urllib3", "http/client", "socket", "_ssl"),
+    "database": ("sqlalchemy", "sqlmodel", "sqlite3"),
+    "sleep": ("time.sleep",),
+}
+
+_folder:Optional[Path] = None
+_active:Optional['RunProfiler'] = None
+
+def enable(folder:str | Path = PROFILE_FOLDER):
+    global _folder
+    _folder = Path(folder)
+
+def disable():
+    global _folder
+    _folder = None
+
+def is_enabled() -> bool:
+    return _folder is not None
+
+def _short_path(filename:str) -> str:
+    # Strips interpreter specific prefixes so reports from different machines diff cleanly
+    for prefix in sorted((path for path in sys.path if path), key=len, reverse=True):
+        if filename.startswith(prefix):
+            return filename[len(prefix):].lstrip("/\\")
+    return filename
+
+def _function_name(function:tuple[str, int, str]) -> str:
+    filename, line, name = function
+    if filename == "~":
+        return name
+    return f"{_short_path(filename)}:{line}({name})"
+
+def _layer(function_name:str) -> str:
+    for layer, markers in LAYER_MARKERS.items():
+        if any(marker in function_name for marker in markers):
+            return layer
+    return "python"
+
+class WebDriverCommandCounter:
+    # Counts the commands sent to the driver and the time spent waiting on them per innermost Scraper step
+    commands:dict[str, dict[str, int]]
+    seconds:dict[str, float]
+
+    def __init__(self):
+        self.commands = {}
+        self.seconds = {}
+        # Per thread so the watchdog calling kill_driver does not disturb the scrape thread's attribution
+        self._local = threading.local()
+
+    def _method_stack(self) -> list[str]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def instrument_scraper(self, scraper, steps:tuple[str, ...] = PROFILE_SCRAPER_STEPS):
+        for name in steps:
+            if callable(getattr(scraper, name, None)):
+                setattr(scraper, name, self._wrap_method(name, getattr(scraper, name)))
+
+    def _wrap_method(self, name:str, method:Callable) -> Callable:
+        @functools.wraps(method)
+        def counted_method(*args, **kwargs):
+            method_stack = self._method_stack()
+            method_stack.append(name)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                method_stack.pop()
+        return counted_method
+
+    def instrument_driver(self, driver):
+        executor = driver.command_executor
+        execute = executor.execute
+
+        @functools.wraps(execute)
+        def counted_execute(command, params):
+            method_stack = self._method_stack()
+            method = method_stack[-1] if method_stack else "<outside scraper>"
+            start = time.perf_counter()
+            try:
+                return execute(command, params)
+            finally:
+                method_commands = self.commands.setdefault(method, {})
+                method_commands[command] = method_commands.get(command, 0) + 1
+                self.seconds[method] = self.seconds.get(method, 0.0) + time.perf_counter() - start
+        executor.execute = counted_execute
+
+class RunProfiler:
+    name:str
+    webdriver:WebDriverCommandCounter
+
+    def __init__(self, name:str):
+        self.name = name
+        self.webdriver = WebDriverCommandCounter()
+        self._profile = cProfile.Profile()
+        self._started_at = datetime.now()
+        self._start = 0.0
+
+    def start(self):
+        self._started_at = datetime.now()
+        self._start = time.perf_counter()
+        tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        self._profile.enable()
+
+    def stop(self) -> dict:
+        self._profile.disable()
+        wall_seconds = time.perf_counter() - self._start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return self._report(wall_seconds, snapshot, peak_bytes)
+
+    def _report(self, wall_seconds:float, snapshot:tracemalloc.Snapshot, peak_bytes:int) -> dict:
+        stats = pstats.Stats(self._profile).stats
+        time_by_layer = {layer: 0.0 for layer in [*LAYER_MARKERS, "python"]}
+        functions = {}
+        for function, (_, calls, total_time, cumulative_time, _) in stats.items():
+            name = _function_name(function)
+            time_by_layer[_layer(name)] += total_time
+            functions[name] = {"calls": calls, "tottime": round(total_time, 6), "cumtime": round(cumulative_time, 6)}
+        top_functions = sorted(functions, key=lambda name: functions[name]["cumtime"], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        return {
+            "name": self.name,
+            "started_at": self._started_at.isoformat(timespec="seconds"),
+            "wall_seconds": round(wall_seconds, 3),
+            "time_by_layer": {layer: round(seconds, 3) for layer, seconds in time_by_layer.items()},
+            "functions": {name: functions[name] for name in top_functions},
+            "memory": {
+                "peak_bytes": peak_bytes,
+                "top_allocators": {
+                    f"{_short_path(statistic.traceback[0].filename)}:{statistic.traceback[0].lineno}": {
+                        "size_bytes": statistic.size, "count": statistic.count,
+                    }
+                    for statistic in snapshot.statistics("lineno")[:PROFILE_TOP_ALLOCATORS]
+                },
+            },
+            "webdriver_commands": self.webdriver.commands,
+            "webdriver_seconds": {method: round(seconds, 3) for method, seconds in self.webdriver.seconds.items()},
+        }
+
+def write_report(report:dict, folder:Path) -> Path:
+    folder.mkdir(parents=True, exist_ok=True)
+    report_path = folder / f"{report['name']}_{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.json"
+    with open(report_path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+    return report_path
+
+def profiled(func:Callable) -> Callable:
+    # Profiles each call of a run function when profiling is enabled, otherwise only costs a None check
+    @functools.wraps(func)
+    def inner_function(*args, **kwargs):
+        global _active
+        if _folder is None or _active is not None:
+            return func(*args, **kwargs)
+        _active = RunProfiler(func.__name__)
+        _active.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler, _active = _active, None
+            report_path = write_report(profiler.stop(), _folder)
+            logger.info("Wrote profile of %s to %s", func.__name__, report_path)
+    return inner_function
+
+def instrument_scraper(scraper):
+    if _active is not None:
+        _active.webdriver.instrument_scraper(scraper)
+
+def instrument_driver(driver):
+    if _active is not None:
+        _active.webdriver.instrument_driver(driver)
+
+def diff_reports(old:dict, new:dict) -> dict[str, float]:
+    # Flattens both reports to numeric metrics and returns the non zero changes from old to new
+    def metrics(report:dict) -> dict[str, float]:
+        flat = {"wall_seconds": report["wall_seconds"], "memory.peak_bytes": report["memory"]["peak_bytes"]}
+        flat.update({f"time_by_layer.{layer}": seconds for layer, seconds in report["time_by_layer"].items()})
+        flat.update({f"functions.{name}.cumtime": function["cumtime"] for name, function in report["functions"].items()})
+        for method, commands in report["webdriver_commands"].items():
+            flat.update({f"webdriver_commands.{method}.{command}": count for command, count in commands.items()})
+        return flat
+    old_metrics, new_metrics = metrics(old), metrics(new)
+    changes = {
+        key: new_metrics.get(key, 0) - old_metrics.get(key, 0)
+        for key in old_metrics.keys() | new_metrics.keys()
+    }
+    return {key: change for key, change in changes.items() if change != 0}
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+import logging
+import threading
+from typing import Callable, Optional, Protocol
+
+from constants import HEALTHCHECK_TIMES_HOUR, MARKET_CLOSE_HOUR, PREWARM_FALLBACK_SECONDS, TARGET_RUN_TIME
+from enums.run_phase import RunPhase
+
+logger = logging.getLogger(__name__)
+
+class Clock(Protocol):
+    def now(self) -> datetime:
+        ...
+
+    def wait(self, seconds:float, stop_event:threading.Event) -> bool:
+        # Returns True if woken by the stop event
+        ...
+
+class SystemClock:
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def wait(self, seconds:float, stop_event:threading.Event) -> bool:
+        return stop_event.wait(max(seconds, 0))
+
+def next_occurrence(after:datetime, hour:int) -> datetime:
+    occurrence = after.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if occurrence <= after:
+        occurrence += timedelta(days=1)
+    return occurrence
+
+def is_client_day(target:datetime) -> bool:
+    return target.weekday() < 5
+
+def last_market_close(now:datetime, close_hour:int = MARKET_CLOSE_HOUR) -> datetime:
+    close = now.replace(hour=close_hour, minute=0, second=0, microsecond=0)
+    if close > now:
+        close -= timedelta(days=1)
+    while not is_client_day(close):
+        close -= timedelta(days=1)
+    return close
+
+class Scheduler:
+    # Before each weekday target run a pre-warm phase scrapes the full universe early enough to finish by the target hour.
+    # At the target hour a refresh phase re-fetches what the pre-warm could not or finished before the last market close
+    # and sends the results.
+    # Healthchecks that would overlap a pre-warm are skipped.
+    def __init__(self, clock:Clock, on_prewarm:Callable[[], None], on_refresh:Callable[[bool], None],
+                 on_healthcheck:Callable[[], None], estimate_prewarm_seconds:Callable[[], float],
+                 on_error:Optional[Callable[[Exception], None]] = None,
+                 target_hour:int = TARGET_RUN_TIME, healthcheck_hours:Optional[list[int]] = None):
+        self.clock = clock
+        self.on_prewarm = on_prewarm
+        self.on_refresh = on_refresh
+        self.on_healthcheck = on_healthcheck
+        self.estimate_prewarm_seconds = estimate_prewarm_seconds
+        self.on_error = on_error
+        self.target_hour = target_hour
+        self.healthcheck_hours = HEALTHCHECK_TIMES_HOUR if healthcheck_hours is None else healthcheck_hours
+        self.stop_event = threading.Event()
+        self._cursor = clock.now()
+        self._prewarm_starts:dict[datetime, datetime] = {}
+        self._prewarmed_target:Optional[datetime] = None
+
+    def _report_error(self, action:str, error:Exception):
+        logger.exception("Error in %s: %s", action, repr(error))
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def _prewarm_start(self, target:datetime) -> datetime:
+        if target not in self._prewarm_starts:
+            try:
+                prewarm_seconds = self.estimate_prewarm_seconds()
+            except Exception as e:
+                self._report_error("pre-warm estimate", e)
+                prewarm_seconds = PREWARM_FALLBACK_SECONDS
+            self._prewarm_starts[target] = target - timedelta(seconds=prewarm_seconds)
+            logger.info("Pre-warm for %s scheduled at %s", target, self._prewarm_starts[target])
+        return self._prewarm_starts[target]
+
+    def next_event(self) -> tuple[datetime, RunPhase]:
+        target = next_occurrence(self._cursor, self.target_hour)
+        if not is_client_day(target):
+            candidates = [(target, RunPhase.HEALTHCHECK)]
+            prewarm_window = None
+        else:
+            prewarm_start = self._prewarm_start(target)
+            prewarm_window = (prewarm_start, target)
+            if self._prewarmed_target == target:
+                candidates = [(target, RunPhase.REFRESH)]
+            else:
+                candidates = [(max(prewarm_start, self._cursor), RunPhase.PREWARM)]
+        for hour in self.healthcheck_hours:
+            healthcheck = next_occurrence(self._cursor, hour)
+            if prewarm_window is not None and prewarm_window[0] <= healthcheck < prewarm_window[1]:
+                continue
+            candidates.append((healthcheck, RunPhase.HEALTHCHECK))
+        return min(candidates, key=lambda candidate: candidate[0])
+
+    def _fire(self, phase:RunPhase, target:datetime):
+        logger.info("Starting %s phase for %s", phase.value, target)
+        try:
+            if phase == RunPhase.PREWARM:
+                self.on_prewarm()
+            elif phase == RunPhase.REFRESH:
+                self.on_refresh(True)
+            else:
+                self.on_healthcheck()
+        except Exception as e:
+            self._report_error(f"{phase.value} phase", e)
+
+    def run_next(self) -> Optional[tuple[datetime, RunPhase]]:
+        scheduled_at, phase = self.next_event()
+        seconds = (scheduled_at - self.clock.now()).total_seconds()
+        logger.info("Waiting until %s for the %s phase", scheduled_at, phase.value)
+        if seconds > 0 and self.clock.wait(seconds, self.stop_event):
+            return None
+        self._fire(phase, scheduled_at)
+        if phase == RunPhase.PREWARM:
+            self._prewarmed_target = next_occurrence(self._cursor, self.target_hour)
+        else:
+            self._cursor = scheduled_at
+        return scheduled_at, phase
+
+    def run_startup(self):
+        # Mirrors a restart during the day: a weekday restart after the target hour still delivers the client run
+        now = self.clock.now()
+        previous_target = next_occurrence(now, self.target_hour) - timedelta(days=1)
+        later_healthchecks = [hour for hour in self.healthcheck_hours if previous_target < next_occurrence(now, hour) - timedelta(days=1)]
+        if is_client_day(previous_target) and not later_healthchecks:
+            self._fire(RunPhase.PREWARM, previous_target)
+            self._fire(RunPhase.REFRESH, previous_target)
+        else:
+            self._fire(RunPhase.HEALTHCHECK, now)
+        # Healthchecks that fell due while the startup run was busy are skipped rather than fired back to back
+        self._cursor = self.clock.now()
+
+    def run_forever(self, run_on_start:bool = True):
+        if run_on_start:
+            self.run_startup()
+        while not self.stop_event.is_set():
+            self.run_next()
+
+    def stop(self):
+        self.stop_event.set()
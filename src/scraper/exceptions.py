@@ -0,0 +1,26 @@
+# Subclass ValueError so callers that caught the previous plain ValueErrors keep working
+class TickerNotFoundError(ValueError):
+    pass
+
+class EmptyTrailingReturnsError(ValueError):
+    pass
+
+class LoginFailedError(ValueError):
+    pass
+
+class SessionLostError(Exception):
+    pass
+
+class ThrottledError(Exception):
+    pass
+
+class CachedFailureError(Exception):
+    pass
+
+class StepDeadlineExceededError(TimeoutError):
+    def __init__(self, step:str, seconds:float):
+        super().__init__(f"{step} did not finish within {seconds} seconds")
+        self.step = step
+
+class TickerBudgetExceededError(StepDeadlineExceededError):
+    pass
@@ -0,0 +1,149 @@
+from datetime import datetime
+import json
+import logging
+import os
+from pathlib import Path
+import queue
+import shutil
+import threading
+import time
+from typing import Optional
+import zipfile
+
+from constants import (
+    FAILURE_CAPTURE_KEEP_FIRST,
+    FAILURE_CAPTURE_PER_RUN,
+    FAILURE_CAPTURE_PER_STEP,
+    FAILURE_CAPTURE_QUEUE_SIZE,
+    FAILURE_CAPTURE_RING_SLOTS,
+    FAILURE_CAPTURE_SAMPLE_EVERY,
+    SCREENSHOTS_FOLDER,
+)
+
+logger = logging.getLogger(__name__)
+
+def clear_folder_in_background(folder:str | Path) -> Optional[threading.Thread]:
+    # Renaming is a single fast call, the slow recursive delete happens off the scrape thread
+    folder = Path(folder)
+    if not folder.exists():
+        return None
+    trash = folder.with_name(f"{folder.name}_old_{time.time_ns()}")
+    try:
+        os.replace(folder, trash)
+    except OSError:
+        logger.exception("Failed to move %s out of the way", folder)
+        return None
+    thread = threading.Thread(target=shutil.rmtree, args=(trash,), kwargs={"ignore_errors": True}, name="clear-folder", daemon=True)
+    thread.start()
+    return thread
+
+class FailureCapture:
+    # Only the screenshot grab runs on the scrape thread, and only for failures that pass the quotas.
+    # Compression and disk writes happen on a background thread fed by a bounded queue that drops when full.
+    folder:Path
+    run_id:str
+    capture_dom:bool
+    failures:int
+    captures:int
+    dropped:int
+    step_captures:dict[str, int]
+
+    def __init__(self, folder:str | Path = SCREENSHOTS_FOLDER, run_id:Optional[str] = None, capture_dom:bool = False,
+                 keep_first:int = FAILURE_CAPTURE_KEEP_FIRST, sample_every:int = FAILURE_CAPTURE_SAMPLE_EVERY,
+                 ring_slots:int = FAILURE_CAPTURE_RING_SLOTS, per_step:int = FAILURE_CAPTURE_PER_STEP,
+                 per_run:int = FAILURE_CAPTURE_PER_RUN, queue_size:int = FAILURE_CAPTURE_QUEUE_SIZE):
+        self.folder = Path(folder)
+        self.run_id = run_id or datetime.now().strftime('%Y_%m_%d_%H_%M_%S')
+        self.capture_dom = capture_dom
+        self.keep_first = keep_first
+        self.sample_every = sample_every
+        self.ring_slots = ring_slots
+        self.per_step = per_step
+        self.per_run = per_run
+        self.failures = 0
+        self.captures = 0
+        self.dropped = 0
+        self.step_captures = {}
+        self._next_ring_slot = 0
+        self._last_error:Optional[BaseException] = None
+        self._queue:queue.Queue = queue.Queue(maxsize=queue_size)
+        self._writer:Optional[threading.Thread] = None
+
+    def _should_capture(self, step:str) -> bool:
+        self.failures += 1
+        if self.captures >= self.per_run or self.step_captures.get(step, 0) >= self.per_step:
+            return False
+        if self.failures > self.keep_first and (self.failures - self.keep_first) % self.sample_every != 0:
+            return False
+        return True
+
+    def _destination(self) -> Path:
+        if self.failures <= self.keep_first:
+            return self.folder / "first" / f"{self.run_id}_{self.failures:04d}.zip"
+        slot = self._next_ring_slot
+        self._next_ring_slot = (slot + 1) % self.ring_slots
+        return self.folder / "ring" / f"{slot:04d}.zip"
+
+    def capture(self, driver, step:str, error:BaseException, context:str = ""):
+        # The same exception is re-raised through every decorated caller, only its first step is captured
+        if error is self._last_error:
+            return
+        self._last_error = error
+        if not self._should_capture(step):
+            return
+        try:
+            screenshot = driver.get_screenshot_as_png()
+            page_source = driver.page_source if self.capture_dom else None
+            url = driver.current_url
+        except Exception as e:
+            logger.warning("Failed to capture failure of %s: %s", step, repr(e))
+            return
+        metadata = {
+            "run_id": self.run_id,
+            "failure": self.failures,
+            "step": step,
+            "context": context,
+            "error": repr(error),
+            "url": url,
+            "captured_at": datetime.now().isoformat(),
+        }
+        self._start_writer()
+        try:
+            self._queue.put_nowait((self._destination(), metadata, screenshot, page_source))
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.captures += 1
+        self.step_captures[step] = self.step_captures.get(step, 0) + 1
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_captures, name="failure-capture", daemon=True)
+            self._writer.start()
+
+    def _write_captures(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            destination, metadata, screenshot, page_source = item
+            try:
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                temporary_path = destination.with_suffix(".tmp")
+                with zipfile.ZipFile(temporary_path, "w", zipfile.ZIP_DEFLATED) as capture_file:
+                    capture_file.writestr("metadata.json", json.dumps(metadata, indent=2))
+                    # PNG data is already compressed
+                    capture_file.writestr("screenshot.png", screenshot, compress_type=zipfile.ZIP_STORED)
+                    if page_source is not None:
+                        capture_file.writestr("page.html", page_source)
+                os.replace(temporary_path, destination)
+            except Exception:
+                logger.exception("Failed to write failure capture %s", destination)
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self.failures:
+            logger.info("Captured %s of %s failures (%s dropped)", self.captures, self.failures, self.dropped)
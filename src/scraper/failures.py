@@ -0,0 +1,36 @@
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from urllib3.exceptions import HTTPError
+
+from enums.failure_class import FailureClass
+from scraper.exceptions import (
+    EmptyTrailingReturnsError,
+    LoginFailedError,
+    SessionLostError,
+    StepDeadlineExceededError,
+    ThrottledError,
+    TickerNotFoundError,
+)
+
+THROTTLE_MARKERS = ["too many requests", "429", "access denied", "rate limit"]
+
+def is_throttle_message(message:str) -> bool:
+    message = message.lower()
+    return any(marker in message for marker in THROTTLE_MARKERS)
+
+def classify_failure(error:BaseException) -> FailureClass:
+    if isinstance(error, TickerNotFoundError):
+        return FailureClass.NOT_FOUND
+    if isinstance(error, EmptyTrailingReturnsError):
+        return FailureClass.EMPTY_TABLE
+    if isinstance(error, StepDeadlineExceededError):
+        return FailureClass.HUNG
+    if isinstance(error, (SessionLostError, LoginFailedError)):
+        return FailureClass.AUTH_LOST
+    if isinstance(error, ThrottledError) or is_throttle_message(str(error)):
+        return FailureClass.THROTTLED
+    # TimeoutException is a WebDriverException so it has to be checked first
+    if isinstance(error, TimeoutException):
+        return FailureClass.TIMEOUT
+    if isinstance(error, (WebDriverException, HTTPError, ConnectionError)):
+        return FailureClass.DRIVER_CRASH
+    return FailureClass.UNKNOWN
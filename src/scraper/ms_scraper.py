@@ -1,8 +1,9 @@
 from datetime import datetime
 import logging
 import os
+import signal
 from time import sleep
-from typing import List
+from typing import List, Optional
 
 import selenium
 import selenium.webdriver
@@ -12,57 +13,92 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import WebDriverException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from undetected_chromedriver import Chrome, WebElement
 
+from archive.page_archive import PageArchive
 from enums.screener import ScreenerDownPresses
 from enums.ticker_types import TickerType
+from scraper.exceptions import EmptyTrailingReturnsError, LoginFailedError, SessionLostError, StepDeadlineExceededError, ThrottledError, TickerNotFoundError
+from scraper.failure_capture import FailureCapture, clear_folder_in_background
+from scraper.failures import is_throttle_message
+from scraper.watchdog import Watchdog
 from models import trailing_returns
+from models.scrape_result import ScrapeResult
 from models.trailing_returns import TrailingReturns
+import profiling
 from constants import *
+from constants import ADMIN_EMAIL, LOGIN_PASSWORD
 
 logger = logging.getLogger(__name__)
 
+STOCK_TRAILING_RETURNS_TABLE = (By.CLASS_NAME, "mds-table--fixed-column__sal")
+FUND_TRAILING_RETURNS_TABLE = (By.XPATH, ".//table[contains(@class, 'mds-table--fixed-column__sal') and ancestor::sal-components[contains(@tab, 'trailing-returns')]]")
+STOCK_STAR_RATING = (By.CLASS_NAME, "mdc-star-rating")
+FUND_SECURITY_HEADER = (By.CLASS_NAME, "mdc-security-header__details")
+
 class Scraper:
     driver:Chrome
     wait:WebDriverWait
     retries = 0
     retry_backoff = [0, 10, 60, 5*60, 10*60, 60*60]
     headless:bool
-
-    def __init__(self, keep_screenshots:bool = False, headless:bool = True):
+    archive:Optional[PageArchive]
+    run_id:Optional[str]
+    archive_html:bool
+    failure_capture:FailureCapture
+    watchdog:Watchdog
+
+    def __init__(self, keep_screenshots:bool = False, headless:bool = True, archive:Optional[PageArchive] = None,
+                 run_id:Optional[str] = None, archive_html:bool = False, capture_dom:bool = False):
         if not keep_screenshots:
             self.clear_screenshots_folder()
         self.headless = headless
+        self.archive = archive
+        self.run_id = run_id or datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+        self.archive_html = archive_html
+        self.failure_capture = FailureCapture(SCREENSHOTS_FOLDER, self.run_id, capture_dom)
+        self.watchdog = Watchdog()
 
     def __enter__(self):
         self.login()
         return self
     
     def __exit__(self, *_):
+        self.watchdog.close()
+        self.failure_capture.close()
         self.driver.quit()
 
     @staticmethod
     def scraper_exception_handler(func): # TODO add retries
         def inner_function(*args, **kwargs):
+            scraper = args[0]
             try:
-                return func(*args, **kwargs)
-            except (MaxRetryError, WebDriverException) as e:
-                scraper = args[0]
-                logger.exception("Max retries exceeded doing func %s with args: %s", func.__name__, *args)
-                try:
-                    scraper.driver.quit()
-                except Exception:
-                    pass
-                scraper.login()
+                with scraper._step_deadline(func.__name__):
+                    return func(*args, **kwargs)
+            except StepDeadlineExceededError as e:
+                # The driver has been killed so there is nothing to capture, the caller recycles it
+                logger.error("Step %s with args %s exceeded its deadline: %s", func.__name__, args[1:], repr(e))
                 raise e
             except Exception as e:
-                scraper = args[0]
-                # scraper.screenshot(f"EXCEPTION_{func.__name__}")
-                logger.exception("Exception occurred at url %s: %s", scraper.driver.current_url, repr(e))
+                # The driver may be gone so there is nothing to capture. Logging in again is left to the caller's
+                # retry policy, doing it here would spend the ticker's budget and log in twice.
+                if isinstance(e, (MaxRetryError, WebDriverException)) and not isinstance(e, TimeoutException):
+                    logger.exception("Max retries exceeded doing func %s with args: %s", func.__name__, args[1:])
+                    raise e
+                try:
+                    with scraper.watchdog.deadline("failure_capture", FAILURE_CAPTURE_DEADLINE_SECONDS, scraper.kill_driver):
+                        scraper.failure_capture.capture(scraper.driver, func.__name__, e, repr(args[1:]))
+                        logger.exception("Exception occurred at url %s: %s", scraper.driver.current_url, repr(e))
+                except StepDeadlineExceededError:
+                    logger.exception("Exception occurred in %s: %s", func.__name__, repr(e))
                 raise e
         return inner_function
 
+    def _step_deadline(self, step:str):
+        # Steps run inside a decorated method get their own deadline without a second round of failure handling
+        return self.watchdog.deadline(step, STEP_DEADLINE_SECONDS.get(step, DEFAULT_STEP_DEADLINE_SECONDS), self.kill_driver)
+
     def check_chrome_is_up_to_date(self):
         with selenium.webdriver.Chrome() as driver:
             # TODO: Make better
@@ -76,6 +112,7 @@ class Scraper:
         logger.info("Logging in to Morningstar")
         self.driver = uc.Chrome(headless=self.headless, use_subprocess=False, version_main=144)
         self.driver.command_executor.set_timeout(SELENIUM_TIMEOUT)
+        profiling.instrument_driver(self.driver)
         self.driver.get(LOGIN_URL)
 
         self.wait = WebDriverWait(self.driver, SELENIUM_TIMEOUT, 0.01)
@@ -96,17 +133,49 @@ class Scraper:
 
         if self.driver.current_url != BASE_URL:
             logger.error("Login failed. Current URL equals %s", self.driver.current_url)
-            raise ValueError(f"Login failed. Current URL equals {self.driver.current_url}")
+            raise LoginFailedError(f"Login failed. Current URL equals {self.driver.current_url}")
         logger.info("Successfully logged in to Morningstar")
 
 
 
-    @scraper_exception_handler
+    def kill_driver(self):
+        # Runs on the watchdog thread while a WebDriver command may be stuck, so the processes are signalled
+        # directly instead of sending the driver another command
+        driver = getattr(self, "driver", None)
+        if driver is None:
+            return
+        service_process = getattr(getattr(driver, "service", None), "process", None)
+        pids = [getattr(service_process, "pid", None), getattr(driver, "browser_pid", None)]
+        for pid in pids:
+            if pid is None:
+                continue
+            try:
+                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except OSError:
+                pass
+
+    def relogin(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+        self.login()
+
+    def _check_session(self):
+        # A missing ticker is only permanent if the search itself worked
+        if self.driver.current_url.startswith(LOGIN_URL):
+            raise SessionLostError(f"Redirected to login at {self.driver.current_url}")
+        if is_throttle_message(self.driver.title):
+            raise ThrottledError(f"Blocked by Morningstar with page title {self.driver.title}")
+
     def _check_page_loaded(self):
         self.wait.until(EC.presence_of_element_located((By.CLASS_NAME, 'mdc-mo__button-image')))
 
     @scraper_exception_handler
     def find_ticker(self, ticker:str) -> TickerType:
+        return self._find_ticker(ticker)
+
+    def _find_ticker(self, ticker:str) -> TickerType:
         if self.driver.current_url.split("/")[-2].lower() != ticker.lower():
             search_field = self.wait.until(EC.presence_of_element_located((By.CLASS_NAME, 'mdc-search-field__input__mdc')))
             search_field.send_keys(ticker)
@@ -131,11 +200,17 @@ class Scraper:
                 if found_ticker.lower() == ticker.lower():
                     link.click()
                     break
+            else:
+                # The search worked but lists no such symbol, waiting for a navigation would only time out
+                self._check_session()
+                logger.error("Failed to find ticker: %s in %s search results", ticker, len(search_hits))
+                raise TickerNotFoundError(f"Failed to find ticker: {ticker}. No search result matched at {self.driver.current_url}")
             self.wait.until(EC.url_changes(old_url))
 
         if self.driver.current_url.split("/")[-2].lower() != ticker.lower():
+            self._check_session()
             logger.error("Failed to find ticker: %s. URL equaled %s", ticker, self.driver.current_url)
-            raise ValueError(f"Failed to find ticker: {ticker}. URL equaled {self.driver.current_url}")
+            raise TickerNotFoundError(f"Failed to find ticker: {ticker}. URL equaled {self.driver.current_url}")
         try:
             self.driver.find_element(By.CLASS_NAME, 'mdc-metadata__list__mdc')
             return TickerType.STOCK
@@ -150,7 +225,6 @@ class Scraper:
             return self._get_stock_trailing_returns()
         return self._get_trailing_returns()
 
-    @scraper_exception_handler
     def _navigate_to_span(self, span_name:str, validation_str:str):
         old_url = self.driver.current_url
         if validation_str.lower() in old_url.lower():
@@ -161,52 +235,53 @@ class Scraper:
         if validation_str.lower() not in self.driver.current_url.lower():
             raise ValueError(f"Span navigation failed. URL equaled {self.driver.current_url} instead of {validation_str}")
 
-    @scraper_exception_handler
     def _get_stock_trailing_returns(self) -> TrailingReturns:
         self._navigate_to_span("Trailing Returns", "trailing-returns")
+        table = self.wait.until(EC.presence_of_element_located(STOCK_TRAILING_RETURNS_TABLE))
+        return self._read_trailing_returns_table(table)
 
-        table = self.wait.until(EC.presence_of_element_located((By.CLASS_NAME, "mds-table--fixed-column__sal")))
-        thead = table.find_element(By.TAG_NAME, "thead")
-        title_row = thead.find_element(By.TAG_NAME, "tr")
-        tbody = table.find_element(By.TAG_NAME, "tbody")
-        data_rows = tbody.find_elements(By.TAG_NAME, "tr")
-
-        title_row_list = self._convert_table_row_to_list(title_row)
-        data_row_list = self._convert_table_row_to_list(data_rows[0])
-        returns = trailing_returns.etl(title_row_list, data_row_list)
-        if trailing_returns.is_all_null(returns):
-            raise ValueError("No trailing returns found for stock at url %s", self.driver.current_url)
-        return returns
-
-    @scraper_exception_handler
     def _get_trailing_returns(self) -> TrailingReturns:
         self._navigate_to_span("Performance", "performance")
-        table = self.wait.until(EC.presence_of_element_located((By.XPATH, ".//table[contains(@class, 'mds-table--fixed-column__sal') and ancestor::sal-components[contains(@tab, 'trailing-returns')]]")))
+        table = self.wait.until(EC.presence_of_element_located(FUND_TRAILING_RETURNS_TABLE))
+        return self._read_trailing_returns_table(table)
+
+    def _read_trailing_returns_table(self, table:WebElement) -> TrailingReturns:
+        title_row_list, data_row_list = self._read_table_rows(table)
+        return self._etl_trailing_returns(title_row_list, data_row_list, self.driver.current_url)
+
+    def _read_table_rows(self, table:WebElement) -> tuple[List[str], List[str]]:
         thead = table.find_element(By.TAG_NAME, "thead")
         title_row = thead.find_element(By.TAG_NAME, "tr")
         tbody = table.find_element(By.TAG_NAME, "tbody")
         data_rows = tbody.find_elements(By.TAG_NAME, "tr")
+        return self._convert_table_row_to_list(title_row), self._convert_table_row_to_list(data_rows[0])
 
-        title_row_list = self._convert_table_row_to_list(title_row)
-        data_row_list = self._convert_table_row_to_list(data_rows[0])
-        returns = trailing_returns.etl(title_row_list, data_row_list)
+    @staticmethod
+    def _etl_trailing_returns(title_data:List[str], raw_data:List[str], url:str) -> TrailingReturns:
+        returns = trailing_returns.etl(title_data, raw_data)
         if trailing_returns.is_all_null(returns):
-            raise ValueError("No trailing returns found for fund/etf at url %s", self.driver.current_url)
+            raise EmptyTrailingReturnsError(f"No trailing returns found at url {url}")
         return returns
-    
+
     @scraper_exception_handler
     def get_morningstar_rating(self, ticker_type:TickerType) -> int | None:
         if ticker_type == TickerType.STOCK:
             try:
-                stock_stars_span = self.wait.until(EC.presence_of_element_located((By.CLASS_NAME, "mdc-star-rating")))
+                stock_stars_span = self.wait.until(EC.presence_of_element_located(STOCK_STAR_RATING))
             except selenium.common.exceptions.TimeoutException:
                 logger.warning("No star rating found for %s", ticker_type.value)
                 return None
-            star_svgs = stock_stars_span.find_elements(By.CLASS_NAME, "mdc-star-rating__star__mdc")
-            return len(star_svgs)
-        non_stock_stars_div = self.wait.until(EC.presence_of_element_located((By.CLASS_NAME, "mdc-security-header__details")))
+            return self._read_stock_rating(stock_stars_span)
+        non_stock_stars_div = self.wait.until(EC.presence_of_element_located(FUND_SECURITY_HEADER))
+        return self._read_fund_rating(non_stock_stars_div)
+
+    def _read_stock_rating(self, stock_stars_span:WebElement) -> int | None:
+        star_svgs = stock_stars_span.find_elements(By.CLASS_NAME, "mdc-star-rating__star__mdc")
+        return len(star_svgs)
+
+    def _read_fund_rating(self, security_header:WebElement) -> int | None:
         try:
-            non_stock_stars_span = non_stock_stars_div.find_element(By.CLASS_NAME, "mdc-security-header__star-rating")
+            non_stock_stars_span = security_header.find_element(By.CLASS_NAME, "mdc-security-header__star-rating")
             rating = non_stock_stars_span.get_attribute('title')[0]
             if rating.lower() == "u":
                 return None
@@ -214,6 +289,60 @@ class Scraper:
         except selenium.common.exceptions.NoSuchElementException:
             return None
 
+    @scraper_exception_handler
+    def scrape_ticker(self, ticker:str) -> ScrapeResult:
+        with self._step_deadline("find_ticker"):
+            ticker_type = self._find_ticker(ticker)
+        # The rating is only read once the returns page has loaded else the header may still belong to the previous ticker
+        if ticker_type == TickerType.STOCK:
+            with self._step_deadline("_navigate_to_span"):
+                self._navigate_to_span("Trailing Returns", "trailing-returns")
+            try:
+                table, stock_stars_span = self.wait.until(EC.all_of(
+                    EC.presence_of_element_located(STOCK_TRAILING_RETURNS_TABLE),
+                    EC.presence_of_element_located(STOCK_STAR_RATING),
+                ))
+                morningstar_rating = self._read_stock_rating(stock_stars_span)
+            except selenium.common.exceptions.TimeoutException:
+                # Unrated stocks never render the stars, only a missing table is a failure
+                tables = self.driver.find_elements(*STOCK_TRAILING_RETURNS_TABLE)
+                if not tables:
+                    raise
+                logger.warning("No star rating found for %s", ticker)
+                table, morningstar_rating = tables[0], None
+        else:
+            with self._step_deadline("_navigate_to_span"):
+                self._navigate_to_span("Performance", "performance")
+            table, security_header = self.wait.until(EC.all_of(
+                EC.presence_of_element_located(FUND_TRAILING_RETURNS_TABLE),
+                EC.presence_of_element_located(FUND_SECURITY_HEADER),
+            ))
+            morningstar_rating = self._read_fund_rating(security_header)
+        title_data, raw_data = self._read_table_rows(table)
+        if self.archive is not None:
+            self._archive_page(ticker, ticker_type, title_data, raw_data, morningstar_rating)
+        return ScrapeResult(
+            ticker_type=ticker_type,
+            trailing_returns=self._etl_trailing_returns(title_data, raw_data, self.driver.current_url),
+            morningstar_rating=morningstar_rating,
+        )
+
+    def _archive_page(self, ticker:str, ticker_type:TickerType, title_data:List[str], raw_data:List[str], morningstar_rating:int | None):
+        # Archived before the etl so pages that fail extraction can be replayed once it is fixed
+        payload = {
+            "ticker_type": ticker_type.value,
+            "title_data": title_data,
+            "raw_data": raw_data,
+            "morningstar_rating": morningstar_rating,
+            "url": self.driver.current_url,
+        }
+        if self.archive_html:
+            payload["page_source"] = self.driver.page_source
+        try:
+            self.archive.put(self.run_id, ticker, payload)
+        except OSError:
+            logger.exception("Failed to archive page for %s", ticker)
+
 
     def _convert_table_row_to_list(self, row:WebElement) -> List[str]:
         output_list = []
@@ -317,12 +446,4 @@ class Scraper:
             logger.error("Failed to take screenshot: %s", repr(e))
 
     def clear_screenshots_folder(self):
-        screenshot_folder = SCREENSHOTS_FOLDER
-        if os.path.exists(screenshot_folder):
-            for file in os.listdir(screenshot_folder):
-                file_path = os.path.join(screenshot_folder, file)
-                try:
-                    if os.path.isfile(file_path):
-                        os.unlink(file_path)
-                except Exception as e:
-                    logger.error("Failed to delete file %s: %s", file_path, repr(e))
+        clear_folder_in_background(SCREENSHOTS_FOLDER)
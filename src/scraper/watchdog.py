@@ -0,0 +1,88 @@
+from contextlib import contextmanager
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+from constants import WATCHDOG_POLL_INTERVAL
+from scraper.exceptions import StepDeadlineExceededError
+
+logger = logging.getLogger(__name__)
+
+class _Deadline:
+    def __init__(self, step:str, expires_at:float, on_expire:Callable[[], None]):
+        self.step = step
+        self.expires_at = expires_at
+        self.on_expire = on_expire
+        self.expired = False
+
+class Watchdog:
+    # A monitor thread calls on_expire for every deadline that overruns, which is expected to unblock the stuck call
+    # (for example by killing the driver). The guarded block then raises the deadline's error whatever it was doing.
+    timeouts:dict[str, int]
+
+    def __init__(self, poll_interval:float = WATCHDOG_POLL_INTERVAL, clock:Callable[[], float] = time.monotonic):
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.timeouts = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._deadlines:dict[int, _Deadline] = {}
+        self._stopped = threading.Event()
+        self._thread:Optional[threading.Thread] = None
+
+    @contextmanager
+    def deadline(self, step:str, seconds:Optional[float], on_expire:Callable[[], None],
+                 error:type[StepDeadlineExceededError] = StepDeadlineExceededError) -> Iterator[None]:
+        if seconds is None:
+            yield
+            return
+        deadline_id = next(self._ids)
+        entry = _Deadline(step, self.clock() + seconds, on_expire)
+        with self._lock:
+            self._deadlines[deadline_id] = entry
+            self._start()
+        try:
+            yield
+        except Exception as e:
+            if entry.expired:
+                raise error(step, seconds) from e
+            raise
+        finally:
+            # Waits for an on_expire that is already running so the caller never races the kill
+            with self._lock:
+                self._deadlines.pop(deadline_id, None)
+        if entry.expired:
+            raise error(step, seconds)
+
+    def _start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._monitor, name="watchdog", daemon=True)
+            self._thread.start()
+
+    def _monitor(self):
+        while not self._stopped.wait(self.poll_interval):
+            self.check()
+
+    def check(self):
+        with self._lock:
+            now = self.clock()
+            for deadline_id, entry in list(self._deadlines.items()):
+                if now < entry.expires_at:
+                    continue
+                del self._deadlines[deadline_id]
+                entry.expired = True
+                self.timeouts[entry.step] = self.timeouts.get(entry.step, 0) + 1
+                logger.error("%s overran its deadline, recycling the driver", entry.step)
+                try:
+                    entry.on_expire()
+                except Exception:
+                    logger.exception("Watchdog failed to stop %s", entry.step)
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,36 @@
+import bisect
+import hashlib
+from typing import Iterable
+
+from constants import SHARD_DATABASE_FILE_PATH, SHARD_VIRTUAL_NODES
+
+def _hash(key:str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+class ShardRing:
+    # Consistent hashing keeps a symbol on the same shard regardless of which other symbols exist,
+    # and only moves about 1/K of the symbols when the shard count changes
+    def __init__(self, shard_count:int, virtual_nodes:int = SHARD_VIRTUAL_NODES):
+        if shard_count < 1:
+            raise ValueError(f"Shard count must be at least 1, got {shard_count}")
+        self.shard_count = shard_count
+        points = sorted(
+            (_hash(f"shard-{shard}-{virtual_node}"), shard)
+            for shard in range(shard_count)
+            for virtual_node in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, symbol:str) -> int:
+        position = bisect.bisect(self._hashes, _hash(symbol.upper())) % len(self._hashes)
+        return self._shards[position]
+
+    def split(self, symbols:Iterable[str]) -> dict[int, set[str]]:
+        shards:dict[int, set[str]] = {shard: set() for shard in range(self.shard_count)}
+        for symbol in symbols:
+            shards[self.shard_for(symbol)].add(symbol)
+        return shards
+
+def shard_db_path(shard:int) -> str:
+    return SHARD_DATABASE_FILE_PATH.format(shard=shard)
@@ -0,0 +1,79 @@
+import csv
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, List
+
+from constants import CSV_FILE_PATH, DEFAULT_UNIVERSE_NAME, OUTPUT_CSV_FILE
+from database.query_processor import Processor
+from database.run_results import RunResults
+from helpers import get_root_dir
+from models.universe import Universe
+
+logger = logging.getLogger(__name__)
+
+def funds_folder() -> Path:
+    return Path(get_root_dir() + CSV_FILE_PATH)
+
+def find_default_funds_file() -> Path:
+    for root, _, files in os.walk(funds_folder()):
+        for file in files:
+            if file.endswith(".csv"):
+                return Path(root) / file
+        break
+    exception = FileNotFoundError("No fund file found")
+    logger.exception("No fund file found: %s", repr(exception))
+    raise exception
+
+def read_funds_file(file_path:Path) -> List[str]:
+    # Symbols in file order without duplicates
+    funds:dict[str, None] = {}
+    with open(file_path, mode='r', encoding="utf-8-sig") as file:
+        csv_reader = csv.reader(file)
+        for row in csv_reader:
+            if row:
+                funds[row[0]] = None
+    return list(funds)
+
+def parse_universes(entries:List[dict], default_recipients:List[str]) -> List[Universe]:
+    # Without configured universes every client shares the single default universe like before
+    if not entries:
+        return [Universe(name=DEFAULT_UNIVERSE_NAME, recipients=default_recipients, output_file=OUTPUT_CSV_FILE)]
+    universes = [Universe(**entry) for entry in entries]
+    names = [universe.name for universe in universes]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Universe names must be unique, got {names}")
+    return universes
+
+def load_universes() -> List[Universe]:
+    from constants import CLIENT_EMAILS, UNIVERSES
+    return parse_universes(UNIVERSES, CLIENT_EMAILS)
+
+def read_universe_funds(universes:Iterable[Universe]) -> dict[str, List[str]]:
+    return {
+        universe.name: read_funds_file(funds_folder() / universe.funds_file if universe.funds_file else find_default_funds_file())
+        for universe in universes
+    }
+
+def load_universe_funds() -> tuple[List[Universe], dict[str, List[str]]]:
+    # Read once per run, the work set and the final exports come from the same funds files
+    universes = load_universes()
+    return universes, read_universe_funds(universes)
+
+def resolve_work_set(universe_funds:dict[str, List[str]]) -> set[str]:
+    work_set = set().union(*universe_funds.values())
+    requested = sum(len(funds) for funds in universe_funds.values())
+    logger.info("Resolved %s universes with %s symbols into %s unique symbols", len(universe_funds), requested, len(work_set))
+    return work_set
+
+def export_universes(processor:Processor, results:RunResults, universes:List[Universe], universe_funds:dict[str, List[str]]) -> dict[str, Path]:
+    # Every client export is cut from the same snapshot so a symbol shared by several universes is only scraped once
+    output_paths:dict[str, Path] = {}
+    for universe in universes:
+        universe_results = results.take(universe_funds[universe.name])
+        missing = len(universe_funds[universe.name]) - len(universe_results)
+        if missing:
+            logger.warning("%s symbols of universe %s are missing from the run", missing, universe.name)
+        processor.export_to_csv(universe_results, output_path=universe.output_path)
+        output_paths[universe.name] = universe.output_path
+    return output_paths
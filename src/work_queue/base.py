@@ -0,0 +1,58 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable, Optional
+
+from pydantic import BaseModel
+
+class WorkItem(BaseModel):
+    body: str
+    receipt_handle: str
+    receive_count: int
+
+class DeadLetteredError(Exception):
+    pass
+
+class WorkQueue(ABC):
+    # Messages received but not acknowledged become visible again once their visibility timeout passes.
+    # Messages received more than max_receive_count times are moved to the dead letter queue instead of being delivered.
+    # on_dead_letter is called with the body of each message moved there, by whichever consumer moved it.
+    on_dead_letter:Optional[Callable[[str, int], None]] = None
+
+    def _notify_dead_letter(self, body:str, receive_count:int):
+        if self.on_dead_letter is not None:
+            self.on_dead_letter(body, receive_count)
+
+    def start_run(self, run_id:str, bodies:Iterable[str]):
+        self.put(bodies)
+
+    @abstractmethod
+    def put(self, bodies:Iterable[str], delay_seconds:float = 0):
+        pass
+
+    @abstractmethod
+    def receive(self) -> WorkItem | None:
+        pass
+
+    @abstractmethod
+    def ack(self, item:WorkItem):
+        pass
+
+    @abstractmethod
+    def retry(self, item:WorkItem, delay_seconds:float = 0):
+        pass
+
+    @abstractmethod
+    def pending_count(self) -> int:
+        # Visible, delayed and in flight messages
+        pass
+
+    @abstractmethod
+    def dead_letter_count(self) -> int:
+        pass
+
+    @abstractmethod
+    def claim_completion(self, run_id:str) -> bool:
+        # Returns True for exactly one caller per run
+        pass
+
+    def is_drained(self) -> bool:
+        return self.pending_count() == 0
@@ -0,0 +1,17 @@
+import logging
+from typing import Callable
+
+from work_queue.base import WorkQueue
+
+logger = logging.getLogger(__name__)
+
+def check_job_completion(work_queue:WorkQueue, run_id:str, on_complete:Callable[[], None]) -> bool:
+    if not work_queue.is_drained():
+        logger.info("Run %s still has %s pending tickers", run_id, work_queue.pending_count())
+        return False
+    if not work_queue.claim_completion(run_id):
+        logger.info("Run %s was already completed by another worker", run_id)
+        return False
+    logger.info("Run %s is complete with %s dead lettered tickers", run_id, work_queue.dead_letter_count())
+    on_complete()
+    return True
@@ -0,0 +1,15 @@
+from constants import DEFAULT_QUEUE_NAME
+from work_queue.base import WorkQueue
+
+def open_work_queue(queue_url:str, queue_name:str = DEFAULT_QUEUE_NAME) -> WorkQueue:
+    if queue_url == "memory://":
+        from work_queue.in_process import InProcessWorkQueue
+        return InProcessWorkQueue()
+    if queue_url.startswith("sqlite:///"):
+        from work_queue.sqlite_broker import SqliteWorkQueue
+        return SqliteWorkQueue(queue_url.removeprefix("sqlite:///"), queue_name)
+    if queue_url.startswith("https://"):
+        from constants import SQS_COMPLETION_QUEUE_URL, SQS_DEAD_LETTER_QUEUE_URL
+        from work_queue.sqs import SqsWorkQueue
+        return SqsWorkQueue(queue_url, SQS_DEAD_LETTER_QUEUE_URL, SQS_COMPLETION_QUEUE_URL)
+    raise ValueError(f"Unsupported queue url {queue_url}")
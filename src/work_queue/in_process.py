@@ -0,0 +1,76 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Iterable
+import uuid
+
+from constants import MAX_PROCESSING_ATTEMPTS
+from work_queue.base import WorkItem, WorkQueue
+
+logger = logging.getLogger(__name__)
+
+class InProcessWorkQueue(WorkQueue):
+    def __init__(self, max_receive_count:int = MAX_PROCESSING_ATTEMPTS, clock:Callable[[], float] = time.time):
+        self.max_receive_count = max_receive_count
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._messages:list[tuple[float, int, str, int]] = [] # heap of (visible_at, sequence, body, receive_count)
+        self._in_flight:dict[str, tuple[str, int]] = {}
+        self._dead_letters:list[str] = []
+        self._completed_runs:set[str] = set()
+
+    def put(self, bodies:Iterable[str], delay_seconds:float = 0):
+        visible_at = self.clock() + delay_seconds
+        with self._lock:
+            for body in bodies:
+                heapq.heappush(self._messages, (visible_at, next(self._sequence), body, 0))
+
+    def receive(self) -> WorkItem | None:
+        dead_letters:list[tuple[str, int]] = []
+        item = None
+        with self._lock:
+            while self._messages and self._messages[0][0] <= self.clock():
+                _, _, body, receive_count = heapq.heappop(self._messages)
+                if receive_count >= self.max_receive_count:
+                    logger.error("Moving %s to the dead letter queue after %s receives", body, receive_count)
+                    self._dead_letters.append(body)
+                    dead_letters.append((body, receive_count))
+                    continue
+                receipt_handle = uuid.uuid4().hex
+                self._in_flight[receipt_handle] = (body, receive_count + 1)
+                item = WorkItem(body=body, receipt_handle=receipt_handle, receive_count=receive_count + 1)
+                break
+        # Outside the lock so the callback can use the queue
+        for body, receive_count in dead_letters:
+            self._notify_dead_letter(body, receive_count)
+        return item
+
+    def ack(self, item:WorkItem):
+        with self._lock:
+            self._in_flight.pop(item.receipt_handle, None)
+
+    def retry(self, item:WorkItem, delay_seconds:float = 0):
+        with self._lock:
+            in_flight = self._in_flight.pop(item.receipt_handle, None)
+            if in_flight is None:
+                return
+            body, receive_count = in_flight
+            heapq.heappush(self._messages, (self.clock() + delay_seconds, next(self._sequence), body, receive_count))
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._messages) + len(self._in_flight)
+
+    def dead_letter_count(self) -> int:
+        with self._lock:
+            return len(self._dead_letters)
+
+    def claim_completion(self, run_id:str) -> bool:
+        with self._lock:
+            if run_id in self._completed_runs:
+                return False
+            self._completed_runs.add(run_id)
+            return True
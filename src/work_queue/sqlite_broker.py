@@ -0,0 +1,131 @@
+from contextlib import contextmanager
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable
+import uuid
+
+from constants import DEFAULT_QUEUE_NAME, MAX_PROCESSING_ATTEMPTS, QUEUE_VISIBILITY_TIMEOUT
+from work_queue.base import WorkItem, WorkQueue
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL,
+    body TEXT NOT NULL,
+    visible_at REAL NOT NULL,
+    receive_count INTEGER NOT NULL DEFAULT 0,
+    receipt_handle TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_visible ON messages (queue, visible_at);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    queue TEXT NOT NULL,
+    body TEXT NOT NULL,
+    receive_count INTEGER NOT NULL,
+    dead_lettered_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS completions (
+    queue TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (queue, run_id)
+);
+"""
+
+class SqliteWorkQueue(WorkQueue):
+    # Local stand-in for SQS. Several processes or machines sharing the database file can drain the same queue.
+    def __init__(self, path:str, queue_name:str = DEFAULT_QUEUE_NAME, visibility_timeout:float = QUEUE_VISIBILITY_TIMEOUT,
+                 max_receive_count:int = MAX_PROCESSING_ATTEMPTS, clock:Callable[[], float] = time.time):
+        self.queue_name = queue_name
+        self.visibility_timeout = visibility_timeout
+        self.max_receive_count = max_receive_count
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        self._connection.close()
+
+    def put(self, bodies:Iterable[str], delay_seconds:float = 0):
+        visible_at = self.clock() + delay_seconds
+        with self._transaction() as connection:
+            connection.executemany(
+                "INSERT INTO messages (queue, body, visible_at) VALUES (?, ?, ?)",
+                [(self.queue_name, body, visible_at) for body in bodies]
+            )
+
+    def receive(self) -> WorkItem | None:
+        now = self.clock()
+        dead_letters:list[tuple[str, int]] = []
+        item = None
+        with self._transaction() as connection:
+            while True:
+                row = connection.execute(
+                    "SELECT id, body, receive_count FROM messages WHERE queue = ? AND visible_at <= ? ORDER BY visible_at, id LIMIT 1",
+                    (self.queue_name, now)
+                ).fetchone()
+                if row is None:
+                    break
+                message_id, body, receive_count = row
+                if receive_count >= self.max_receive_count:
+                    logger.error("Moving %s to the dead letter queue after %s receives", body, receive_count)
+                    connection.execute(
+                        "INSERT INTO dead_letters (queue, body, receive_count, dead_lettered_at) VALUES (?, ?, ?, ?)",
+                        (self.queue_name, body, receive_count, now)
+                    )
+                    connection.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+                    dead_letters.append((body, receive_count))
+                    continue
+                receipt_handle = uuid.uuid4().hex
+                connection.execute(
+                    "UPDATE messages SET receipt_handle = ?, visible_at = ?, receive_count = receive_count + 1 WHERE id = ?",
+                    (receipt_handle, now + self.visibility_timeout, message_id)
+                )
+                item = WorkItem(body=body, receipt_handle=receipt_handle, receive_count=receive_count + 1)
+                break
+        # After the commit and outside the lock, a failing callback cannot undo the move or hold the broker's write lock
+        for body, receive_count in dead_letters:
+            self._notify_dead_letter(body, receive_count)
+        return item
+
+    def ack(self, item:WorkItem):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM messages WHERE queue = ? AND receipt_handle = ?", (self.queue_name, item.receipt_handle))
+
+    def retry(self, item:WorkItem, delay_seconds:float = 0):
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE messages SET visible_at = ?, receipt_handle = NULL WHERE queue = ? AND receipt_handle = ?",
+                (self.clock() + delay_seconds, self.queue_name, item.receipt_handle)
+            )
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM messages WHERE queue = ?", (self.queue_name,)).fetchone()[0]
+
+    def dead_letter_count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM dead_letters WHERE queue = ?", (self.queue_name,)).fetchone()[0]
+
+    def claim_completion(self, run_id:str) -> bool:
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO completions (queue, run_id, completed_at) VALUES (?, ?, ?)",
+                (self.queue_name, run_id, self.clock())
+            )
+            return cursor.rowcount == 1
@@ -0,0 +1,105 @@
+import logging
+import time
+from typing import Iterable
+
+import boto3
+
+from constants import MAX_PROCESSING_ATTEMPTS, QUEUE_DRAINED_CHECK_INTERVAL, QUEUE_DRAINED_CHECKS, QUEUE_VISIBILITY_TIMEOUT
+from work_queue.base import WorkItem, WorkQueue
+
+logger = logging.getLogger(__name__)
+
+SQS_BATCH_SIZE = 10
+SQS_MAX_DELAY_SECONDS = 900
+
+class SqsWorkQueue(WorkQueue):
+    # Completion is claimed by consuming the single token message start_run places on the completion queue
+    def __init__(self, queue_url:str, dead_letter_queue_url:str | None, completion_queue_url:str | None,
+                 visibility_timeout:int = QUEUE_VISIBILITY_TIMEOUT, max_receive_count:int = MAX_PROCESSING_ATTEMPTS,
+                 drained_checks:int = QUEUE_DRAINED_CHECKS, drained_check_interval:float = QUEUE_DRAINED_CHECK_INTERVAL):
+        self.queue_url = queue_url
+        self.dead_letter_queue_url = dead_letter_queue_url
+        self.completion_queue_url = completion_queue_url
+        self.visibility_timeout = visibility_timeout
+        self.max_receive_count = max_receive_count
+        self.drained_checks = drained_checks
+        self.drained_check_interval = drained_check_interval
+        self.sqs = boto3.client('sqs')
+
+    def start_run(self, run_id:str, bodies:Iterable[str]):
+        self.put(bodies)
+        if self.completion_queue_url is not None:
+            self.sqs.send_message(QueueUrl=self.completion_queue_url, MessageBody=run_id)
+
+    def put(self, bodies:Iterable[str], delay_seconds:float = 0):
+        bodies = list(bodies)
+        delay = min(int(delay_seconds), SQS_MAX_DELAY_SECONDS)
+        for start in range(0, len(bodies), SQS_BATCH_SIZE):
+            self.sqs.send_message_batch(QueueUrl=self.queue_url, Entries=[
+                {"Id": str(offset), "MessageBody": body, "DelaySeconds": delay}
+                for offset, body in enumerate(bodies[start:start + SQS_BATCH_SIZE])
+            ])
+
+    def receive(self) -> WorkItem | None:
+        while True:
+            response = self.sqs.receive_message(
+                QueueUrl=self.queue_url,
+                MaxNumberOfMessages=1,
+                VisibilityTimeout=self.visibility_timeout,
+                AttributeNames=["ApproximateReceiveCount"],
+            )
+            messages = response.get("Messages", [])
+            if not messages:
+                return None
+            message = messages[0]
+            receive_count = int(message["Attributes"]["ApproximateReceiveCount"])
+            if receive_count <= self.max_receive_count:
+                return WorkItem(body=message["Body"], receipt_handle=message["ReceiptHandle"], receive_count=receive_count)
+            logger.error("Moving %s to the dead letter queue after %s receives", message["Body"], receive_count - 1)
+            if self.dead_letter_queue_url is not None:
+                self.sqs.send_message(QueueUrl=self.dead_letter_queue_url, MessageBody=message["Body"])
+            self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message["ReceiptHandle"])
+            self._notify_dead_letter(message["Body"], receive_count - 1)
+
+    def ack(self, item:WorkItem):
+        self.sqs.delete_message(QueueUrl=self.queue_url, ReceiptHandle=item.receipt_handle)
+
+    def retry(self, item:WorkItem, delay_seconds:float = 0):
+        self.sqs.change_message_visibility(QueueUrl=self.queue_url, ReceiptHandle=item.receipt_handle, VisibilityTimeout=int(delay_seconds))
+
+    def _approximate_count(self, queue_url:str, attribute_names:list[str]) -> int:
+        attributes = self.sqs.get_queue_attributes(QueueUrl=queue_url, AttributeNames=attribute_names)["Attributes"]
+        return sum(int(attributes[name]) for name in attribute_names)
+
+    def pending_count(self) -> int:
+        return self._approximate_count(self.queue_url, [
+            "ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible", "ApproximateNumberOfMessagesDelayed"
+        ])
+
+    def is_drained(self) -> bool:
+        # The Approximate* attributes lag behind sends and deletes, so the queue only counts as drained
+        # once several reads spaced apart all see it empty
+        for check in range(self.drained_checks):
+            if check:
+                time.sleep(self.drained_check_interval)
+            if self.pending_count() != 0:
+                return False
+        return True
+
+    def dead_letter_count(self) -> int:
+        if self.dead_letter_queue_url is None:
+            return 0
+        return self._approximate_count(self.dead_letter_queue_url, ["ApproximateNumberOfMessages"])
+
+    def claim_completion(self, run_id:str) -> bool:
+        if self.completion_queue_url is None:
+            raise ValueError("A completion queue is required to claim run completion on SQS")
+        response = self.sqs.receive_message(QueueUrl=self.completion_queue_url, MaxNumberOfMessages=SQS_BATCH_SIZE, WaitTimeSeconds=1)
+        claimed = False
+        for message in response.get("Messages", []):
+            if message["Body"] == run_id and not claimed:
+                self.sqs.delete_message(QueueUrl=self.completion_queue_url, ReceiptHandle=message["ReceiptHandle"])
+                claimed = True
+            else:
+                self.sqs.change_message_visibility(QueueUrl=self.completion_queue_url, ReceiptHandle=message["ReceiptHandle"], VisibilityTimeout=0)
+        return claimed
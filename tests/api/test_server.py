@@ -0,0 +1,138 @@
+from http.client import HTTPConnection
+import json
+import threading
+import time
+
+import pytest
+
+from api.server import ApiServer, SnapshotStore
+from database.query_processor import Processor
+from enums.run_phase import RunPhase
+from enums.ticker_types import TickerType
+from models.scrape_result import ScrapeResult
+from models.trailing_returns import TrailingReturns
+from tests.test_constants import TEST_ETF, TEST_FUND, TEST_STOCK, TICKERS_LIST
+
+def scrape_result(ticker_type:TickerType, one_year:float, rating:int | None) -> ScrapeResult:
+    return ScrapeResult(
+        ticker_type=ticker_type,
+        trailing_returns=TrailingReturns(**{"ytd": 1.0, "1-year": one_year}),
+        morningstar_rating=rating,
+    )
+
+def finalize(processor:Processor):
+    processor.record_run(RunPhase.FINALIZE.value, int(time.time()), len(TICKERS_LIST))
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    path = str(tmp_path / "database.db")
+    with Processor(db_path=path) as processor:
+        processor.add_list_of_tickers(TICKERS_LIST)
+        processor.add_scrape_result(TEST_FUND, scrape_result(TickerType.MUTUAL_FUND, 12.5, 5))
+        processor.add_scrape_result(TEST_ETF, scrape_result(TickerType.ETF, -3.0, 3))
+        processor.add_scrape_result(TEST_STOCK, scrape_result(TickerType.STOCK, 20.0, None))
+        finalize(processor)
+    return path
+
+@pytest.fixture
+def server(db_path):
+    store = SnapshotStore(db_path, chunk_rows=2)
+    with ApiServer(store, "127.0.0.1", 0) as api_server:
+        thread = threading.Thread(target=api_server.serve_forever, daemon=True)
+        thread.start()
+        yield api_server
+        api_server.shutdown()
+        thread.join()
+
+def request(server:ApiServer, method:str, path:str, body:dict | None = None, headers:dict | None = None) -> tuple[int, dict, bytes]:
+    connection = HTTPConnection(*server.server_address[:2])
+    try:
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+def symbols_of(data:bytes) -> list[str]:
+    return [ticker["symbol"] for ticker in json.loads(data)["tickers"]]
+
+def test_lookup_keeps_request_order_and_reports_missing(server):
+    status, _, data = request(server, "GET", f"/tickers?symbols={TEST_STOCK},missing,{TEST_FUND.lower()}")
+    assert status == 200
+    body = json.loads(data)
+    assert symbols_of(data) == [TEST_STOCK, TEST_FUND]
+    assert body["missing"] == ["MISSING"]
+    assert body["tickers"][0]["morningstar_rating"] is None
+    assert body["tickers"][1]["return_1y"] == 12.5
+    assert body["tickers"][1]["return_3y"] is None
+
+    status, _, data = request(server, "POST", "/tickers/lookup", {"symbols": [TEST_ETF, TEST_FUND], "ticker_type": TickerType.ETF.value})
+    assert status == 200
+    assert symbols_of(data) == [TEST_ETF]
+
+def test_filters(server):
+    _, _, data = request(server, "GET", "/tickers?ticker_type=mutual_fund")
+    assert symbols_of(data) == [TEST_FUND]
+    _, _, data = request(server, "GET", "/tickers?min_rating=3&max_rating=4")
+    assert symbols_of(data) == [TEST_ETF]
+    _, _, data = request(server, "GET", "/tickers?min_return_1y=0")
+    assert sorted(symbols_of(data)) == sorted([TEST_FUND, TEST_STOCK])
+    _, _, data = request(server, "GET", "/tickers?failed=false")
+    assert sorted(symbols_of(data)) == sorted([TEST_ETF, TEST_FUND, TEST_STOCK])
+
+@pytest.mark.parametrize("query", ["ticker_type=bond", "min_rating=high", "colour=red"])
+def test_invalid_filters_are_rejected(server, query):
+    status, _, data = request(server, "GET", f"/tickers?{query}")
+    assert status == 400
+    assert "error" in json.loads(data)
+
+def test_full_universe_is_streamed(server):
+    status, headers, data = request(server, "GET", "/tickers")
+    assert status == 200
+    assert headers["Transfer-Encoding"] == "chunked"
+    assert sorted(symbols_of(data)) == sorted(TICKERS_LIST)
+    assert json.loads(data)["count"] == len(TICKERS_LIST)
+
+def test_etag_revalidation(server):
+    _, headers, _ = request(server, "GET", f"/tickers?symbols={TEST_FUND}")
+    status, _, data = request(server, "GET", f"/tickers?symbols={TEST_FUND}", headers={"If-None-Match": headers["ETag"]})
+    assert status == 304
+    assert data == b""
+    _, other_headers, _ = request(server, "GET", f"/tickers?symbols={TEST_ETF}")
+    assert other_headers["ETag"] != headers["ETag"]
+
+def test_single_symbol(server):
+    status, _, data = request(server, "GET", f"/tickers/{TEST_ETF}")
+    assert status == 200
+    assert json.loads(data)["ticker_type"] == TickerType.ETF.value
+    status, _, _ = request(server, "GET", "/tickers/missing")
+    assert status == 404
+
+def test_snapshot_is_only_replaced_by_a_finalized_run(server, db_path):
+    store = server.store
+    _, headers, _ = request(server, "GET", "/tickers")
+    with Processor(reuse_db=True, db_path=db_path) as processor:
+        processor.add_scrape_result(TEST_ETF, scrape_result(TickerType.ETF, 7.0, 4))
+        assert not store.refresh()
+        _, _, data = request(server, "GET", f"/tickers/{TEST_ETF}")
+        assert json.loads(data)["return_1y"] == -3.0
+        finalize(processor)
+    assert store.refresh()
+    _, _, data = request(server, "GET", f"/tickers/{TEST_ETF}")
+    assert json.loads(data)["return_1y"] == 7.0
+    status, _, _ = request(server, "GET", "/tickers", headers={"If-None-Match": headers["ETag"]})
+    assert status == 200
+
+def test_snapshot_is_kept_while_a_run_is_in_progress(server, db_path):
+    store = server.store
+    # A new run clears the ticker table before its results are finalized
+    with Processor(db_path=db_path) as processor:
+        processor.add_list_of_tickers([TEST_ETF])
+        assert not store.refresh(force=True)
+        assert len(store.snapshot) == len(TICKERS_LIST)
+        assert len(SnapshotStore(db_path).snapshot) == 0
+        processor.add_scrape_result(TEST_ETF, scrape_result(TickerType.ETF, 7.0, 4))
+        finalize(processor)
+    assert store.refresh()
+    _, _, data = request(server, "GET", "/tickers")
+    assert symbols_of(data) == [TEST_ETF]
@@ -0,0 +1,114 @@
+import os
+
+import pytest
+from sqlmodel import select
+
+from archive.page_archive import PageArchive
+from archive.replay import ArchivedPageNotFoundError, ReplayScraper, replay_run
+from database.models import Ticker
+from database.query_processor import Processor
+from enums.ticker_types import TickerType
+from tests.test_constants import TEST_ETF, TEST_FUND, TEST_STOCK
+
+TITLE_DATA = ["Name", "YTD", "1-Year", "3-Year", "Earliest Available"]
+
+def payload(ticker_type:TickerType, raw_data:list[str], rating:int | None = 3) -> dict:
+    return {
+        "ticker_type": ticker_type.value,
+        "title_data": TITLE_DATA,
+        "raw_data": raw_data,
+        "morningstar_rating": rating,
+        "url": "https://www.morningstar.com/",
+    }
+
+def test_identical_pages_are_stored_once(tmp_path):
+    archive = PageArchive(tmp_path)
+    page = payload(TickerType.ETF, ["Total Return %", "1.00", "2.00", "—", "4.00"])
+    first = archive.put("run_1", TEST_ETF, page)
+    second = archive.put("run_2", TEST_ETF, page)
+    assert first == second
+    assert len(list((tmp_path / "blobs").glob("*/*.gz"))) == 1
+    assert archive.get("run_1", TEST_ETF) == page
+    assert archive.get("run_2", TEST_ETF) == page
+    assert archive.run_ids() == ["run_1", "run_2"]
+
+def test_manifest_is_reloaded_from_disk(tmp_path):
+    page = payload(TickerType.STOCK, ["Total Return %", "1.00", "2.00", "3.00", "4.00"])
+    PageArchive(tmp_path).put("run_1", TEST_STOCK, page)
+    archive = PageArchive(tmp_path)
+    assert archive.tickers("run_1") == [TEST_STOCK]
+    assert archive.get("run_1", TEST_STOCK) == page
+    assert archive.get("run_1", TEST_FUND) is None
+
+def test_least_recently_used_pages_are_evicted(tmp_path):
+    archive = PageArchive(tmp_path)
+    for index, ticker in enumerate([TEST_ETF, TEST_FUND, TEST_STOCK]):
+        archive.put("run_1", ticker, payload(TickerType.ETF, ["Total Return %", str(index), "2.00", "3.00", "4.00"]))
+    blobs = sorted((tmp_path / "blobs").glob("*/*.gz"))
+    for age, blob in enumerate(blobs):
+        os.utime(blob, (age, age))
+    archive.get("run_1", TEST_ETF)
+
+    archive.max_bytes = archive.total_bytes - 1
+    archive.put("run_1", "NEW", payload(TickerType.ETF, ["Total Return %", "9.00", "2.00", "3.00", "4.00"]))
+    assert archive.total_bytes <= archive.max_bytes
+    assert archive.get("run_1", TEST_ETF) is not None
+    assert archive.get("run_1", "NEW") is not None
+    assert len(list((tmp_path / "blobs").glob("*/*.gz"))) < 4
+
+def test_eviction_frees_space_below_capacity(tmp_path):
+    archive = PageArchive(tmp_path, evict_to_fraction=0.5)
+    for index in range(4):
+        archive.put("run_1", f"T{index}", payload(TickerType.ETF, ["Total Return %", str(index), "2.00", "3.00", "4.00"]))
+    archive.max_bytes = archive.total_bytes - 1
+    archive.put("run_1", "NEW", payload(TickerType.ETF, ["Total Return %", "9.00", "2.00", "3.00", "4.00"]))
+    assert archive.total_bytes <= archive.max_bytes * 0.5
+
+def test_manifests_are_evicted_with_their_last_page(tmp_path):
+    archive = PageArchive(tmp_path)
+    archive.put("run_1", TEST_FUND, payload(TickerType.ETF, ["Total Return %", "1.00", "2.00", "3.00", "4.00"]))
+    for blob in (tmp_path / "blobs").glob("*/*.gz"):
+        os.utime(blob, (0, 0))
+    archive.max_bytes = int(archive.total_bytes * 1.5)
+    archive.put("run_2", TEST_ETF, payload(TickerType.ETF, ["Total Return %", "5.00", "6.00", "7.00", "8.00"]))
+    assert archive.run_ids() == ["run_2"]
+    assert archive.tickers("run_1") == []
+    assert archive.get("run_2", TEST_ETF) is not None
+
+def test_replay_scraper(tmp_path):
+    archive = PageArchive(tmp_path)
+    archive.put("run_1", TEST_FUND, payload(TickerType.MUTUAL_FUND, ["Total Return %", "1.50", "−2.00", "—", "7.00"], rating=4))
+    archive.put("run_1", TEST_ETF, payload(TickerType.ETF, ["Total Return %", "—", "—", "—", "—"]))
+    with ReplayScraper(archive, "run_1") as scraper:
+        result = scraper.scrape_ticker(TEST_FUND)
+        assert result.ticker_type == TickerType.MUTUAL_FUND
+        assert result.trailing_returns.ytd == 1.5
+        assert result.trailing_returns.one_year == -2.0
+        assert result.trailing_returns.three_year is None
+        assert result.morningstar_rating == 4
+        with pytest.raises(ValueError):
+            scraper.scrape_ticker(TEST_ETF)
+        with pytest.raises(ArchivedPageNotFoundError):
+            scraper.scrape_ticker(TEST_STOCK)
+
+def test_replay_run(tmp_path):
+    archive = PageArchive(tmp_path)
+    archive.put("run_1", TEST_FUND, payload(TickerType.MUTUAL_FUND, ["Total Return %", "1.50", "2.00", "—", "7.00"], rating=4))
+    archive.put("run_1", TEST_ETF, payload(TickerType.ETF, ["Total Return %", "—", "—", "—", "—"]))
+    with Processor(in_memory=True) as processor:
+        assert replay_run(archive, "run_1", processor) == 2
+        fund = processor.session.exec(select(Ticker).where(Ticker.symbol == TEST_FUND)).first()
+        assert fund.return_ytd == 1.5
+        assert fund.return_3y is None
+        assert fund.morningstar_rating == 4
+        assert fund.ticker_type == TickerType.MUTUAL_FUND.value
+        assert fund.processing_error is None
+        assert processor.get_failed_tickers() == [TEST_ETF]
+        assert processor.get_unprocessed_tickers() == []
+
+def test_replay_run_stores_client_symbols(tmp_path):
+    archive = PageArchive(tmp_path)
+    archive.put("run_1", "BRK.B", payload(TickerType.STOCK, ["Total Return %", "1.00", "2.00", "3.00", "4.00"]))
+    with Processor(in_memory=True) as processor:
+        assert replay_run(archive, "run_1", processor) == 1
+        assert processor.session.exec(select(Ticker.symbol)).all() == ["BRK/B"]
@@ -0,0 +1,124 @@
+import time
+
+import pytest
+from sqlmodel import select
+
+from database.models import Ticker
+from database.query_processor import Processor
+from enums.failure_class import FailureClass
+from enums.ticker_types import TickerType
+from models.retry_policy import RETRY_POLICIES
+from models.scrape_result import ScrapeResult
+from models.trailing_returns import TrailingReturns, batch_etl
+from tests.test_constants import TEST_ETF, TEST_FUND, TEST_STOCK, TICKERS_LIST
+
+@pytest.fixture
+def processor() -> Processor:
+    with Processor(in_memory=True) as test_processor:
+        test_processor.add_list_of_tickers(TICKERS_LIST)
+        yield test_processor
+
+def get_ticker(processor:Processor, symbol:str) -> Ticker:
+    return processor.session.exec(select(Ticker).where(Ticker.symbol == symbol)).first()
+
+def test_add_scrape_result(processor):
+    result = ScrapeResult(
+        ticker_type=TickerType.MUTUAL_FUND,
+        trailing_returns=TrailingReturns(**{"ytd": 1.5, "1-year": 10.25, "earliest available": 7.0}),
+        morningstar_rating=4,
+    )
+    processor.add_scrape_result(TEST_FUND, result)
+    ticker = get_ticker(processor, TEST_FUND)
+    assert ticker.return_ytd == 1.5
+    assert ticker.return_1y == 10.25
+    assert ticker.return_3y is None
+    assert ticker.inception == 7.0
+    assert ticker.morningstar_rating == 4
+    assert ticker.ticker_type == TickerType.MUTUAL_FUND.value
+    assert ticker.processing_complete is not None
+    assert processor.has_ticker_been_processed(TEST_FUND)
+    assert not processor.has_ticker_been_processed(TEST_STOCK)
+
+def test_add_scrape_result_clears_previous_error(processor):
+    processor.handle_processing_error(TEST_ETF, ValueError("Test Error"))
+    processor.add_scrape_result(TEST_ETF, ScrapeResult(ticker_type=TickerType.ETF, trailing_returns=TrailingReturns()))
+    assert get_ticker(processor, TEST_ETF).processing_error is None
+    assert TEST_ETF not in processor.get_failed_tickers()
+
+def test_merge_from_shard(processor, tmp_path):
+    shard_path = str(tmp_path / "shard.db")
+    with Processor(db_path=shard_path) as shard_processor:
+        shard_processor.add_list_of_tickers([TEST_FUND, "FXAIX"])
+        shard_processor.add_scrape_result(TEST_FUND, ScrapeResult(ticker_type=TickerType.MUTUAL_FUND, trailing_returns=TrailingReturns(**{"ytd": 2.0})))
+    processor.merge_from(shard_path)
+    assert get_ticker(processor, TEST_FUND).return_ytd == 2.0
+    assert get_ticker(processor, "FXAIX") is not None
+    assert get_ticker(processor, TEST_STOCK) is not None
+    assert sorted(processor.get_unprocessed_tickers()) == sorted(["FXAIX", TEST_ETF, TEST_STOCK])
+
+def test_add_trailing_returns_columns(processor):
+    columns = batch_etl([(["YTD", "1-Year"], ["1.5", "—"]), (["YTD", "3-Year"], ["-2", "4"])])
+    processor.add_trailing_returns_columns([TEST_FUND, TEST_ETF], columns)
+    fund, etf = get_ticker(processor, TEST_FUND), get_ticker(processor, TEST_ETF)
+    assert (fund.return_ytd, fund.return_1y, fund.return_3y) == (1.5, None, None)
+    assert (etf.return_ytd, etf.return_3y) == (-2.0, 4.0)
+
+def test_retry_budget_per_failure_class(processor):
+    assert processor.handle_processing_error(TEST_ETF, TimeoutError("Test Error"), FailureClass.TIMEOUT) == 10
+    assert processor.handle_processing_error(TEST_ETF, TimeoutError("Test Error"), FailureClass.TIMEOUT) == 60
+    # A new failure class starts its own budget
+    assert processor.handle_processing_error(TEST_ETF, ValueError("Test Error"), FailureClass.NOT_FOUND) == 60
+    ticker = get_ticker(processor, TEST_ETF)
+    assert ticker.failure_class == FailureClass.NOT_FOUND.value
+    assert ticker.processing_attempts == 1
+    assert not processor.has_ticker_been_processed(TEST_ETF)
+    assert processor.handle_processing_error(TEST_ETF, ValueError("Test Error"), FailureClass.NOT_FOUND) is None
+    assert processor.has_ticker_been_processed(TEST_ETF)
+
+def test_negative_cache_survives_clear_database(processor, monkeypatch):
+    for _ in range(RETRY_POLICIES[FailureClass.NOT_FOUND].max_attempts):
+        processor.handle_processing_error(TEST_ETF, ValueError("Test Error"), FailureClass.NOT_FOUND)
+    for _ in range(RETRY_POLICIES[FailureClass.TIMEOUT].max_attempts):
+        processor.handle_processing_error(TEST_STOCK, TimeoutError("Test Error"), FailureClass.TIMEOUT)
+    processor.clear_database()
+    assert processor.get_negative_cache() == {TEST_ETF: repr(ValueError("Test Error"))}
+
+    expiry = time.time() + RETRY_POLICIES[FailureClass.NOT_FOUND].negative_cache_days * 24 * 60 * 60
+    monkeypatch.setattr(time, "time", lambda: expiry + 1)
+    assert processor.get_negative_cache() == {}
+    assert processor.purge_expired_negative_cache() == 1
+
+def test_reset_failed_tickers_keeps_negatively_cached_failures(processor):
+    for _ in range(RETRY_POLICIES[FailureClass.NOT_FOUND].max_attempts):
+        processor.handle_processing_error(TEST_ETF, ValueError("Test Error"), FailureClass.NOT_FOUND)
+    for _ in range(RETRY_POLICIES[FailureClass.TIMEOUT].max_attempts):
+        processor.handle_processing_error(TEST_STOCK, TimeoutError("Test Error"), FailureClass.TIMEOUT)
+    processor.reset_failed_tickers()
+    assert processor.has_ticker_been_processed(TEST_ETF)
+    assert not processor.has_ticker_been_processed(TEST_STOCK)
+
+def test_reset_stale_tickers(processor):
+    result = ScrapeResult(ticker_type=TickerType.ETF, trailing_returns=TrailingReturns(**{"ytd": 1.0}))
+    for ticker in TICKERS_LIST:
+        processor.add_scrape_result(ticker, result)
+    get_ticker(processor, TEST_ETF).processing_complete = 100
+    get_ticker(processor, TEST_FUND).processing_complete = 100
+    processor.session.commit()
+    processor._add_to_negative_cache(TEST_FUND, FailureClass.NOT_FOUND, "Test Error", 1)
+    assert processor.reset_stale_tickers(cutoff=200) == 1
+    assert processor.get_unprocessed_tickers() == [TEST_ETF]
+
+def test_success_clears_failure_class(processor):
+    processor.handle_processing_error(TEST_FUND, TimeoutError("Test Error"), FailureClass.TIMEOUT)
+    processor.add_scrape_result(TEST_FUND, ScrapeResult(ticker_type=TickerType.MUTUAL_FUND, trailing_returns=TrailingReturns()))
+    ticker = get_ticker(processor, TEST_FUND)
+    assert ticker.failure_class is None
+    assert ticker.processing_error is None
+
+def test_timeout_counts(processor):
+    processor.record_timeout(TEST_ETF, "find_ticker", FailureClass.HUNG)
+    processor.record_timeout(TEST_STOCK, "find_ticker", FailureClass.HUNG)
+    processor.record_timeout(TEST_ETF, "ticker_budget", FailureClass.HUNG)
+    assert processor.get_timeout_counts() == {"find_ticker": 2, "ticker_budget": 1}
+    processor.clear_database()
+    assert processor.get_timeout_counts() == {}
@@ -0,0 +1,77 @@
+import pytest
+
+import database.query_processor
+from controls import check_data_controls
+from database.query_processor import Processor
+from database.run_results import RunResults
+from enums.ticker_types import TickerType
+from models.scrape_result import ScrapeResult
+from models.trailing_returns import TrailingReturns
+from tests.test_constants import TEST_ETF, TEST_FUND, TEST_STOCK, TICKERS_LIST
+
+@pytest.fixture
+def processor() -> Processor:
+    with Processor(in_memory=True) as test_processor:
+        test_processor.add_list_of_tickers(TICKERS_LIST)
+        test_processor.add_scrape_result(TEST_FUND, ScrapeResult(
+            ticker_type=TickerType.MUTUAL_FUND,
+            trailing_returns=TrailingReturns(**{"ytd": 1.5, "1-year": 10.25}),
+            morningstar_rating=4,
+        ))
+        test_processor.handle_processing_error(TEST_ETF, ValueError("Test Error"))
+        yield test_processor
+
+def test_get_run_results(processor):
+    results = processor.get_run_results()
+    assert len(results) == len(TICKERS_LIST)
+    fund_row = results.index_of(TEST_FUND)
+    assert results.returns["return_ytd"][fund_row] == 1.5
+    assert not results.return_null_masks["return_1y"][fund_row]
+    assert results.return_null_masks["return_3y"][fund_row]
+    assert results.ratings[fund_row] == 4
+    assert results.rating_null_mask[results.index_of(TEST_STOCK)]
+    assert results.failed_symbols() == [TEST_ETF]
+    assert results.rating_counts() == {"None": 2, 1: 0, 2: 0, 3: 0, 4: 1, 5: 0}
+    with pytest.raises(ValueError):
+        results.ratings[fund_row] = 5
+
+def test_export_to_csv(processor, tmp_path, monkeypatch):
+    output_path = tmp_path / "output.csv"
+    monkeypatch.setattr(database.query_processor, "OUTPUT_CSV_FILE_PATH", output_path)
+    results = processor.get_run_results()
+    processor.export_to_csv(results)
+    rows = {line.split(",")[0]: line.split(",")[1:] for line in output_path.read_text(encoding="utf-8").splitlines()}
+    fund_column = results.index_of(TEST_FUND)
+    assert rows["symbol"] == results.symbols.tolist()
+    assert rows["ytd"][fund_column] == "1.5"
+    assert rows["threeYear"][fund_column] == ""
+    assert rows["starRating"][fund_column] == "4"
+    assert rows["starRating"][results.index_of(TEST_STOCK)] == ""
+
+def test_check_data_controls(processor):
+    failing_specs = check_data_controls(processor.get_run_results())
+    assert any(spec.startswith("return_3y none percentage above spec") for spec in failing_specs)
+    assert any(spec.startswith("Morningstar rating None percentage out of spec") for spec in failing_specs)
+
+def test_take(processor):
+    results = processor.get_run_results()
+    subset = results.take([TEST_ETF, "MISSING", TEST_FUND])
+    assert subset.symbols.tolist() == [TEST_ETF, TEST_FUND]
+    assert subset.returns["return_ytd"][1] == 1.5
+    assert subset.ratings[1] == 4
+    assert subset.failed_symbols() == [TEST_ETF]
+    assert len(results.take([])) == 0
+
+def test_from_rows_streams_into_columns():
+    rows = iter([
+        (TEST_FUND, 1.5, None, None, None, None, None, 7.0, 4, TickerType.MUTUAL_FUND.value, False),
+        (TEST_ETF, None, None, None, None, None, None, None, None, None, True),
+    ])
+    results = RunResults.from_rows(rows, 2)
+    assert results.symbols.tolist() == [TEST_FUND, TEST_ETF]
+    assert results.returns["return_ytd"][0] == 1.5
+    assert results.return_null_masks["return_1y"].tolist() == [True, True]
+    assert results.return_null_masks["inception"].tolist() == [False, True]
+    assert results.rating_null_mask.tolist() == [False, True]
+    assert results.ticker_types.tolist() == [TickerType.MUTUAL_FUND.value, '']
+    assert results.failed_symbols() == [TEST_ETF]
@@ -0,0 +1,109 @@
+import gzip
+import os
+import zipfile
+import io
+
+from botocore.exceptions import ClientError, EndpointConnectionError, NoCredentialsError, NoRegionError
+import pytest
+
+from messenger.delivery import DeliveryError, ResultDelivery, _is_retryable, split_csv_columns
+from messenger.local_ses import LocalFileUploader, LocalSesClient
+from models.outgoing_email import OutgoingEmail
+
+SOURCE = "source@example.com"
+CLIENT = "client@example.com"
+ADMIN = "admin@example.com"
+
+def write_export(path, symbol_count:int):
+    symbols = [f"T{index:05d}" for index in range(symbol_count)]
+    rows = [["symbol", *symbols], ["ytd", *[f"{index / 7:.4f}" for index in range(symbol_count)]], ["starRating", *["3"] * symbol_count]]
+    path.write_text("".join(",".join(row) + "\n" for row in rows), encoding="utf-8")
+    return path
+
+def attachments(message) -> dict[str, bytes]:
+    return {part.get_filename(): part.get_payload(decode=True) for part in message.walk() if part.get_filename()}
+
+def test_client_and_admin_variants_share_one_attachment(tmp_path):
+    export = write_export(tmp_path / "DailyFundReturns.csv", 10)
+    ses = LocalSesClient(tmp_path / "outbox")
+    delivery = ResultDelivery(ses, SOURCE, compression="gzip", retry_backoff=[])
+    delivery.send_all([
+        OutgoingEmail(body="Results", recipients=[CLIENT], attachment_path=export),
+        OutgoingEmail(body="Results with failures", recipients=[ADMIN], attachment_path=export),
+        OutgoingEmail(body="No attachment", recipients=[ADMIN]),
+    ])
+    assert sorted(sent["Destinations"][0] for sent in ses.sent) == [ADMIN, ADMIN, CLIENT]
+    assert len(list((tmp_path / "outbox").glob("*.eml"))) == 3
+    attached = [attachments(message) for message in ses.messages()]
+    assert sorted(len(files) for files in attached) == [0, 1, 1]
+    for files in attached:
+        if files:
+            assert gzip.decompress(files["DailyFundReturns.csv.gz"]) == export.read_bytes()
+    assert delivery.prepare_attachment(export) is delivery.prepare_attachment(export)
+
+def test_zip_compression(tmp_path):
+    export = write_export(tmp_path / "DailyFundReturns.csv", 10)
+    ses = LocalSesClient()
+    ResultDelivery(ses, SOURCE, compression="zip").send(OutgoingEmail(body="Results", recipients=[CLIENT], attachment_path=export))
+    files = attachments(ses.messages()[0])
+    with zipfile.ZipFile(io.BytesIO(files["DailyFundReturns.zip"])) as zip_file:
+        assert zip_file.read("DailyFundReturns.csv") == export.read_bytes()
+
+def test_throttled_sends_are_retried(tmp_path):
+    ses = LocalSesClient(failures=["Throttling", "ServiceUnavailable"])
+    ResultDelivery(ses, SOURCE, retry_backoff=[0, 0]).send(OutgoingEmail(body="Results", recipients=[CLIENT]))
+    assert ses.calls == 3
+    assert len(ses.sent) == 1
+
+def test_rejected_sends_are_not_retried(tmp_path):
+    ses = LocalSesClient(failures=["MessageRejected"])
+    delivery = ResultDelivery(ses, SOURCE, retry_backoff=[0, 0])
+    with pytest.raises(DeliveryError) as error:
+        delivery.send_all([OutgoingEmail(body="Results", recipients=[CLIENT]), OutgoingEmail(body="Results", recipients=[ADMIN])])
+    assert len(error.value.failures) == 1
+    assert isinstance(error.value.failures[0][1], ClientError)
+    assert ses.calls == 2
+
+def test_only_transient_botocore_errors_are_retried():
+    assert _is_retryable(EndpointConnectionError(endpoint_url="https://email.us-east-1.amazonaws.com"))
+    assert not _is_retryable(NoCredentialsError())
+    assert not _is_retryable(NoRegionError())
+
+def test_rewritten_export_is_prepared_again(tmp_path):
+    export = tmp_path / "DailyFundReturns.csv"
+    export.write_text("symbol,T1\nytd,1.0000\n", encoding="utf-8")
+    delivery = ResultDelivery(LocalSesClient(), SOURCE)
+    first = delivery.prepare_attachment(export)
+    stat = export.stat()
+    export.write_text("symbol,T1\nytd,2.0000\n", encoding="utf-8")
+    os.utime(export, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    second = delivery.prepare_attachment(export)
+    assert second is not first
+    assert second.parts[0].get_payload(decode=True) == export.read_bytes()
+
+def test_large_attachment_is_split_by_symbol(tmp_path):
+    export = write_export(tmp_path / "DailyFundReturns.csv", 2000)
+    ses = LocalSesClient(max_message_bytes=20_000)
+    ResultDelivery(ses, SOURCE, max_message_bytes=20_000).send(OutgoingEmail(body="Results", recipients=[CLIENT], attachment_path=export))
+    assert len(ses.sent) > 1
+    symbols = []
+    for message in ses.messages():
+        (filename, data), = attachments(message).items()
+        assert filename.startswith("DailyFundReturns_part")
+        rows = data.decode("utf-8").splitlines()
+        assert [row.split(",")[0] for row in rows] == ["symbol", "ytd", "starRating"]
+        symbols += rows[0].split(",")[1:]
+    assert symbols == export.read_text(encoding="utf-8").splitlines()[0].split(",")[1:]
+
+def test_large_attachment_falls_back_to_download_link(tmp_path):
+    export = write_export(tmp_path / "DailyFundReturns.csv", 2000)
+    ses = LocalSesClient(max_message_bytes=20_000)
+    delivery = ResultDelivery(ses, SOURCE, max_message_bytes=20_000, uploader=LocalFileUploader(tmp_path / "downloads"))
+    delivery.send(OutgoingEmail(body="Results", recipients=[CLIENT], attachment_path=export))
+    message = ses.messages()[0]
+    assert attachments(message) == {}
+    assert (tmp_path / "downloads" / "DailyFundReturns.csv").resolve().as_uri() in message.get_payload()[0].get_payload()
+
+def test_split_csv_columns():
+    data = b"symbol,A,B,C\nytd,1,2,3\n"
+    assert split_csv_columns(data, 2) == [b"symbol,A,B\nytd,1,2\n", b"symbol,C\nytd,3\n"]
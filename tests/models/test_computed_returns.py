@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+
+import pytest
+
+from models.computed_returns import compare_trailing_returns, compute_trailing_returns
+from models.trailing_returns import TrailingReturns
+
+def daily_history(start:date, end:date, daily_growth:float) -> list[tuple[date, float, float]]:
+    history = []
+    nav = 10.0
+    current = start
+    while current <= end:
+        history.append((current, nav, 0.0))
+        nav *= daily_growth
+        current += timedelta(days=1)
+    return history
+
+def test_compute_trailing_returns_constant_growth():
+    history = daily_history(date(2020, 1, 1), date(2024, 12, 31), 1.0002)
+    returns = compute_trailing_returns(history)
+    assert returns.one_day == pytest.approx(0.02)
+    assert returns.one_week == pytest.approx((1.0002 ** 7 - 1) * 100)
+    assert returns.ytd == pytest.approx((1.0002 ** 366 - 1) * 100)
+    assert returns.three_year == pytest.approx((1.0002 ** 365.25 - 1) * 100, abs=0.01)
+    assert returns.five_year is None
+    assert returns.fifteen_year is None
+    assert returns.inception == pytest.approx((1.0002 ** 365.25 - 1) * 100, abs=0.01)
+
+def test_compute_trailing_returns_reinvests_distributions():
+    history = [(date(2024, 1, 1), 10.0, 0.0), (date(2024, 1, 2), 9.0, 1.0)]
+    assert compute_trailing_returns(history).one_day == pytest.approx(0.0)
+
+def test_compare_trailing_returns_within_tolerance():
+    computed = TrailingReturns(**{"1-year": 10.01, "3-year": 5.0})
+    scraped = TrailingReturns(**{"1-year": 10.0, "3-year": 5.5, "5-year": 1.0})
+    assert compare_trailing_returns(computed, scraped) == {"three_year": (5.0, 5.5)}
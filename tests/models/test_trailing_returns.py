@@ -0,0 +1,40 @@
+import math
+
+import pytest
+
+from models.trailing_returns import batch_etl, etl, is_all_null, parse_number
+
+TITLES = ["Name", "YTD", "1-Year", "3-Year ", "15-Year", "Earliest Available"]
+
+@pytest.mark.parametrize("raw, expected", [
+    ("12.5", 12.5),
+    (" 12.5 %", 12.5),
+    ("1,234.56", 1234.56),
+    ("−2.5", -2.5),
+    ("-0.75", -0.75),
+    ("—", None),
+    ("", None),
+    ("abc", None),
+])
+def test_parse_number(raw, expected):
+    assert parse_number(raw) == expected
+
+def test_etl():
+    trailing_returns = etl(TITLES, ["FBGRX", "1,234.5", "−2.5%", "—", "", "7"])
+    assert trailing_returns.ytd == 1234.5
+    assert trailing_returns.one_year == -2.5
+    assert trailing_returns.three_year is None
+    assert trailing_returns.fifteen_year is None
+    assert trailing_returns.inception == 7.0
+    assert not is_all_null(trailing_returns)
+    assert is_all_null(etl(TITLES, ["FBGRX", "—", "—", "—", "—", "—"]))
+
+def test_batch_etl():
+    values, null_masks = batch_etl([
+        (TITLES, ["FBGRX", "1.5", "2.5", "3.5", "4.5", "5.5"]),
+        (["YTD", "Bogus Header"], ["− 1.0", "9"]),
+    ])
+    assert values["ytd"].tolist() == [1.5, -1.0]
+    assert null_masks["fifteen_year"].tolist() == [False, True]
+    assert math.isnan(values["fifteen_year"][1])
+    assert null_masks["one_day"].all()
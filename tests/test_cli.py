@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+BROWSER_STACK_MODULES = {"selenium", "undetected_chromedriver", "boto3", "botocore"}
+# Runs the command then prints the top level packages it left in sys.modules
+LIST_IMPORTS = (
+    "import json, sys\n"
+    "from cli import main\n"
+    "main(sys.argv[1:])\n"
+    "print(json.dumps(sorted({name.split('.')[0] for name in sys.modules})))\n"
+)
+
+def command_imports(command:list[str], cwd:Path) -> set[str]:
+    # A fresh interpreter so modules imported by other tests do not count
+    process = subprocess.run(
+        [sys.executable, "-c", LIST_IMPORTS, *command],
+        cwd=cwd, capture_output=True, text=True, check=True, env={**os.environ, "PYTHONPATH": str(SRC_DIR)},
+    )
+    return set(json.loads(process.stdout.splitlines()[-1]))
+
+@pytest.mark.parametrize("command", ["export", "controls"])
+def test_command_imports_stay_light(command, tmp_path):
+    arguments = [command, "--output", str(tmp_path / "output.csv")] if command == "export" else [command]
+    imported = command_imports(arguments, tmp_path)
+    assert "database" in imported
+    assert BROWSER_STACK_MODULES.isdisjoint(imported), sorted(BROWSER_STACK_MODULES & imported)
+
+def test_shard_index_must_be_below_shard_count():
+    from cli import main
+    with pytest.raises(SystemExit) as exit_info:
+        main(["shard", "--shard", "2", "--shards", "2"])
+    assert exit_info.value.code == 2
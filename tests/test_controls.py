@@ -0,0 +1,49 @@
+import random
+
+from controls import CONTROLS_MIN_SAMPLE, ControlsAccumulator, wilson_interval
+from database.run_results import RETURN_FIELDS
+
+HEALTHY_RATINGS = [None] + [1] * 3 + [2] * 10 + [3] * 35 + [4] * 35 + [5] * 16
+
+def healthy_returns() -> dict[str, float]:
+    return {field: 1.0 for field in RETURN_FIELDS}
+
+def test_wilson_interval_contains_proportion():
+    lower, upper = wilson_interval(30, 100, 3.0)
+    assert lower < 0.3 < upper
+    assert wilson_interval(0, 0, 3.0) == (0.0, 1.0)
+
+def test_no_verdict_before_min_sample():
+    controls = ControlsAccumulator()
+    for _ in range(CONTROLS_MIN_SAMPLE - 1):
+        controls.add({}, None)
+    assert controls.clearly_failing_specs() == []
+    controls.add({}, None)
+    assert controls.clearly_failing_specs() != []
+
+def test_healthy_stream_does_not_fail():
+    random.seed(0)
+    controls = ControlsAccumulator()
+    for _ in range(2000):
+        controls.add(healthy_returns(), random.choice(HEALTHY_RATINGS))
+    assert controls.clearly_failing_specs() == []
+
+def test_broken_field_fails_early():
+    controls = ControlsAccumulator()
+    for index in range(CONTROLS_MIN_SAMPLE):
+        returns = healthy_returns()
+        returns["return_15y"] = None
+        controls.add(returns, HEALTHY_RATINGS[index % len(HEALTHY_RATINGS)])
+    failing_specs = controls.clearly_failing_specs()
+    assert len(failing_specs) == 1
+    assert failing_specs[0].startswith("return_15y none percentage above spec")
+    assert controls.return_averages()["return_15y"] is None
+    assert controls.return_averages()["return_1y"] == 1.0
+
+def test_failing_every_ticker_fails_early():
+    controls = ControlsAccumulator()
+    for _ in range(CONTROLS_MIN_SAMPLE):
+        controls.add_failure()
+    failing_specs = controls.clearly_failing_specs()
+    assert any(spec.startswith("return_ytd none percentage above spec") for spec in failing_specs)
+    assert any(spec.startswith("Morningstar rating None percentage out of spec") for spec in failing_specs)
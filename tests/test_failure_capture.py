@@ -0,0 +1,66 @@
+import json
+import zipfile
+
+from scraper.failure_capture import FailureCapture, clear_folder_in_background
+
+class FakeDriver:
+    current_url = "https://www.morningstar.com/funds/xnas/test/performance"
+    page_source = "<html><body>Test</body></html>"
+
+    def __init__(self):
+        self.screenshots = 0
+
+    def get_screenshot_as_png(self) -> bytes:
+        self.screenshots += 1
+        return b"\x89PNG"
+
+def capture_failures(capture:FailureCapture, driver:FakeDriver, count:int, step:str = "scrape_ticker"):
+    for index in range(count):
+        capture.capture(driver, step, ValueError(f"Test Error {index}"))
+
+def test_first_failures_are_kept_then_sampled_into_ring(tmp_path):
+    driver = FakeDriver()
+    capture = FailureCapture(tmp_path, "run_1", capture_dom=True, keep_first=3, sample_every=5, ring_slots=2, per_step=100, queue_size=100)
+    capture_failures(capture, driver, 33)
+    capture.close()
+    # 3 kept then failures 8, 13, 18, 23, 28 and 33 sampled into 2 ring slots
+    assert driver.screenshots == 9
+    assert capture.captures == 9
+    assert len(list((tmp_path / "first").iterdir())) == 3
+    assert sorted(path.name for path in (tmp_path / "ring").iterdir()) == ["0000.zip", "0001.zip"]
+    with zipfile.ZipFile(tmp_path / "ring" / "0000.zip") as capture_file:
+        metadata = json.loads(capture_file.read("metadata.json"))
+        assert metadata["failure"] == 28
+        assert metadata["step"] == "scrape_ticker"
+        assert capture_file.read("screenshot.png") == b"\x89PNG"
+        assert capture_file.read("page.html").decode() == FakeDriver.page_source
+
+def test_step_and_run_quotas(tmp_path):
+    driver = FakeDriver()
+    capture = FailureCapture(tmp_path, "run_1", keep_first=100, per_step=2, per_run=3)
+    capture_failures(capture, driver, 5, step="find_ticker")
+    capture_failures(capture, driver, 5, step="login")
+    capture.close()
+    assert capture.step_captures == {"find_ticker": 2, "login": 1}
+    assert driver.screenshots == 3
+    assert capture.failures == 10
+
+def test_reraised_error_is_captured_once(tmp_path):
+    driver = FakeDriver()
+    capture = FailureCapture(tmp_path, "run_1")
+    error = ValueError("Test Error")
+    capture.capture(driver, "find_ticker", error)
+    capture.capture(driver, "scrape_ticker", error)
+    capture.close()
+    assert driver.screenshots == 1
+    assert capture.step_captures == {"find_ticker": 1}
+
+def test_clear_folder_in_background(tmp_path):
+    folder = tmp_path / "screenshots"
+    (folder / "first").mkdir(parents=True)
+    (folder / "first" / "capture.zip").write_bytes(b"test")
+    thread = clear_folder_in_background(folder)
+    assert not folder.exists()
+    thread.join()
+    assert list(tmp_path.iterdir()) == []
+    assert clear_folder_in_background(folder) is None
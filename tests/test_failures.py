@@ -0,0 +1,96 @@
+import logging
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+from urllib3.exceptions import MaxRetryError
+
+from enums.failure_class import FailureClass
+from models.retry_policy import RETRY_POLICIES
+from scraper.exceptions import EmptyTrailingReturnsError, LoginFailedError, SessionLostError, ThrottledError, TickerNotFoundError
+from scraper.failures import classify_failure
+from scraper.ms_scraper import Scraper
+from tests.test_constants import TEST_FUND, TEST_STOCK
+
+class CrashedDriver:
+    @property
+    def current_url(self):
+        raise WebDriverException("chrome not reachable")
+
+class FakeElement:
+    # Children by class name or tag
+    def __init__(self, text:str = "", **children:list['FakeElement']):
+        self.text = text
+        self.children = children
+
+    def find_elements(self, by:str, value:str) -> list['FakeElement']:
+        return self.children.get(value.replace("-", "_"), [])
+
+    def find_element(self, by:str, value:str) -> 'FakeElement':
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(value)
+        return elements[0]
+
+    def send_keys(self, *_):
+        pass
+
+    def click(self):
+        pass
+
+class SearchPageDriver(FakeElement):
+    # The site search page listing only symbols other than the one searched for
+    current_url = "https://www.morningstar.com/search?query=missing"
+    title = "Search | Morningstar"
+
+    def __init__(self, listed_tickers:list[str]):
+        hits = [
+            FakeElement(a=[FakeElement()], mdc_security_module__metadata=[FakeElement(mdc_security_module__ticker=[FakeElement(ticker)])])
+            for ticker in listed_tickers
+        ]
+        super().__init__(mdc_search_field__input__mdc=[FakeElement()], search_all__section=[FakeElement(search_all__hit=hits)])
+
+    def get(self, url:str):
+        pass
+
+@pytest.fixture
+def scraper():
+    scraper = Scraper(keep_screenshots=True)
+    yield scraper
+    scraper.watchdog.close()
+    scraper.failure_capture.close()
+
+def test_classify_failure():
+    assert classify_failure(TickerNotFoundError("Failed to find ticker: TEST")) == FailureClass.NOT_FOUND
+    assert classify_failure(EmptyTrailingReturnsError("No trailing returns found")) == FailureClass.EMPTY_TABLE
+    assert classify_failure(TimeoutException("Timed out")) == FailureClass.TIMEOUT
+    assert classify_failure(WebDriverException("chrome not reachable")) == FailureClass.DRIVER_CRASH
+    assert classify_failure(MaxRetryError(None, "/session")) == FailureClass.DRIVER_CRASH
+    assert classify_failure(SessionLostError("Redirected to login")) == FailureClass.AUTH_LOST
+    assert classify_failure(LoginFailedError("Login failed")) == FailureClass.AUTH_LOST
+    assert classify_failure(ThrottledError("Blocked")) == FailureClass.THROTTLED
+    assert classify_failure(WebDriverException("HTTP 429 Too Many Requests")) == FailureClass.THROTTLED
+    assert classify_failure(KeyError("test")) == FailureClass.UNKNOWN
+
+def test_not_found_is_a_value_error():
+    assert isinstance(TickerNotFoundError("test"), ValueError)
+
+def test_every_failure_class_has_a_policy():
+    assert set(RETRY_POLICIES) == set(FailureClass)
+    policy = RETRY_POLICIES[FailureClass.TIMEOUT]
+    assert [policy.backoff(attempt) for attempt in range(1, 7)] == [10, 60, 300, 600, 600, 600]
+
+def test_driver_crash_is_logged_once(scraper, caplog):
+    scraper.driver = CrashedDriver()
+    with caplog.at_level(logging.ERROR, logger="scraper.ms_scraper"):
+        with pytest.raises(WebDriverException) as error:
+            scraper.scrape_ticker(TEST_FUND)
+    assert classify_failure(error.value) == FailureClass.DRIVER_CRASH
+    assert [record.getMessage() for record in caplog.records] == [f"Max retries exceeded doing func scrape_ticker with args: ('{TEST_FUND}',)"]
+
+def test_symbol_missing_from_search_results_is_not_found(scraper):
+    scraper.driver = SearchPageDriver([TEST_STOCK])
+    scraper.wait = WebDriverWait(scraper.driver, 0.1)
+    with pytest.raises(TickerNotFoundError) as error:
+        scraper._find_ticker(TEST_FUND)
+    assert classify_failure(error.value) == FailureClass.NOT_FOUND
@@ -0,0 +1,28 @@
+import json
+import logging
+
+import pytest
+
+import logging_setup
+
+@pytest.fixture
+def log_files(tmp_path, monkeypatch):
+    text_log = tmp_path / "logs" / "log.log"
+    json_log = tmp_path / "logs" / "log.jsonl"
+    monkeypatch.setattr(logging_setup, "LOG_FILE_NAME", str(text_log))
+    monkeypatch.setattr(logging_setup, "LOG_JSON_FILE_NAME", str(json_log))
+    yield text_log, json_log
+    logging.basicConfig(handlers=[logging.NullHandler()], force=True)
+
+def test_configure_logging_writes_structured_records(log_files):
+    text_log, json_log = log_files
+    logging_setup.configure_logging(json_logs=True)
+    logging.getLogger("test").info("Processed %s", "FBGRX", extra={"ticker": "FBGRX", "step": "scrape", "duration": 1.25})
+    logging_setup.stop_logging()
+
+    assert "Processed FBGRX" in text_log.read_text(encoding="utf-8")
+    record = json.loads(json_log.read_text(encoding="utf-8").splitlines()[-1])
+    assert record["message"] == "Processed FBGRX"
+    assert record["ticker"] == "FBGRX"
+    assert record["step"] == "scrape"
+    assert record["duration"] == 1.25
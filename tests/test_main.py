@@ -0,0 +1,20 @@
+from database.query_processor import Processor
+from enums.failure_class import FailureClass
+from main import add_work_set, is_cached_failure
+from models.retry_policy import RETRY_POLICIES
+from tests.test_constants import TEST_ETF, TEST_FUND, TEST_STOCK, TICKERS_LIST
+
+def test_cached_failures_are_recorded_instead_of_scraped():
+    with Processor(in_memory=True) as processor:
+        processor.add_list_of_tickers([TEST_ETF])
+        for _ in range(RETRY_POLICIES[FailureClass.NOT_FOUND].max_attempts):
+            processor.handle_processing_error(TEST_ETF, ValueError("Test Error"), FailureClass.NOT_FOUND)
+        processor.clear_database()
+
+        assert add_work_set(processor, TICKERS_LIST) == [TEST_STOCK, TEST_FUND]
+        assert processor.get_unprocessed_tickers() == [TEST_STOCK, TEST_FUND]
+        errors = processor.get_failed_ticker_errors()
+        assert list(errors) == [TEST_ETF]
+        assert is_cached_failure(errors[TEST_ETF])
+        assert repr(ValueError("Test Error")) in errors[TEST_ETF]
+        assert processor.get_run_results().failed_symbols() == [TEST_ETF]
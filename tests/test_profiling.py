@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+import profiling
+from profiling import diff_reports, profiled
+
+class FakeCommandExecutor:
+    def execute(self, command:str, params:dict) -> dict:
+        return {"value": None}
+
+class FakeDriver:
+    def __init__(self):
+        self.command_executor = FakeCommandExecutor()
+
+class FakeScraper:
+    def __init__(self):
+        self.driver = FakeDriver()
+
+    def login(self):
+        profiling.instrument_driver(self.driver)
+        self.driver.command_executor.execute("get", {"url": "login"})
+
+    def find_ticker(self, ticker:str):
+        self.driver.command_executor.execute("findElement", {"value": ticker})
+
+    def scrape_ticker(self, ticker:str):
+        self.find_ticker(ticker)
+        self.driver.command_executor.execute("findElement", {"value": "table"})
+        self.driver.command_executor.execute("getElementText", {})
+        self.screenshot()
+
+    def screenshot(self):
+        self.driver.command_executor.execute("screenshot", {})
+
+@pytest.fixture
+def profile_folder(tmp_path):
+    profiling.enable(tmp_path)
+    yield tmp_path
+    profiling.disable()
+
+@profiled
+def scrape_run(tickers:list[str]) -> int:
+    scraper = FakeScraper()
+    profiling.instrument_scraper(scraper)
+    scraper.login()
+    for ticker in tickers:
+        scraper.scrape_ticker(ticker)
+    allocations = [bytearray(1024) for _ in range(100)]
+    return len(allocations)
+
+def read_report(folder) -> dict:
+    report_paths = list(folder.glob("scrape_run_*.json"))
+    assert len(report_paths) == 1
+    with open(report_paths[0], encoding="utf-8") as report_file:
+        return json.load(report_file)
+
+def test_profiled_run_writes_report(profile_folder):
+    assert scrape_run(["TEST1", "TEST2"]) == 100
+    report = read_report(profile_folder)
+    assert report["name"] == "scrape_run"
+    assert report["webdriver_commands"] == {
+        "login": {"get": 1},
+        "find_ticker": {"findElement": 2},
+        "scrape_ticker": {"findElement": 2, "getElementText": 2, "screenshot": 2},
+    }
+    assert set(report["time_by_layer"]) == {"webdriver", "database", "sleep", "python"}
+    assert report["memory"]["peak_bytes"] >= 100 * 1024
+    assert any(name.endswith("(scrape_run)") for name in report["functions"])
+
+def test_disabled_profiling_leaves_scraper_untouched(tmp_path):
+    assert not profiling.is_enabled()
+    assert scrape_run(["TEST1"]) == 100
+    scraper = FakeScraper()
+    profiling.instrument_scraper(scraper)
+    assert "scrape_ticker" not in vars(scraper)
+    assert list(tmp_path.iterdir()) == []
+
+def test_diff_reports(profile_folder):
+    scrape_run(["TEST1"])
+    old = read_report(profile_folder)
+    new = json.loads(json.dumps(old))
+    new["webdriver_commands"]["scrape_ticker"]["getElementText"] = 3
+    new["time_by_layer"]["webdriver"] += 1.0
+    changes = diff_reports(old, new)
+    assert changes["webdriver_commands.scrape_ticker.getElementText"] == 2
+    assert changes["time_by_layer.webdriver"] == pytest.approx(1.0)
+    assert "wall_seconds" not in changes
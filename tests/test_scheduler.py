@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+import threading
+
+import pytest
+
+from enums.run_phase import RunPhase
+from scheduler import Scheduler, last_market_close
+
+class SimulatedClock:
+    def __init__(self, start:datetime):
+        self.current = start
+
+    def now(self) -> datetime:
+        return self.current
+
+    def wait(self, seconds:float, stop_event:threading.Event) -> bool:
+        self.current += timedelta(seconds=seconds)
+        return stop_event.is_set()
+
+    def advance(self, seconds:float):
+        self.current += timedelta(seconds=seconds)
+
+def build_scheduler(clock:SimulatedClock, prewarm_seconds:float, run_seconds:float = 600):
+    fired:list[tuple[datetime, str]] = []
+    def record(name:str):
+        fired.append((clock.now(), name))
+        clock.advance(run_seconds)
+    scheduler = Scheduler(
+        clock,
+        on_prewarm=lambda: record("prewarm"),
+        on_refresh=lambda send_to_clients: record(f"refresh:{send_to_clients}"),
+        on_healthcheck=lambda: record("healthcheck"),
+        estimate_prewarm_seconds=lambda: prewarm_seconds,
+        target_hour=6,
+        healthcheck_hours=[18, 22],
+    )
+    return scheduler, fired
+
+def test_prewarm_finishes_before_target():
+    # Monday noon
+    clock = SimulatedClock(datetime(2024, 6, 3, 12, 0))
+    scheduler, fired = build_scheduler(clock, prewarm_seconds=4 * 3600)
+    phases = [scheduler.run_next()[1] for _ in range(4)]
+    assert phases == [RunPhase.HEALTHCHECK, RunPhase.HEALTHCHECK, RunPhase.PREWARM, RunPhase.REFRESH]
+    assert fired == [
+        (datetime(2024, 6, 3, 18, 0), "healthcheck"),
+        (datetime(2024, 6, 3, 22, 0), "healthcheck"),
+        (datetime(2024, 6, 4, 2, 0), "prewarm"),
+        (datetime(2024, 6, 4, 6, 0), "refresh:True"),
+    ]
+
+def test_overlapping_healthcheck_is_skipped():
+    clock = SimulatedClock(datetime(2024, 6, 3, 12, 0))
+    scheduler, fired = build_scheduler(clock, prewarm_seconds=10 * 3600)
+    for _ in range(3):
+        scheduler.run_next()
+    assert [name for _, name in fired] == ["healthcheck", "prewarm", "refresh:True"]
+    assert fired[1][0] == datetime(2024, 6, 3, 20, 0)
+
+def test_late_prewarm_starts_immediately():
+    clock = SimulatedClock(datetime(2024, 6, 4, 5, 0))
+    scheduler, fired = build_scheduler(clock, prewarm_seconds=4 * 3600, run_seconds=2 * 3600)
+    scheduler.run_next()
+    scheduler.run_next()
+    assert fired == [(datetime(2024, 6, 4, 5, 0), "prewarm"), (datetime(2024, 6, 4, 7, 0), "refresh:True")]
+
+def test_weekend_target_is_a_healthcheck():
+    # Friday 23:00
+    clock = SimulatedClock(datetime(2024, 6, 7, 23, 0))
+    scheduler, fired = build_scheduler(clock, prewarm_seconds=3600)
+    scheduler.run_next()
+    assert fired == [(datetime(2024, 6, 8, 6, 0), "healthcheck")]
+
+@pytest.mark.parametrize("start, expected", [
+    (datetime(2024, 6, 3, 9, 0), ["prewarm", "refresh:True"]),
+    (datetime(2024, 6, 3, 19, 0), ["healthcheck"]),
+    (datetime(2024, 6, 8, 9, 0), ["healthcheck"]),
+])
+def test_startup_run(start, expected):
+    scheduler, fired = build_scheduler(SimulatedClock(start), prewarm_seconds=3600)
+    scheduler.run_startup()
+    assert [name for _, name in fired] == expected
+
+def test_stop_interrupts_wait():
+    clock = SimulatedClock(datetime(2024, 6, 3, 12, 0))
+    scheduler, fired = build_scheduler(clock, prewarm_seconds=3600)
+    scheduler.stop()
+    assert scheduler.run_next() is None
+    assert fired == []
+
+def test_failed_estimate_falls_back():
+    clock = SimulatedClock(datetime(2024, 6, 3, 12, 0))
+    errors = []
+    def estimate() -> float:
+        raise FileNotFoundError("No fund file found")
+    scheduler = Scheduler(
+        clock, on_prewarm=lambda: None, on_refresh=lambda _: None, on_healthcheck=lambda: None,
+        estimate_prewarm_seconds=estimate, on_error=errors.append, target_hour=6, healthcheck_hours=[18, 22],
+    )
+    assert scheduler.next_event() == (datetime(2024, 6, 3, 18, 0), RunPhase.HEALTHCHECK)
+    assert len(errors) == 1
+
+def test_healthchecks_missed_during_startup_are_skipped():
+    # Monday morning restart whose pre-warm and refresh run until 23:00
+    clock = SimulatedClock(datetime(2024, 6, 3, 9, 0))
+    scheduler, fired = build_scheduler(clock, prewarm_seconds=3600, run_seconds=7 * 3600)
+    scheduler.run_startup()
+    scheduler.run_next()
+    assert fired[-1] == (datetime(2024, 6, 4, 5, 0), "prewarm")
+
+@pytest.mark.parametrize("now, expected", [
+    # Tuesday morning refresh: Monday's close
+    (datetime(2024, 1, 2, 6), datetime(2024, 1, 1, 16)),
+    # Monday morning refresh: Friday's close
+    (datetime(2024, 1, 1, 6), datetime(2023, 12, 29, 16)),
+    (datetime(2024, 1, 2, 17), datetime(2024, 1, 2, 16)),
+])
+def test_last_market_close(now, expected):
+    assert last_market_close(now, close_hour=16) == expected
@@ -0,0 +1,26 @@
+from sharding import ShardRing
+
+SYMBOLS = [f"F{number:04d}X" for number in range(4000)]
+
+def test_shard_assignment_is_deterministic():
+    assert ShardRing(4).split(SYMBOLS) == ShardRing(4).split(SYMBOLS)
+
+def test_shard_assignment_ignores_other_symbols():
+    ring = ShardRing(4)
+    assignments = {symbol: ring.shard_for(symbol) for symbol in SYMBOLS}
+    shards = ring.split(SYMBOLS[:100] + ["NEWSYMBOL"])
+    for shard, symbols in shards.items():
+        for symbol in symbols - {"NEWSYMBOL"}:
+            assert assignments[symbol] == shard
+
+def test_shards_are_balanced():
+    shards = ShardRing(4).split(SYMBOLS)
+    assert sum(len(symbols) for symbols in shards.values()) == len(SYMBOLS)
+    for symbols in shards.values():
+        assert abs(len(symbols) - len(SYMBOLS) / 4) < len(SYMBOLS) / 4 * 0.35
+
+def test_adding_a_shard_moves_few_symbols():
+    four, five = ShardRing(4), ShardRing(5)
+    moved = [symbol for symbol in SYMBOLS if four.shard_for(symbol) != five.shard_for(symbol)]
+    assert all(five.shard_for(symbol) == 4 for symbol in moved)
+    assert len(moved) < len(SYMBOLS) * 0.35
@@ -0,0 +1,59 @@
+import pytest
+
+from constants import DEFAULT_UNIVERSE_NAME, OUTPUT_CSV_FILE_PATH
+from database.query_processor import Processor
+from enums.ticker_types import TickerType
+from models.scrape_result import ScrapeResult
+from models.trailing_returns import TrailingReturns
+from models.universe import Universe
+from universes import export_universes, parse_universes, read_funds_file, resolve_work_set
+from tests.test_constants import TEST_ETF, TEST_FUND, TEST_STOCK
+
+ADMIN = "admin@example.com"
+
+def test_default_universe():
+    universes = parse_universes([], ["client@example.com", ADMIN])
+    assert len(universes) == 1
+    assert universes[0].name == DEFAULT_UNIVERSE_NAME
+    assert universes[0].funds_file is None
+    assert universes[0].output_path == OUTPUT_CSV_FILE_PATH
+
+def test_configured_universes():
+    universes = parse_universes([
+        {"name": "alpha", "funds_file": "alpha.csv", "recipients": ["alpha@example.com"]},
+        {"name": "beta", "funds_file": "beta.csv", "recipients": ["beta@example.com"], "output_file": "Beta.csv"},
+    ], ["client@example.com"])
+    # The admin gets the summary email, not a copy of every client email
+    assert [universe.recipients for universe in universes] == [["alpha@example.com"], ["beta@example.com"]]
+    assert universes[0].output_path.name == "alpha_DailyFundReturns.csv"
+    assert universes[1].output_path.name == "Beta.csv"
+    with pytest.raises(ValueError):
+        parse_universes([{"name": "alpha"}, {"name": "alpha"}], [])
+
+def test_read_funds_file_keeps_order_without_duplicates(tmp_path):
+    funds_file = tmp_path / "funds.csv"
+    funds_file.write_text(f"﻿{TEST_FUND}\n{TEST_STOCK}\n\n{TEST_FUND}\n{TEST_ETF}\n", encoding="utf-8")
+    assert read_funds_file(funds_file) == [TEST_FUND, TEST_STOCK, TEST_ETF]
+
+def test_overlapping_universes_share_one_scrape(tmp_path):
+    universe_funds = {"alpha": [TEST_FUND, TEST_STOCK], "beta": [TEST_ETF, TEST_FUND]}
+    work_set = resolve_work_set(universe_funds)
+    assert work_set == {TEST_FUND, TEST_STOCK, TEST_ETF}
+    universes = [
+        Universe(name="alpha", output_file=str(tmp_path / "alpha.csv")),
+        Universe(name="beta", output_file=str(tmp_path / "beta.csv")),
+    ]
+    with Processor(in_memory=True) as processor:
+        processor.add_list_of_tickers(sorted(work_set))
+        processor.add_scrape_result(TEST_FUND, ScrapeResult(
+            ticker_type=TickerType.MUTUAL_FUND,
+            trailing_returns=TrailingReturns(**{"ytd": 1.5}),
+            morningstar_rating=4,
+        ))
+        output_paths = export_universes(processor, processor.get_run_results(), universes, universe_funds)
+    beta_rows = [line.split(",") for line in output_paths["beta"].read_text(encoding="utf-8").splitlines()]
+    assert beta_rows[0] == ["symbol", TEST_ETF, TEST_FUND]
+    assert beta_rows[1] == ["ytd", "", "1.5"]
+    alpha_rows = [line.split(",") for line in output_paths["alpha"].read_text(encoding="utf-8").splitlines()]
+    assert alpha_rows[0] == ["symbol", TEST_FUND, TEST_STOCK]
+    assert alpha_rows[-1] == ["starRating", "4", ""]
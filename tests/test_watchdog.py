@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from enums.failure_class import FailureClass
+from scraper.exceptions import StepDeadlineExceededError, TickerBudgetExceededError
+from scraper.failures import classify_failure
+from scraper.watchdog import Watchdog
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+@pytest.fixture
+def watchdog(clock):
+    test_watchdog = Watchdog(poll_interval=60, clock=clock)
+    yield test_watchdog
+    test_watchdog.close()
+
+def test_step_within_deadline(watchdog, clock):
+    expired = []
+    with watchdog.deadline("find_ticker", 10, lambda: expired.append(True)):
+        clock.now = 9
+        watchdog.check()
+    assert expired == []
+    assert watchdog.timeouts == {}
+
+def test_overrun_calls_on_expire_and_raises(watchdog, clock):
+    expired = []
+    with pytest.raises(StepDeadlineExceededError) as error:
+        with watchdog.deadline("find_ticker", 10, lambda: expired.append(True)):
+            clock.now = 11
+            watchdog.check()
+            # The stuck call fails once the driver is killed
+            raise ConnectionError("driver killed")
+    assert expired == [True]
+    assert error.value.step == "find_ticker"
+    assert isinstance(error.value.__cause__, ConnectionError)
+    assert watchdog.timeouts == {"find_ticker": 1}
+    assert classify_failure(error.value) == FailureClass.HUNG
+
+def test_only_the_overrunning_deadline_fires(watchdog, clock):
+    with pytest.raises(TickerBudgetExceededError):
+        with watchdog.deadline("ticker_budget", 20, lambda: None, TickerBudgetExceededError):
+            with watchdog.deadline("find_ticker", 10, lambda: None):
+                clock.now = 5
+            clock.now = 21
+            watchdog.check()
+    assert watchdog.timeouts == {"ticker_budget": 1}
+
+def test_no_deadline(watchdog, clock):
+    with watchdog.deadline("scrape_ticker", None, lambda: pytest.fail("on_expire called")):
+        clock.now = 1_000_000
+        watchdog.check()
+
+def test_monitor_thread_unblocks_stuck_call():
+    watchdog = Watchdog(poll_interval=0.01)
+    unblocked = threading.Event()
+    with pytest.raises(StepDeadlineExceededError):
+        with watchdog.deadline("page_source", 0.05, unblocked.set):
+            assert unblocked.wait(5)
+    watchdog.close()
+    assert watchdog.timeouts == {"page_source": 1}
@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+from work_queue.completion import check_job_completion
+from work_queue.in_process import InProcessWorkQueue
+from work_queue.sqlite_broker import SqliteWorkQueue
+from tests.test_constants import TICKERS_LIST
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+@pytest.fixture
+def broker_path(tmp_path) -> str:
+    return str(tmp_path / "broker.db")
+
+@pytest.fixture(params=["sqlite", "in_process"])
+def work_queue(request, broker_path, clock):
+    if request.param == "in_process":
+        return InProcessWorkQueue(max_receive_count=2, clock=clock)
+    return SqliteWorkQueue(broker_path, visibility_timeout=30, max_receive_count=2, clock=clock)
+
+def test_receive_ack(work_queue):
+    work_queue.put(TICKERS_LIST)
+    received = [work_queue.receive() for _ in TICKERS_LIST]
+    assert [item.body for item in received] == TICKERS_LIST
+    assert work_queue.receive() is None
+    assert not work_queue.is_drained()
+    for item in received:
+        work_queue.ack(item)
+    assert work_queue.is_drained()
+
+def test_retry_with_delay(work_queue, clock):
+    work_queue.put(["FBGRX"])
+    item = work_queue.receive()
+    work_queue.retry(item, delay_seconds=10)
+    assert work_queue.receive() is None
+    clock.now += 10
+    retried = work_queue.receive()
+    assert retried.body == "FBGRX"
+    assert retried.receive_count == 2
+    assert retried.receipt_handle != item.receipt_handle
+
+def test_dead_letter_after_max_receives(work_queue):
+    work_queue.put(["FBGRX"])
+    for _ in range(2):
+        work_queue.retry(work_queue.receive())
+    assert work_queue.receive() is None
+    assert work_queue.dead_letter_count() == 1
+    assert work_queue.is_drained()
+
+def test_completion_claimed_once(work_queue):
+    completions = []
+    assert check_job_completion(work_queue, "run", lambda: completions.append("run"))
+    assert not check_job_completion(work_queue, "run", lambda: completions.append("run"))
+    assert completions == ["run"]
+
+def test_visibility_timeout_redelivers(broker_path, clock):
+    work_queue = SqliteWorkQueue(broker_path, visibility_timeout=30, clock=clock)
+    work_queue.put(["FBGRX"])
+    abandoned = work_queue.receive()
+    assert work_queue.receive() is None
+    clock.now += 30
+    redelivered = work_queue.receive()
+    assert redelivered.body == "FBGRX"
+    work_queue.ack(abandoned)
+    assert not work_queue.is_drained()
+    work_queue.ack(redelivered)
+    assert work_queue.is_drained()
+
+def test_workers_share_a_broker(broker_path):
+    symbols = [f"T{number}" for number in range(200)]
+    SqliteWorkQueue(broker_path).put(symbols)
+    processed:list[list[str]] = [[], [], []]
+    completions = []
+
+    def worker(index:int):
+        work_queue = SqliteWorkQueue(broker_path)
+        while (item := work_queue.receive()) is not None:
+            processed[index].append(item.body)
+            work_queue.ack(item)
+        check_job_completion(work_queue, "run", lambda: completions.append(index))
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(len(processed))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(sum(processed, [])) == sorted(symbols)
+    assert len(completions) == 1
+
+def test_dead_letters_are_reported(work_queue, clock):
+    dead_letters = []
+    work_queue.on_dead_letter = lambda body, receive_count: dead_letters.append((body, receive_count))
+    work_queue.put(TICKERS_LIST[:1])
+    for _ in range(2):
+        work_queue.retry(work_queue.receive())
+    assert work_queue.receive() is None
+    assert dead_letters == [(TICKERS_LIST[0], 2)]
+    assert work_queue.dead_letter_count() == 1
+
+def test_failing_dead_letter_hook_keeps_the_move(work_queue):
+    def fail(body, receive_count):
+        # The broker's write lock is free while the hook runs
+        work_queue.put(["OTHER"])
+        raise RuntimeError("Database write failed")
+    work_queue.on_dead_letter = fail
+    work_queue.put(TICKERS_LIST[:1])
+    for _ in range(2):
+        work_queue.retry(work_queue.receive())
+    with pytest.raises(RuntimeError):
+        work_queue.receive()
+    assert work_queue.dead_letter_count() == 1
+    assert work_queue.receive().body == "OTHER"